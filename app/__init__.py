@@ -4,7 +4,19 @@ from flask_cors import CORS
 from pathlib import Path
 
 from .config import Config
+from .contrasenas import contrasenas
 from .extensions import db, migrate, jwt
+from .catalogo import catalogo
+from .disponibilidad import disponibilidad
+from .idempotencia import idempotencia
+from .imagenes import imagenes
+from .instrumentacion import instrumentacion
+from .limites import limitador
+from .metricas import metricas
+from .motor import motor
+from .permisos import versiones_token
+from .precios import parse_festivos
+from .replicas import enrutador
 
 def create_app():
     # raíz del proyecto: .../api-padel
@@ -13,19 +25,33 @@ def create_app():
 
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config["FESTIVOS"] = parse_festivos(app.config["FESTIVOS"])
 
     CORS(app)
 
     db.init_app(app)
+    motor.init_app(app)
+    instrumentacion.init_app(app)
+    enrutador.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    catalogo.init_app(app)
+    disponibilidad.init_app(app)
+    versiones_token.init_app(app)
+    contrasenas.init_app(app)
+    limitador.init_app(app)
+    imagenes.init_app(app)
+    idempotencia.init_app(app)
+    metricas.init_app(app)
 
     from .auth import auth_bp
     from .api import api_bp
     from .admin import admin_bp
+    from .media import media_bp
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(api_bp, url_prefix="/api")
     app.register_blueprint(admin_bp, url_prefix="/admin")
+    app.register_blueprint(media_bp, url_prefix="/media")
 
     @app.route("/")
     def index():
@@ -1,13 +1,32 @@
-from flask import Blueprint, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import csv
+import io
+import json
+
+from flask import Blueprint, Response, request, stream_with_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash
 
+from .catalogo import catalogo
+from .consultas import (
+    ParametroInvalido,
+    iterar_reservas_export,
+    pagina_reservas,
+    parse_fecha_arg,
+    pagina_usuarios,
+    reservas_con_detalle,
+    serializar_reserva,
+)
 from .extensions import db
-from .models import Usuario, Pista, Horario, Extra, Reserva, Rol
+from .disponibilidad import disponibilidad
+from .models import Usuario, Pista, Horario, Extra, Reserva, HorarioReserva, Rol
+from .permisos import admin_required, versiones_token
+from .replicas import en_primaria
 from .utils import allowed_file, make_safe_filename, ensure_folder
 import os
 from flask import current_app
+from datetime import datetime
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -16,52 +35,36 @@ def _user_id() -> int:
     return int(get_jwt_identity())
 
 
-def _check_admin():
-    """Verifica que el usuario autenticado sea administrador (rol nombre 'admin')"""
-    user_id = _user_id()
-    user = db.session.get(Usuario, user_id)
-    
-    if not user or user.rol.nombre != "admin":
-        return False, {"error": "acceso denegado: requiere rol de administrador"}, 403
-    
-    return True, None, None
+def _borrar_reservas(*criterios):
+    """Borra las reservas que cumplen ``criterios`` junto con sus franjas.
+
+    No se confía en el ON DELETE CASCADE porque SQLite no aplica las claves
+    foráneas salvo que se active en cada conexión, y una franja huérfana
+    bloquearía su hueco para siempre.
+    """
+    reserva_ids = select(Reserva.id).where(*criterios)
+    HorarioReserva.query.filter(HorarioReserva.reserva_id.in_(reserva_ids)).delete(synchronize_session=False)
+    Reserva.query.filter(*criterios).delete(synchronize_session=False)
 
 
 # ==================== USUARIOS ====================
 
 @admin_bp.get("/usuarios")
-@jwt_required()
+@admin_required
 def get_usuarios():
-    """Obtener lista de todos los usuarios"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
-    usuarios = Usuario.query.all()
-    result = []
-    
-    for usuario in usuarios:
-        result.append({
-            "id": usuario.id,
-            "nombre": usuario.nombre,
-            "email": usuario.email,
-            "dni": usuario.dni,
-            "foto": usuario.foto,
-            "rol_id": usuario.rol_id,
-            "rol_nombre": usuario.rol.nombre if usuario.rol else None,
-        })
+    """Obtener una página de usuarios (limit, cursor, fields, email, rol_id)"""
+    try:
+        result, siguiente = pagina_usuarios(request.args)
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
     
-    return {"usuarios": result}, 200
+    return {"usuarios": result, "siguiente_cursor": siguiente}, 200
 
 
 @admin_bp.get("/usuarios/<int:usuario_id>")
-@jwt_required()
+@admin_required
 def get_usuario(usuario_id):
     """Obtener detalles de un usuario específico"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     usuario = db.session.get(Usuario, usuario_id)
     if not usuario:
         return {"error": "usuario no encontrado"}, 404
@@ -78,13 +81,9 @@ def get_usuario(usuario_id):
 
 
 @admin_bp.put("/usuarios/<int:usuario_id>")
-@jwt_required()
+@admin_required
 def update_usuario(usuario_id):
     """Actualizar datos de un usuario"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     usuario = db.session.get(Usuario, usuario_id)
     if not usuario:
         return {"error": "usuario no encontrado"}, 404
@@ -115,6 +114,9 @@ def update_usuario(usuario_id):
         rol = db.session.get(Rol, rol_id)
         if not rol:
             return {"error": "rol no encontrado"}, 404
+        if rol.id != usuario.rol_id:
+            # Los tokens emitidos con el rol anterior dejan de ser válidos
+            usuario.token_version += 1
         usuario.rol_id = rol_id
     
     try:
@@ -123,6 +125,8 @@ def update_usuario(usuario_id):
         db.session.rollback()
         return {"error": "error de integridad al actualizar usuario"}, 400
     
+    versiones_token.invalidar(usuario_id)
+    
     return {
         "id": usuario.id,
         "nombre": usuario.nombre,
@@ -133,13 +137,9 @@ def update_usuario(usuario_id):
 
 
 @admin_bp.delete("/usuarios/<int:usuario_id>")
-@jwt_required()
+@admin_required
 def delete_usuario(usuario_id):
     """Eliminar un usuario"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     # No permitir que un administrador se elimine a sí mismo
     current_user_id = _user_id()
     if usuario_id == current_user_id:
@@ -150,25 +150,25 @@ def delete_usuario(usuario_id):
         return {"error": "usuario no encontrado"}, 404
     
     try:
+        _borrar_reservas(Reserva.usuario_id == usuario_id)
         db.session.delete(usuario)
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al eliminar usuario"}, 400
     
+    versiones_token.invalidar(usuario_id)
+    disponibilidad.invalidar()
+    
     return {"message": "usuario eliminado correctamente"}, 200
 
 
 # ==================== PISTAS ====================
 
 @admin_bp.post("/pistas")
-@jwt_required()
+@admin_required
 def crear_pista():
     """Crear una nueva pista"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     data = request.get_json(silent=True) or {}
     
     nombre = (data.get("nombre") or "").strip()
@@ -203,11 +203,14 @@ def crear_pista():
             precio_base=precio_base
         )
         db.session.add(pista)
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al crear pista"}, 400
     
+    catalogo.invalidar()
+    
     return {
         "id": pista.id,
         "nombre": pista.nombre,
@@ -218,13 +221,9 @@ def crear_pista():
 
 
 @admin_bp.put("/pistas/<int:pista_id>")
-@jwt_required()
+@admin_required
 def update_pista(pista_id):
     """Actualizar una pista existente"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     pista = db.session.get(Pista, pista_id)
     if not pista:
         return {"error": "pista no encontrada"}, 404
@@ -261,11 +260,14 @@ def update_pista(pista_id):
             return {"error": "precio_base debe ser número"}, 400
     
     try:
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al actualizar pista"}, 400
     
+    catalogo.invalidar()
+    
     return {
         "id": pista.id,
         "nombre": pista.nombre,
@@ -276,37 +278,33 @@ def update_pista(pista_id):
 
 
 @admin_bp.delete("/pistas/<int:pista_id>")
-@jwt_required()
+@admin_required
 def delete_pista(pista_id):
     """Eliminar una pista"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     pista = db.session.get(Pista, pista_id)
     if not pista:
         return {"error": "pista no encontrada"}, 404
     
     try:
+        _borrar_reservas(Reserva.pista_id == pista_id)
         db.session.delete(pista)
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al eliminar pista"}, 400
     
+    catalogo.invalidar()
+    
     return {"message": "pista eliminada correctamente"}, 200
 
 
 # ==================== HORARIOS ====================
 
 @admin_bp.post("/horarios")
-@jwt_required()
+@admin_required
 def crear_horario():
     """Crear un nuevo horario"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     data = request.get_json(silent=True) or {}
     
     franja = (data.get("franja") or "").strip()
@@ -323,11 +321,14 @@ def crear_horario():
     try:
         horario = Horario(franja=franja, turno=turno)
         db.session.add(horario)
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al crear horario"}, 400
     
+    catalogo.invalidar()
+    
     return {
         "id": horario.id,
         "franja": horario.franja,
@@ -336,13 +337,9 @@ def crear_horario():
 
 
 @admin_bp.put("/horarios/<int:horario_id>")
-@jwt_required()
+@admin_required
 def update_horario(horario_id):
     """Actualizar un horario existente"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     horario = db.session.get(Horario, horario_id)
     if not horario:
         return {"error": "horario no encontrado"}, 404
@@ -373,11 +370,14 @@ def update_horario(horario_id):
         horario.turno = turno
     
     try:
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al actualizar horario"}, 400
     
+    catalogo.invalidar()
+    
     return {
         "id": horario.id,
         "franja": horario.franja,
@@ -386,37 +386,32 @@ def update_horario(horario_id):
 
 
 @admin_bp.delete("/horarios/<int:horario_id>")
-@jwt_required()
+@admin_required
 def delete_horario(horario_id):
     """Eliminar un horario"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     horario = db.session.get(Horario, horario_id)
     if not horario:
         return {"error": "horario no encontrado"}, 404
     
     try:
         db.session.delete(horario)
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al eliminar horario"}, 400
     
+    catalogo.invalidar()
+    
     return {"message": "horario eliminado correctamente"}, 200
 
 
 # ==================== EXTRAS ====================
 
 @admin_bp.post("/extras")
-@jwt_required()
+@admin_required
 def crear_extra():
     """Crear un nuevo extra"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     data = request.get_json(silent=True) or {}
     
     nombre = (data.get("nombre") or "").strip()
@@ -440,11 +435,14 @@ def crear_extra():
     try:
         extra = Extra(nombre=nombre, precio_extra=precio_extra)
         db.session.add(extra)
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al crear extra"}, 400
     
+    catalogo.invalidar()
+    
     return {
         "id": extra.id,
         "nombre": extra.nombre,
@@ -453,13 +451,9 @@ def crear_extra():
 
 
 @admin_bp.put("/extras/<int:extra_id>")
-@jwt_required()
+@admin_required
 def update_extra(extra_id):
     """Actualizar un extra existente"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     extra = db.session.get(Extra, extra_id)
     if not extra:
         return {"error": "extra no encontrado"}, 404
@@ -484,11 +478,14 @@ def update_extra(extra_id):
             return {"error": "precio_extra debe ser número"}, 400
     
     try:
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al actualizar extra"}, 400
     
+    catalogo.invalidar()
+    
     return {
         "id": extra.id,
         "nombre": extra.nombre,
@@ -497,134 +494,156 @@ def update_extra(extra_id):
 
 
 @admin_bp.delete("/extras/<int:extra_id>")
-@jwt_required()
+@admin_required
 def delete_extra(extra_id):
     """Eliminar un extra"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     extra = db.session.get(Extra, extra_id)
     if not extra:
         return {"error": "extra no encontrado"}, 404
     
     try:
         db.session.delete(extra)
+        catalogo.registrar_cambio()
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al eliminar extra"}, 400
     
+    catalogo.invalidar()
+    
     return {"message": "extra eliminado correctamente"}, 200
 
 
 # ==================== RESERVAS ====================
 
 @admin_bp.get("/reservas")
-@jwt_required()
+@admin_required
 def get_todas_reservas():
-    """Obtener todas las reservas (solo para administradores)"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
-    reservas = Reserva.query.all()
-    result = []
+    """Obtener una página de reservas (limit, cursor, fields, fecha_desde, fecha_hasta, pista_id, usuario_id)"""
+    try:
+        result, siguiente = pagina_reservas(request.args)
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
     
+    return {"reservas": result, "siguiente_cursor": siguiente}, 200
+
+
+EXPORT_COLUMNAS = (
+    "id", "fecha", "usuario_id", "usuario_email", "usuario_nombre",
+    "pista_id", "pista_nombre", "horarios", "num_horarios", "total_precio",
+)
+
+
+def _export_ndjson(reservas):
     for reserva in reservas:
-        horarios = []
-        total = 0
-        
-        for hr in reserva.horarios:
-            h = hr.horario
-            precio = float(hr.precio)
-            total += precio
-            
-            horarios.append({
-                "horario_reserva_id": hr.id,
-                "horario_id": h.id,
-                "franja": h.franja,
-                "turno": h.turno,
-                "precio": f"{precio:.2f}",
-            })
-        
-        total_precio = getattr(reserva, "total_precio", total)
-        
-        result.append({
-            "id": reserva.id,
-            "usuario_id": reserva.usuario_id,
-            "usuario_email": reserva.usuario.email if reserva.usuario else None,
-            "usuario_nombre": reserva.usuario.nombre if reserva.usuario else None,
-            "pista_id": reserva.pista_id,
-            "pista_nombre": reserva.pista.nombre if reserva.pista else None,
-            "fecha": reserva.fecha.strftime("%Y-%m-%d") if reserva.fecha else None,
-            "total_precio": f"{total_precio:.2f}",
-            "horarios": horarios,
-        })
+        yield json.dumps(reserva, ensure_ascii=False) + "\n"
+
+
+def _export_csv(reservas):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def _vaciar():
+        valor = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return valor
+
+    writer.writerow(EXPORT_COLUMNAS)
+    yield _vaciar()
+    for reserva in reservas:
+        reserva["horarios"] = ";".join(reserva["horarios"])
+        writer.writerow([reserva[c] for c in EXPORT_COLUMNAS])
+        yield _vaciar()
+
+
+@admin_bp.get("/reservas/export")
+@admin_required
+def exportar_reservas():
+    """Exportar reservas en streaming como NDJSON o CSV (formato, fecha_desde, fecha_hasta)"""
+    formato = request.args.get("formato", "ndjson")
+    if formato not in ("ndjson", "csv"):
+        return {"error": "formato debe ser 'ndjson' o 'csv'"}, 400
+    
+    try:
+        fecha_desde = parse_fecha_arg(request.args, "fecha_desde")
+        fecha_hasta = parse_fecha_arg(request.args, "fecha_hasta")
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
+    
+    reservas = iterar_reservas_export(fecha_desde, fecha_hasta)
+    if formato == "csv":
+        cuerpo, mimetype = _export_csv(reservas), "text/csv"
+    else:
+        cuerpo, mimetype = _export_ndjson(reservas), "application/x-ndjson"
     
-    return {"reservas": result}, 200
+    return Response(
+        stream_with_context(cuerpo),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=reservas.{formato}"},
+    )
 
 
 @admin_bp.get("/reservas/<int:reserva_id>")
-@jwt_required()
+@admin_required
 def get_reserva_detalle(reserva_id):
     """Obtener detalles de una reserva específica"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
-    reserva = db.session.get(Reserva, reserva_id)
+    reserva = reservas_con_detalle(incluir_usuario=True).filter(Reserva.id == reserva_id).first()
     if not reserva:
         return {"error": "reserva no encontrada"}, 404
     
-    horarios = []
-    total = 0
-    
-    for hr in reserva.horarios:
-        h = hr.horario
-        precio = float(hr.precio)
-        total += precio
-        
-        horarios.append({
-            "horario_reserva_id": hr.id,
-            "horario_id": h.id,
-            "franja": h.franja,
-            "turno": h.turno,
-            "precio": f"{precio:.2f}",
-        })
-    
-    total_precio = getattr(reserva, "total_precio", total)
-    
-    return {
-        "id": reserva.id,
-        "usuario_id": reserva.usuario_id,
-        "usuario_email": reserva.usuario.email if reserva.usuario else None,
-        "usuario_nombre": reserva.usuario.nombre if reserva.usuario else None,
-        "pista_id": reserva.pista_id,
-        "pista_nombre": reserva.pista.nombre if reserva.pista else None,
-        "fecha": reserva.fecha.strftime("%Y-%m-%d") if reserva.fecha else None,
-        "total_precio": f"{total_precio:.2f}",
-        "horarios": horarios,
-    }, 200
+    return serializar_reserva(reserva, incluir_usuario=True), 200
 
 
 @admin_bp.delete("/reservas/<int:reserva_id>")
-@jwt_required()
+@admin_required
 def delete_reserva_admin(reserva_id):
     """Eliminar una reserva (solo administrador)"""
-    is_admin, error_response, status_code = _check_admin()
-    if not is_admin:
-        return error_response, status_code
-    
     reserva = db.session.get(Reserva, reserva_id)
     if not reserva:
         return {"error": "reserva no encontrada"}, 404
     
+    pista_id, fecha = reserva.pista_id, reserva.fecha
+    horario_ids = [
+        hid for (hid,) in db.session.query(HorarioReserva.horario_id).filter_by(reserva_id=reserva.id)
+    ]
+    
     try:
+        HorarioReserva.query.filter_by(reserva_id=reserva.id).delete()
         db.session.delete(reserva)
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         return {"error": "error al eliminar reserva"}, 400
     
+    disponibilidad.liberar(pista_id, fecha, horario_ids)
+    
     return {"message": "reserva eliminada correctamente"}, 200
+
+
+# ==================== DISPONIBILIDAD ====================
+
+@admin_bp.get("/disponibilidad/verificar")
+@admin_required
+@en_primaria
+def verificar_disponibilidad():
+    """Comparar el índice de disponibilidad de este proceso con la BD para una fecha"""
+    fecha = request.args.get("fecha")
+    if not fecha:
+        return {"error": "fecha es obligatoria"}, 400
+    
+    try:
+        fecha_dt = datetime.strptime(fecha, "%Y-%m-%d").date()
+    except ValueError:
+        return {"error": "fecha debe tener formato YYYY-MM-DD"}, 400
+    
+    discrepancias = disponibilidad.verificar(fecha_dt)
+    return {"fecha": fecha, "consistente": not discrepancias, "discrepancias": discrepancias}, 200
+
+
+@admin_bp.post("/disponibilidad/reconstruir")
+@admin_required
+def reconstruir_disponibilidad():
+    """Rehacer desde la BD el índice de disponibilidad de este proceso"""
+    fechas = disponibilidad.reconstruir()
+    return {"message": "índice reconstruido", "fechas_cargadas": fechas}, 200
@@ -1,54 +1,70 @@
+import base64
 import os
-from datetime import datetime
-from decimal import Decimal
+import time
+from datetime import datetime, timedelta
 
-from flask import Blueprint, request
+from flask import Blueprint, Response, current_app, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, OperationalError
 
+from .catalogo import catalogo
+from .consultas import reservas_con_detalle, serializar_reserva
 from .extensions import db
-from .models import Usuario, Pista, Horario, Extra, Reserva, HorarioReserva
+from .disponibilidad import disponibilidad
+from .idempotencia import idempotente
+from .models import Reserva, HorarioReserva
+from .precios import extra_json, tarifa_vigente
+from .replicas import solo_lectura
 from .utils import allowed_file, make_safe_filename, ensure_folder
 
 api_bp = Blueprint("api", __name__)
 
+# Máximo de días que se pueden pedir en /disponibilidad_rango
+MAX_DIAS_RANGO = 62
+
+# Máximo de cestas por petición en /calcular_precio_lote
+MAX_CESTAS_LOTE = 200
+
+# Intentos de /reservar ante bloqueos de la BD antes de devolver 409
+RESERVA_REINTENTOS = 3
+
+# Límites de /reservar_lote
+MAX_OCURRENCIAS_LOTE = 200
+MAX_DIAS_RECURRENCIA = 366
+
 
 def _user_id() -> int:
     return int(get_jwt_identity())
 
 
+def _respuesta_catalogo(clave: str):
+    cuerpo, etag = catalogo.get().serializado(clave)
+    # If-None-Match compara en débil: un proxy que comprime devuelve W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(cuerpo, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = current_app.config["CATALOGO_CACHE_CONTROL"]
+    return response
+
+
 @api_bp.get("/pistas")
 @jwt_required()
 def get_pistas():
-    pistas = Pista.query.all()
-    result = []
-    for pista in pistas:
-        result.append({
-            "id": pista.id,
-            "nombre": pista.nombre,
-            "cubierta": pista.cubierta,
-            "precio_base": str(pista.precio_base),
-            "plazas": getattr(pista, "plazas", None),
-        })
-    return {"pistas": result}, 200
+    return _respuesta_catalogo("pistas")
 
 
 @api_bp.get("/horarios")
 @jwt_required()
 def get_horarios():
-    horarios = Horario.query.all()
-    result = []
-    for horario in horarios:
-        result.append({
-            "id": horario.id,
-            "franja": horario.franja,
-            "turno": horario.turno,
-        })
-    return {"horarios": result}, 200
+    return _respuesta_catalogo("horarios")
 
 
 @api_bp.post("/disponibilidadpista")
 @jwt_required()
+@solo_lectura
 def get_disponibilidades():
     data = request.get_json(silent=True) or {}
 
@@ -68,28 +84,14 @@ def get_disponibilidades():
     except ValueError:
         return {"error": "fecha debe tener formato YYYY-MM-DD"}, 400
 
-    todos_horarios = Horario.query.all()
-
-    reservados = (
-        db.session.query(Horario.id)
-        .join(HorarioReserva, HorarioReserva.horario_id == Horario.id)
-        .join(Reserva, Reserva.id == HorarioReserva.reserva_id)
-        .filter(Reserva.pista_id == pista_id, Reserva.fecha == fecha_dt)
-        .all()
-    )
-    reservados_ids = {r[0] for r in reservados}
-
-    disponibles = [
-        {"id": h.id, "franja": h.franja, "turno": h.turno}
-        for h in todos_horarios
-        if h.id not in reservados_ids
-    ]
+    disponibles = disponibilidad.disponibles(pista_id, fecha_dt)
 
     return {"disponibilidades": disponibles}, 200
 
 
 @api_bp.post("/disponibilidad")
 @jwt_required()
+@solo_lectura
 def get_disponibilidades_todas_pistas_post():
     data = request.get_json(silent=True) or {}
     fecha = data.get("fecha")
@@ -102,141 +104,196 @@ def get_disponibilidades_todas_pistas_post():
     except ValueError:
         return {"error": "fecha debe tener formato YYYY-MM-DD"}, 400
 
-    pistas = Pista.query.all()
-    horarios = Horario.query.all()
+    result = disponibilidad.disponibles_por_pista(fecha_dt)
 
-    reservados = (
-        db.session.query(Reserva.pista_id, HorarioReserva.horario_id)
-        .join(HorarioReserva, HorarioReserva.reserva_id == Reserva.id)
-        .filter(Reserva.fecha == fecha_dt)
-        .all()
-    )
+    return {"disponibilidades_por_pista": result}, 200
 
-    reservados_por_pista = {}
-    for pista_id, horario_id in reservados:
-        reservados_por_pista.setdefault(pista_id, set()).add(horario_id)
 
-    result = []
-    for pista in pistas:
-        reservados_ids = reservados_por_pista.get(pista.id, set())
+def _codificar_mascara(mascara: int, n_bits: int, formato: str) -> str:
+    # "bits": carácter i = horario i ("1" ocupado). "base64": bit i del entero
+    # little-endian de ceil(n/8) bytes = horario i.
+    if formato == "base64":
+        return base64.b64encode(mascara.to_bytes((n_bits + 7) // 8, "little")).decode("ascii")
+    return "".join("1" if mascara >> i & 1 else "0" for i in range(n_bits))
 
-        disponibles = [
-            {"id": h.id, "franja": h.franja, "turno": h.turno}
-            for h in horarios
-            if h.id not in reservados_ids
-        ]
 
-        result.append({
-            "pista_id": pista.id,
-            "pista_nombre": pista.nombre,
-            "disponibilidades": disponibles
-        })
+@api_bp.post("/disponibilidad_rango")
+@jwt_required()
+@solo_lectura
+def get_disponibilidad_rango():
+    data = request.get_json(silent=True) or {}
+    fecha_desde = data.get("fecha_desde")
+    fecha_hasta = data.get("fecha_hasta")
+    pista_ids = data.get("pista_ids")
+    formato = data.get("formato", "bits")
 
-    return {"disponibilidades_por_pista": result}, 200
+    if not fecha_desde or not fecha_hasta:
+        return {"error": "fecha_desde y fecha_hasta son obligatorias"}, 400
 
+    try:
+        desde_dt = datetime.strptime(fecha_desde, "%Y-%m-%d").date()
+        hasta_dt = datetime.strptime(fecha_hasta, "%Y-%m-%d").date()
+    except ValueError:
+        return {"error": "las fechas deben tener formato YYYY-MM-DD"}, 400
 
-@api_bp.post("/calcular_precio")
-@jwt_required()
-def calcular_precio():
-    data = request.get_json(silent=True) or {}
+    if hasta_dt < desde_dt:
+        return {"error": "fecha_hasta no puede ser anterior a fecha_desde"}, 400
+
+    if (hasta_dt - desde_dt).days + 1 > MAX_DIAS_RANGO:
+        return {"error": f"el rango no puede superar {MAX_DIAS_RANGO} días"}, 400
+
+    if formato not in ("bits", "base64"):
+        return {"error": "formato debe ser 'bits' o 'base64'"}, 400
+
+    if pista_ids is not None:
+        if not isinstance(pista_ids, list):
+            return {"error": "pista_ids debe ser una lista"}, 400
+        try:
+            pista_ids = {int(p) for p in pista_ids}
+        except (TypeError, ValueError):
+            return {"error": "pista_ids debe contener ids enteros"}, 400
+
+    fechas, horarios, ocupacion = disponibilidad.ocupacion_rango(desde_dt, hasta_dt, pista_ids)
+    n_bits = len(horarios)
+
+    return {
+        "formato": formato,
+        "horarios": horarios,
+        "fechas": [f.strftime("%Y-%m-%d") for f in fechas],
+        "pistas": [
+            {
+                "pista_id": pista_id,
+                "pista_nombre": nombre,
+                "ocupacion": [_codificar_mascara(m, n_bits, formato) for m in mascaras],
+            }
+            for pista_id, nombre, mascaras in ocupacion
+        ],
+    }, 200
+
+
+def _presupuesto_json(presupuesto) -> dict:
+    extras = [extra_json(e) for e in presupuesto.extras]
+    return {
+        "total_precio": f"{presupuesto.total:.2f}",
+        "precio_por_franja": f"{presupuesto.precio_por_franja:.2f}",
+        "precios_por_horario": [
+            {"horario_id": hid, "precio": f"{precio:.2f}"} for hid, precio in presupuesto.precios
+        ],
+        # extra_aplicado se mantiene por compatibilidad con clientes antiguos
+        "extra_aplicado": extras[0] if extras else None,
+        "extras_aplicados": extras,
+    }
+
+
+def _validar_cesta(data, cat):
+    """Valida ``{pista_id, fecha, horario_ids}`` contra el catálogo.
+
+    Devuelve ``((pista_id, fecha, horario_ids), None)`` o ``(None, (error, status))``.
+    """
     pista_id = data.get("pista_id")
     fecha = data.get("fecha")
     horario_ids = data.get("horario_ids", [])
 
     if pista_id is None or not fecha or not horario_ids:
-        return {"error": "pista_id, fecha y horario_ids son obligatorios"}, 400
+        return None, ({"error": "pista_id, fecha y horario_ids son obligatorios"}, 400)
 
     try:
         pista_id = int(pista_id)
     except (TypeError, ValueError):
-        return {"error": "pista_id debe ser entero"}, 400
+        return None, ({"error": "pista_id debe ser entero"}, 400)
 
     try:
         horario_ids = [int(h) for h in horario_ids]
     except (TypeError, ValueError):
-        return {"error": "horario_ids debe contener ids enteros"}, 400
+        return None, ({"error": "horario_ids debe contener ids enteros"}, 400)
 
     try:
         fecha_dt = datetime.strptime(fecha, "%Y-%m-%d").date()
-    except ValueError:
-        return {"error": "fecha debe tener formato YYYY-MM-DD"}, 400
+    except (TypeError, ValueError):
+        return None, ({"error": "fecha debe tener formato YYYY-MM-DD"}, 400)
 
-    pista = db.session.get(Pista, pista_id)
-    if not pista:
-        return {"error": "pista no encontrada"}, 404
+    if pista_id not in cat.pistas_por_id:
+        return None, ({"error": "pista no encontrada"}, 404)
 
     # Validar horarios
-    count_horarios = Horario.query.filter(Horario.id.in_(horario_ids)).count()
-    if count_horarios != len(set(horario_ids)):
-        return {"error": "algún horario no existe"}, 400
-
-    precio_franja = Decimal(str(pista.precio_base))
-    total_precio = precio_franja * Decimal(len(set(horario_ids)))
-
-    # Extra fin de semana (una vez)
-    es_fin_semana = (fecha_dt.weekday() >= 5)
-    extra_aplicado = None
-    if es_fin_semana:
-        extra = Extra.query.filter(db.func.lower(Extra.nombre) == "fin de semana").first()
-        if extra:
-            extra_importe = Decimal(str(extra.precio_extra))
-            total_precio += extra_importe
-            extra_aplicado = {
-                "id": extra.id,
-                "nombre": extra.nombre,
-                "precio_extra": f"{extra_importe:.2f}"
-            }
+    if any(h not in cat.horarios_por_id for h in horario_ids):
+        return None, ({"error": "algún horario no existe"}, 400)
 
-    return {
-        "total_precio": f"{total_precio:.2f}",
-        "precio_por_franja": f"{precio_franja:.2f}",
-        "extra_aplicado": extra_aplicado
-    }, 200
+    return (pista_id, fecha_dt, horario_ids), None
+
+
+@api_bp.post("/calcular_precio")
+@jwt_required()
+@solo_lectura
+def calcular_precio():
+    data = request.get_json(silent=True) or {}
+
+    cat = catalogo.get()
+    cesta, error = _validar_cesta(data, cat)
+    if error:
+        return error
+
+    presupuesto = tarifa_vigente(cat).presupuestar(*cesta)
+
+    return _presupuesto_json(presupuesto), 200
+
+
+@api_bp.post("/calcular_precio_lote")
+@jwt_required()
+@solo_lectura
+def calcular_precio_lote():
+    data = request.get_json(silent=True) or {}
+    cestas = data.get("cestas")
+
+    if not isinstance(cestas, list) or not cestas:
+        return {"error": "cestas debe ser una lista no vacía"}, 400
+
+    if len(cestas) > MAX_CESTAS_LOTE:
+        return {"error": f"no se pueden presupuestar más de {MAX_CESTAS_LOTE} cestas a la vez"}, 400
+
+    # Catálogo y tarifa se leen una vez para todo el lote
+    cat = catalogo.get()
+    tarifa = tarifa_vigente(cat)
+
+    resultados = []
+    for indice, cesta in enumerate(cestas):
+        if not isinstance(cesta, dict):
+            resultados.append({"indice": indice, "status": 400, "error": "cada cesta debe ser un objeto"})
+            continue
+        valores, error = _validar_cesta(cesta, cat)
+        if error:
+            cuerpo, status = error
+            resultados.append({"indice": indice, "status": status, **cuerpo})
+            continue
+        presupuesto = tarifa.presupuestar(*valores)
+        resultados.append({"indice": indice, "status": 200, **_presupuesto_json(presupuesto)})
+
+    return {"resultados": resultados}, 200
 
 
 @api_bp.get("/mis_reservas")
 @jwt_required()
 def get_mis_reservas():
     user_id = _user_id()
-    reservas = Reserva.query.filter_by(usuario_id=user_id).all()
-
-    result = []
-    for reserva in reservas:
-        horarios = []
-        total = Decimal("0.00")
-
-        for hr in reserva.horarios:  # relación Reserva.horarios -> HorarioReserva
-            h = hr.horario          # relación HorarioReserva.horario -> Horario
-            precio = Decimal(str(hr.precio))
-            total += precio
-
-            horarios.append({
-                "horario_reserva_id": hr.id,
-                "horario_id": h.id,
-                "franja": h.franja,
-                "turno": h.turno,
-                "precio": f"{precio:.2f}",
-            })
+    reservas = reservas_con_detalle().filter(Reserva.usuario_id == user_id).all()
+    result = [serializar_reserva(reserva) for reserva in reservas]
 
-        # Si tu Reserva guarda total_precio, úsalo; si no, calcula
-        total_precio = getattr(reserva, "total_precio", None)
-        if total_precio is None:
-            total_precio = total
+    return {"reservas": result}, 200
 
-        result.append({
-            "id": reserva.id,
-            "pista_id": reserva.pista_id,
-            "pista_nombre": reserva.pista.nombre if reserva.pista else None,
-            "fecha": reserva.fecha.strftime("%Y-%m-%d") if reserva.fecha else None,
-            "total_precio": f"{Decimal(str(total_precio)):.2f}",
-            "horarios": horarios,
-        })
 
-    return {"reservas": result}, 200
+def _horarios_ocupados(pista_id, fecha, horario_ids):
+    return sorted(
+        hid for (hid,) in db.session.query(HorarioReserva.horario_id).filter(
+            HorarioReserva.pista_id == pista_id,
+            HorarioReserva.fecha == fecha,
+            HorarioReserva.horario_id.in_(horario_ids),
+        )
+    )
 
 
 @api_bp.post("/reservar")
 @jwt_required()
+@idempotente
 def reservar():
     user_id = _user_id()
 
@@ -269,108 +326,291 @@ def reservar():
     except ValueError:
         return {"error": "fecha debe tener formato YYYY-MM-DD"}, 400
 
-    pista = db.session.get(Pista, pista_id)
+    cat = catalogo.get()
+    pista = cat.pistas_por_id.get(pista_id)
     if not pista:
         return {"error": "pista no encontrada"}, 404
 
-    horarios = Horario.query.filter(Horario.id.in_(horario_ids)).all()
-    if len(horarios) != len(horario_ids):
-        existentes = {h.id for h in horarios}
-        faltan = sorted(list(set(horario_ids) - existentes))
+    faltan = sorted(h for h in horario_ids if h not in cat.horarios_por_id)
+    if faltan:
         return {"error": "algunos horarios no existen", "horarios_inexistentes": faltan}, 400
 
-    conflictos = (
-        db.session.query(HorarioReserva.horario_id)
-        .join(Reserva, Reserva.id == HorarioReserva.reserva_id)
-        .filter(
-            Reserva.pista_id == pista_id,
-            Reserva.fecha == fecha_dt,
-            HorarioReserva.horario_id.in_(horario_ids)
-        )
-        .all()
-    )
-    if conflictos:
-        ocupados = sorted([c[0] for c in conflictos])
-        return {
-            "error": "hay horarios no disponibles",
-            "pista_id": pista_id,
-            "fecha": fecha_str,
-            "horarios_ocupados": ocupados
-        }, 409
-
-    precio_franja = Decimal(str(pista.precio_base))
-    total_precio = precio_franja * Decimal(len(horario_ids))
-
-    extra_aplicado = None
-    es_fin_semana = (fecha_dt.weekday() >= 5)
-    if es_fin_semana:
-        extra = Extra.query.filter(db.func.lower(Extra.nombre) == "fin de semana").first()
-        if extra:
-            extra_importe = Decimal(str(extra.precio_extra))
-            total_precio += extra_importe
-            extra_aplicado = {
-                "id": extra.id,
-                "nombre": extra.nombre,
-                "precio_extra": f"{extra_importe:.2f}"
-            }
-
-    try:
-        reserva = Reserva(
-            usuario_id=user_id,
-            pista_id=pista_id,
-            fecha=fecha_dt
-        )
-
-        if hasattr(Reserva, "total_precio"):
-            reserva.total_precio = total_precio
-
-        db.session.add(reserva)
-        db.session.flush()  # reserva.id
-
-        for hid in horario_ids:
-            db.session.add(HorarioReserva(
-                reserva_id=reserva.id,
-                horario_id=hid,
-                precio=precio_franja
-            ))
-
-        db.session.commit()
-
-    except IntegrityError:
-        db.session.rollback()
+    presupuesto = tarifa_vigente(cat).presupuestar(pista_id, fecha_dt, horario_ids)
+    precios = dict(presupuesto.precios)
+
+    # No se comprueba antes si las franjas están libres: la restricción
+    # uq_horarios_reserva_pista_fecha_horario decide qué petición se las queda.
+    for intento in range(RESERVA_REINTENTOS):
+        try:
+            reserva = Reserva(
+                usuario_id=user_id,
+                pista_id=pista_id,
+                fecha=fecha_dt
+            )
+
+            db.session.add(reserva)
+            db.session.flush()  # reserva.id
+
+            for hid in horario_ids:
+                db.session.add(HorarioReserva(
+                    reserva_id=reserva.id,
+                    pista_id=pista_id,
+                    fecha=fecha_dt,
+                    horario_id=hid,
+                    precio=precios[hid]
+                ))
+
+            db.session.commit()
+            break
+
+        except IntegrityError:
+            db.session.rollback()
+            ocupados = _horarios_ocupados(pista_id, fecha_dt, horario_ids)
+            if ocupados:
+                return {
+                    "error": "hay horarios no disponibles",
+                    "pista_id": pista_id,
+                    "fecha": fecha_str,
+                    "horarios_ocupados": ocupados
+                }, 409
+            # La reserva con la que chocamos ya se ha cancelado: reintentar
+
+        except OperationalError:
+            # BD bloqueada o conflicto de serialización: reintentar con espera
+            db.session.rollback()
+            time.sleep(0.05 * (intento + 1))
+
+        except Exception as e:
+            db.session.rollback()
+            return {"error": "error interno creando la reserva", "detail": str(e)}, 500
+
+    else:
         return {"error": "conflicto al crear reserva (posible doble reserva)"}, 409
 
-    except Exception as e:
-        db.session.rollback()
-        return {"error": "error interno creando la reserva", "detail": str(e)}, 500
+    disponibilidad.marcar(pista_id, fecha_dt, horario_ids)
 
     # Respuesta detallada
-    horarios_map = {h.id: h for h in horarios}
     detalle_horarios = []
     for hid in sorted(horario_ids):
-        h = horarios_map[hid]
+        h = cat.horarios_por_id[hid]
         detalle_horarios.append({
             "horario_id": h.id,
             "franja": h.franja,
             "turno": h.turno,
-            "precio": f"{precio_franja:.2f}"
+            "precio": f"{precios[hid]:.2f}"
         })
 
+    extras = [extra_json(e) for e in presupuesto.extras]
     return {
         "reserva": {
             "id": reserva.id,
             "usuario_id": user_id,
             "pista": {"id": pista.id, "nombre": pista.nombre},
             "fecha": fecha_str,
-            "total_precio": f"{total_precio:.2f}",
-            "extra_aplicado": extra_aplicado,
+            "total_precio": f"{presupuesto.total:.2f}",
+            "extra_aplicado": extras[0] if extras else None,
+            "extras_aplicados": extras,
             "horarios": detalle_horarios
         }
     }, 201
 
 
+def _expandir_recurrencia(rec):
+    """Convierte ``{pista_id, horario_ids, fecha_desde, fecha_hasta, dias_semana}``
+    en una lista de ocurrencias (``dias_semana``: 0 = lunes ... 6 = domingo)."""
+    try:
+        desde = datetime.strptime(rec.get("fecha_desde") or "", "%Y-%m-%d").date()
+        hasta = datetime.strptime(rec.get("fecha_hasta") or "", "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None, "fecha_desde y fecha_hasta deben tener formato YYYY-MM-DD"
+    dias = rec.get("dias_semana")
+    if not isinstance(dias, list) or not dias:
+        return None, "dias_semana debe ser una lista no vacía (0 = lunes ... 6 = domingo)"
+    try:
+        dias = {int(d) for d in dias}
+    except (TypeError, ValueError):
+        return None, "dias_semana debe contener enteros"
+    if hasta < desde:
+        return None, "fecha_hasta no puede ser anterior a fecha_desde"
+    if (hasta - desde).days > MAX_DIAS_RECURRENCIA:
+        return None, f"la recurrencia no puede superar {MAX_DIAS_RECURRENCIA} días"
+
+    ocurrencias = []
+    fecha = desde
+    while fecha <= hasta:
+        if fecha.weekday() in dias:
+            ocurrencias.append({
+                "pista_id": rec.get("pista_id"),
+                "fecha": fecha.strftime("%Y-%m-%d"),
+                "horario_ids": rec.get("horario_ids", []),
+            })
+        fecha += timedelta(days=1)
+    return ocurrencias, None
+
+
+def _conflictos_lote(validas):
+    """Franjas ya ocupadas (o repetidas dentro del lote) de cada ocurrencia.
+
+    Una sola consulta sobre el conjunto de pistas, fechas y horarios pedidos;
+    el cruce exacto se hace en Python.
+    """
+    pistas = {o[1] for o in validas}
+    fechas = {o[2] for o in validas}
+    horarios = {h for o in validas for h in o[3]}
+    ocupadas = set(
+        db.session.query(HorarioReserva.pista_id, HorarioReserva.fecha, HorarioReserva.horario_id)
+        .filter(
+            HorarioReserva.pista_id.in_(pistas),
+            HorarioReserva.fecha.in_(fechas),
+            HorarioReserva.horario_id.in_(horarios),
+        )
+        .all()
+    )
+
+    conflictos = {}
+    pedidas = set()
+    for indice, pista_id, fecha, horario_ids in validas:
+        chocan = []
+        for hid in horario_ids:
+            clave = (pista_id, fecha, hid)
+            if clave in ocupadas or clave in pedidas:
+                chocan.append(hid)
+        if chocan:
+            conflictos[indice] = sorted(chocan)
+        else:
+            pedidas.update((pista_id, fecha, hid) for hid in horario_ids)
+    return conflictos
+
+
+@api_bp.post("/reservar_lote")
+@jwt_required()
+def reservar_lote():
+    user_id = _user_id()
+    data = request.get_json(silent=True) or {}
+    modo = data.get("modo", "todo_o_nada")
+
+    if modo not in ("todo_o_nada", "parcial"):
+        return {"error": "modo debe ser 'todo_o_nada' o 'parcial'"}, 400
+
+    if data.get("recurrencia") is not None:
+        if not isinstance(data["recurrencia"], dict):
+            return {"error": "recurrencia debe ser un objeto"}, 400
+        ocurrencias, error = _expandir_recurrencia(data["recurrencia"])
+        if error:
+            return {"error": error}, 400
+    else:
+        ocurrencias = data.get("ocurrencias")
+        if not isinstance(ocurrencias, list):
+            return {"error": "hay que indicar ocurrencias (lista) o recurrencia"}, 400
+
+    if not ocurrencias:
+        return {"error": "no hay ninguna ocurrencia que reservar"}, 400
+
+    if len(ocurrencias) > MAX_OCURRENCIAS_LOTE:
+        return {"error": f"no se pueden reservar más de {MAX_OCURRENCIAS_LOTE} ocurrencias a la vez"}, 400
+
+    cat = catalogo.get()
+    tarifa = tarifa_vigente(cat)
+
+    errores = []
+    validas = []  # (indice, pista_id, fecha, horario_ids)
+    for indice, ocurrencia in enumerate(ocurrencias):
+        if not isinstance(ocurrencia, dict):
+            errores.append({"indice": indice, "status": 400, "error": "cada ocurrencia debe ser un objeto"})
+            continue
+        valores, error = _validar_cesta(ocurrencia, cat)
+        if error:
+            cuerpo, status = error
+            errores.append({"indice": indice, "status": status, **cuerpo})
+            continue
+        pista_id, fecha_dt, horario_ids = valores
+        validas.append((indice, pista_id, fecha_dt, list(dict.fromkeys(horario_ids))))
+
+    if errores and modo == "todo_o_nada":
+        return {"error": "hay ocurrencias no válidas", "errores": errores}, 400
+
+    for intento in range(RESERVA_REINTENTOS):
+        conflictos = _conflictos_lote(validas) if validas else {}
+        if conflictos and modo == "todo_o_nada":
+            return {
+                "error": "hay horarios no disponibles",
+                "conflictos": [{"indice": i, "horarios_ocupados": h} for i, h in sorted(conflictos.items())],
+            }, 409
+
+        a_reservar = [o for o in validas if o[0] not in conflictos]
+        if not a_reservar:
+            break
+
+        presupuestos = [tarifa.presupuestar(p, f, h) for _, p, f, h in a_reservar]
+        try:
+            # RETURNING no garantiza el orden de las filas en ningún motor:
+            # sort_by_parameter_order hace que SQLAlchemy devuelva los ids en
+            # el orden de los parámetros para emparejarlos con a_reservar
+            reserva_ids = db.session.execute(
+                insert(Reserva).returning(Reserva.id, sort_by_parameter_order=True),
+                [{"usuario_id": user_id, "pista_id": p, "fecha": f} for _, p, f, _ in a_reservar],
+            ).scalars().all()
+            db.session.execute(insert(HorarioReserva), [
+                {
+                    "reserva_id": reserva_id,
+                    "pista_id": pista_id,
+                    "fecha": fecha_dt,
+                    "horario_id": hid,
+                    "precio": precio,
+                }
+                for reserva_id, (_, pista_id, fecha_dt, _), presupuesto in zip(reserva_ids, a_reservar, presupuestos)
+                for hid, precio in presupuesto.precios
+            ])
+            db.session.commit()
+            break
+
+        except IntegrityError:
+            # Otra petición se ha llevado alguna franja entre la comprobación y
+            # la inserción: se vuelve a calcular qué choca
+            db.session.rollback()
+
+        except OperationalError:
+            db.session.rollback()
+            time.sleep(0.05 * (intento + 1))
+
+        except Exception as e:
+            db.session.rollback()
+            return {"error": "error interno creando las reservas", "detail": str(e)}, 500
+
+    else:
+        return {"error": "conflicto al crear las reservas, inténtalo de nuevo"}, 409
+
+    if not a_reservar:
+        # 409 si algo chocaba con otras reservas; si todas eran inválidas, 400
+        return {
+            "error": "no se ha podido reservar ninguna ocurrencia",
+            "conflictos": [{"indice": i, "horarios_ocupados": h} for i, h in sorted(conflictos.items())],
+            "errores": errores,
+        }, 409 if conflictos else 400
+
+    reservas = []
+    for reserva_id, (indice, pista_id, fecha_dt, horario_ids), presupuesto in zip(reserva_ids, a_reservar, presupuestos):
+        disponibilidad.marcar(pista_id, fecha_dt, horario_ids)
+        reservas.append({
+            "indice": indice,
+            "id": reserva_id,
+            "pista_id": pista_id,
+            "fecha": fecha_dt.strftime("%Y-%m-%d"),
+            "total_precio": f"{presupuesto.total:.2f}",
+            "horarios": [{"horario_id": hid, "precio": f"{precio:.2f}"} for hid, precio in presupuesto.precios],
+        })
+
+    return {
+        "modo": modo,
+        "reservas": reservas,
+        "conflictos": [{"indice": i, "horarios_ocupados": h} for i, h in sorted(conflictos.items())],
+        "errores": errores,
+    }, 201
+
+
 @api_bp.post("/cancelar_reserva")
 @jwt_required()
+@idempotente
 def cancelar_reserva():
     user_id = _user_id()
     data = request.get_json(silent=True) or {}
@@ -388,9 +628,16 @@ def cancelar_reserva():
     if not reserva or reserva.usuario_id != user_id:
         return {"error": "reserva no encontrada o no autorizada"}, 404
 
+    pista_id, fecha_dt = reserva.pista_id, reserva.fecha
+    horario_ids = [
+        hid for (hid,) in db.session.query(HorarioReserva.horario_id).filter_by(reserva_id=reserva.id)
+    ]
+
     # Eliminar horarios asociados (ORM: delete-orphan sería mejor, pero mantenemos tu enfoque)
     HorarioReserva.query.filter_by(reserva_id=reserva.id).delete()
     db.session.delete(reserva)
     db.session.commit()
 
+    disponibilidad.liberar(pista_id, fecha_dt, horario_ids)
+
     return {"message": "reserva cancelada"}, 200
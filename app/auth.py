@@ -1,14 +1,24 @@
-from flask import Blueprint, request,current_app
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, request
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from .utils import allowed_file, make_safe_filename, ensure_folder
 
+from sqlalchemy.orm import joinedload
+
+from .contrasenas import HashOcupado, contrasenas
 from .extensions import db
-from .models import Usuario as User
-import os
+from .imagenes import ImagenInvalida, ImagenesNoDisponibles, imagenes
+from .limites import limitado
+from .models import Rol, Usuario as User
+from .permisos import claims_usuario
+from .subidas import SubidaInvalida, abrir_fichero
 auth_bp = Blueprint("auth", __name__)
 
+
+def _hash_ocupado():
+    return {"error": "servidor ocupado, reintenta en unos segundos"}, 503, {"Retry-After": "1"}
+
+
 @auth_bp.post("/register")
+@limitado
 def register():
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
@@ -21,11 +31,15 @@ def register():
 
     if User.query.filter_by(email=email).first():
         return {"error": "email ya existe"}, 409
+    try:
+        password_hash = contrasenas.generar(password)
+    except HashOcupado:
+        return _hash_ocupado()
     user = User(
-            name=nombre,
+            nombre=nombre,
             email=email,
-            password_hash=generate_password_hash(password),
-            rol_id=1,
+            password=password_hash,
+            rol_id=db.session.query(Rol.id).filter_by(nombre="usuario").scalar(),
             dni=dni
         )
     db.session.add(user)
@@ -33,17 +47,28 @@ def register():
     return {"id": user.id, "email": user.email, "nombre": user.nombre, "dni": user.dni, "rol_id": user.rol_id}, 201
 
 @auth_bp.post("/login")
+@limitado
 def login():
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
     password = data.get("password") or ""
 
-    user = User.query.filter_by(email=email).first()
-    if not user or not check_password_hash(user.password, password):
+    user = User.query.options(joinedload(User.rol)).filter_by(email=email).first()
+    if not user:
+        return {"error": "credenciales inválidas"}, 401
+    try:
+        correcta, nuevo_hash = contrasenas.verificar_y_rehash(user.password, password)
+    except HashOcupado:
+        return _hash_ocupado()
+    if not correcta:
         return {"error": "credenciales inválidas"}, 401
+    if nuevo_hash:
+        # HASH_METODO ha cambiado: se aprovecha que tenemos la contraseña en claro
+        user.password = nuevo_hash
+        db.session.commit()
 
-    # identity como string para JWT
-    token = create_access_token(identity=str(user.id))  # :contentReference[oaicite:7]{index=7}
+    # identity como string para JWT; el rol va como claim para no consultarlo en cada petición
+    token = create_access_token(identity=str(user.id), additional_claims=claims_usuario(user))  # :contentReference[oaicite:7]{index=7}
     return {"access_token": token,"user":user.nombre,"rol": user.rol.nombre}, 200
 
 @auth_bp.post("/delete")
@@ -60,8 +85,8 @@ def delete_account():
 @jwt_required()
 def me():
     user_id = int(get_jwt_identity())
-    user = User.query.get_or_404(user_id)
-    return {"id": user.id, "email": user.email, "nombre": user.nombre, "dni": user.dni, "foto": user.foto,"rol_id": user.rol_id,"rol": user.rol.nombre}, 200
+    user = User.query.options(joinedload(User.rol)).filter_by(id=user_id).first_or_404()
+    return {"id": user.id, "email": user.email, "nombre": user.nombre, "dni": user.dni, "foto": user.foto, "foto_variantes": user.foto_variantes, "rol_id": user.rol_id,"rol": user.rol.nombre}, 200
 
 @auth_bp.post("/change_password")
 @jwt_required() 
@@ -73,50 +98,38 @@ def change_password():
 
     user = User.query.get_or_404(user_id)
 
-    if not check_password_hash(user.password, old_password):
-        return {"error": "contraseña antigua incorrecta"}, 401
-
-    user.password = generate_password_hash(new_password)
+    try:
+        if not contrasenas.verificar(user.password, old_password):
+            return {"error": "contraseña antigua incorrecta"}, 401
+        user.password = contrasenas.generar(new_password)
+    except HashOcupado:
+        return _hash_ocupado()
     db.session.commit()
     return {"message": "contraseña actualizada"}, 200
 
 @auth_bp.post("/update_image_profile")
 @jwt_required()
-def update_image_profile(): 
+def update_image_profile():
     user_id = int(get_jwt_identity())
-    user = User.query.get_or_404(user_id)
-
-    # Debug: verificar qué se envía
-    if "foto" not in request.files:
-        return {"error": "no se ha enviado ninguna imagen en 'foto'", "keys_recibidas": list(request.files.keys())}, 400
-
-    file = request.files["foto"]
-    
-    # Debug completo
-    print(f"DEBUG: file = {file}")
-    print(f"DEBUG: file.filename = {file.filename}")
-    print(f"DEBUG: bool(file) = {bool(file)}")
-    print(f"DEBUG: hasattr filename = {hasattr(file, 'filename')}")
-    
-    filename = file.filename.strip() if file.filename else ""
-    
-    if not filename or filename == "":
-        return {"error": "filename vacío", "filename_recibido": f"'{file.filename}'", "tipo_file": str(type(file))}, 400
-
-    if not allowed_file(filename):
-        return {"error": "tipo de archivo no permitido", "archivo": filename}, 400
+    User.query.get_or_404(user_id)
 
+    # Sin request.files: el cuerpo se lee por bloques y se corta en cuanto no es una imagen
     try:
-        safe_filename = make_safe_filename(filename)
-        ensure_folder(current_app.config["UPLOAD_FOLDER"])
-        filepath = os.path.join(current_app.config["UPLOAD_FOLDER"], safe_filename)
-        file.save(filepath)
-
-        user.foto = safe_filename
-        db.session.commit()
+        fichero = abrir_fichero("foto")
+    except SubidaInvalida as e:
+        return {"error": e.mensaje}, e.status
 
-        return {"message": "imagen de perfil actualizada", "foto": safe_filename}, 200
-    
-    except Exception as e:
-        db.session.rollback()
-        return {"error": "error al guardar la imagen", "detail": str(e)}, 500
\ No newline at end of file
+    try:
+        en_proceso = imagenes.recibir(user_id, fichero)
+    except SubidaInvalida as e:
+        return {"error": e.mensaje}, e.status
+    except ImagenesNoDisponibles:
+        return {"error": "el procesado de imágenes no está disponible"}, 503
+    except ImagenInvalida:
+        return {"error": "el fichero no es una imagen PNG, JPEG o WebP"}, 400
+
+    if en_proceso:
+        # Las variantes aparecen en /auth/me cuando el pool termina
+        return {"message": "imagen recibida, se está procesando"}, 202
+    user = db.session.get(User, user_id)
+    return {"message": "imagen de perfil actualizada", "foto": user.foto, "foto_variantes": user.foto_variantes}, 200
@@ -0,0 +1,185 @@
+"""Caché en memoria del catálogo: pistas, horarios y extras.
+
+Estas tablas cambian muy pocas veces y se leen en casi todas las peticiones.
+Cada proceso guarda una instantánea inmutable del catálogo y la reutiliza
+mientras no cambie la versión guardada en la tabla ``catalogo_version``.
+Las vistas de administración que modifican el catálogo llaman a
+``registrar_cambio()`` antes del commit (incrementa la versión en la misma
+transacción) y a ``invalidar()`` después. Los demás workers ven la nueva
+versión la próxima vez que la comprueban, como mucho cada
+``CATALOGO_VERSION_TTL`` segundos.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+from types import MappingProxyType
+
+from flask import current_app
+from sqlalchemy import update
+
+from .extensions import db
+from .models import Pista, Horario, Extra, CatalogoVersion
+from .replicas import primaria
+
+PistaCat = namedtuple("PistaCat", "id nombre cubierta plazas precio_base")
+HorarioCat = namedtuple("HorarioCat", "id franja turno")
+ExtraCat = namedtuple("ExtraCat", "id nombre precio_extra")
+
+
+class Catalogo:
+    """Instantánea inmutable del catálogo en una versión concreta."""
+
+    def __init__(self, version: int, pistas, horarios, extras):
+        self.version = version
+        self.pistas = tuple(pistas)
+        self.horarios = tuple(horarios)
+        self.extras = tuple(extras)
+        self.pistas_por_id = MappingProxyType({p.id: p for p in self.pistas})
+        self.horarios_por_id = MappingProxyType({h.id: h for h in self.horarios})
+        self.extras_por_nombre = MappingProxyType({e.nombre.lower(): e for e in self.extras})
+
+        self._derivados = {}
+
+    def extra(self, nombre: str):
+        return self.extras_por_nombre.get(nombre.lower())
+
+    def derivado(self, clave, construir):
+        """Valor calculado a partir de esta instantánea, construido una sola vez."""
+        resultado = self._derivados.get(clave)
+        if resultado is None:
+            resultado = construir()
+            self._derivados[clave] = resultado
+        return resultado
+
+    def serializado(self, clave: str):
+        """``(cuerpo JSON en bytes, etag)`` de ``/api/<clave>``, calculado una vez por versión."""
+        def construir():
+            datos = _RESPUESTAS[clave](self)
+            cuerpo = (current_app.json.dumps(datos) + "\n").encode("utf-8")
+            return cuerpo, hashlib.sha256(cuerpo).hexdigest()[:32]
+        return self.derivado(("json", clave), construir)
+
+
+def _pistas_json(cat: Catalogo) -> dict:
+    return {"pistas": [
+        {
+            "id": p.id,
+            "nombre": p.nombre,
+            "cubierta": p.cubierta,
+            "precio_base": str(p.precio_base),
+            "plazas": p.plazas,
+        }
+        for p in cat.pistas
+    ]}
+
+
+def _horarios_json(cat: Catalogo) -> dict:
+    return {"horarios": [
+        {"id": h.id, "franja": h.franja, "turno": h.turno}
+        for h in cat.horarios
+    ]}
+
+
+_RESPUESTAS = {
+    "pistas": _pistas_json,
+    "horarios": _horarios_json,
+}
+
+
+def _version_bd() -> int:
+    # La instantánea la comparte todo el proceso: se lee de la primaria para
+    # no volver a una versión que la réplica aún no tiene
+    with primaria():
+        return db.session.query(CatalogoVersion.version).filter(CatalogoVersion.id == 1).scalar() or 0
+
+
+class CacheCatalogo:
+    def __init__(self, ttl: int = 5):
+        # ttl: segundos entre comprobaciones de la versión en la BD
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._actual = None
+        self._comprobado = 0.0
+
+    def init_app(self, app):
+        self.ttl = app.config.get("CATALOGO_VERSION_TTL", self.ttl)
+        app.extensions["catalogo"] = self
+
+    def get(self) -> Catalogo:
+        actual = self._actual
+        ahora = time.monotonic()
+        if actual is not None and ahora - self._comprobado <= self.ttl:
+            self.hits += 1
+            return actual
+
+        version = _version_bd()
+        # Las versiones solo crecen: nunca se cambia una instantánea por una anterior
+        if actual is not None and actual.version >= version:
+            self._comprobado = ahora
+            self.hits += 1
+            return actual
+
+        with self._lock:
+            # Otro hilo puede haberla cargado mientras esperábamos
+            actual = self._actual
+            if actual is None or actual.version < version:
+                actual = self._cargar(version)
+                self._actual = actual
+                self.misses += 1
+            self._comprobado = ahora
+        return actual
+
+    def _cargar(self, version: int) -> Catalogo:
+        with primaria():
+            return self._leer(version)
+
+    def _leer(self, version: int) -> Catalogo:
+        pistas = [
+            PistaCat(p.id, p.nombre, p.cubierta, p.plazas, Decimal(str(p.precio_base)))
+            for p in db.session.query(
+                Pista.id, Pista.nombre, Pista.cubierta, Pista.plazas, Pista.precio_base
+            ).order_by(Pista.id)
+        ]
+        horarios = [
+            HorarioCat(h.id, h.franja, h.turno)
+            for h in db.session.query(Horario.id, Horario.franja, Horario.turno).order_by(Horario.id)
+        ]
+        extras = [
+            ExtraCat(e.id, e.nombre, Decimal(str(e.precio_extra)))
+            for e in db.session.query(Extra.id, Extra.nombre, Extra.precio_extra).order_by(Extra.id)
+        ]
+        return Catalogo(version, pistas, horarios, extras)
+
+    def registrar_cambio(self):
+        """Incrementa la versión del catálogo dentro de la transacción en curso.
+
+        Solo UPDATE: la fila id=1 la crean la migración o ``create_all``, y
+        crearla aquí competiría con otra petición por la misma clave.
+        """
+        actualizadas = db.session.execute(
+            update(CatalogoVersion)
+            .where(CatalogoVersion.id == 1)
+            .values(version=CatalogoVersion.version + 1)
+        ).rowcount
+        if not actualizadas:
+            raise RuntimeError("falta la fila de catalogo_version; ejecuta 'flask db upgrade'")
+
+    def invalidar(self):
+        """Descarta la instantánea local (llamar tras el commit)."""
+        with self._lock:
+            self._actual = None
+
+    def estadisticas(self) -> dict:
+        actual = self._actual
+        return {
+            "version": actual.version if actual else None,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+catalogo = CacheCatalogo()
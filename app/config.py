@@ -20,5 +20,110 @@ class Config:
         SQLALCHEMY_DATABASE_URI = db_url
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Réplica de solo lectura (ver app/replicas.py) y segundos que las lecturas
+    # de un usuario siguen yendo a la primaria después de que escriba
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+    SQLALCHEMY_BINDS = {"replica": DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    BD_REPLICA_VENTANA = int(os.getenv("BD_REPLICA_VENTANA", "5"))
+
+    # PRAGMA que app/motor.py aplica a cada conexión SQLite (SQLITE_AJUSTES=0 los desactiva)
+    SQLITE_AJUSTES = os.getenv("SQLITE_AJUSTES", "1") == "1"
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+    SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+    SQLITE_FOREIGN_KEYS = os.getenv("SQLITE_FOREIGN_KEYS", "1") == "1"
+
+    # Pool de conexiones para motores con servidor (PostgreSQL...); con SQLite
+    # se dejan los valores por defecto de Flask-SQLAlchemy
+    if SQLALCHEMY_DATABASE_URI.startswith("sqlite"):
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+    else:
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        }
     UPLOAD_FOLDER = str(BASE_DIR / os.getenv("UPLOAD_FOLDER", "uploads"))
     MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH_MB", "10")) * 1024 * 1024
+
+    # /media (ver app/media.py): max-age de los nombres que no son inmutables y
+    # envío de los bytes por el servidor web ("x-accel" para nginx, "x-sendfile")
+    MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", "3600"))
+    MEDIA_OFFLOAD = os.getenv("MEDIA_OFFLOAD", "")
+    MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/_media/")
+
+    # Segundos que el índice de disponibilidad da por buena una fecha cargada (0 = sin caducidad)
+    DISPONIBILIDAD_TTL = int(os.getenv("DISPONIBILIDAD_TTL", "30"))
+
+    # Segundos que se cachea la versión de token de cada usuario en admin_required
+    TOKEN_VERSION_TTL = int(os.getenv("TOKEN_VERSION_TTL", "60"))
+
+    # Segundos entre comprobaciones de la versión del catálogo (pistas, horarios, extras)
+    CATALOGO_VERSION_TTL = int(os.getenv("CATALOGO_VERSION_TTL", "5"))
+
+    # Cache-Control de /api/pistas y /api/horarios (van con ETag, así que al caducar basta un 304)
+    CATALOGO_CACHE_CONTROL = os.getenv("CATALOGO_CACHE_CONTROL", "private, max-age=60")
+
+    # Festivos con recargo propio (extra "Festivo"): lista YYYY-MM-DD separada por
+    # comas. Se valida en create_app: una fecha mal escrita impide arrancar
+    FESTIVOS = os.getenv("FESTIVOS", "")
+
+    # Idempotency-Key en /api/reservar y /api/cancelar_reserva: segundos que se
+    # guarda cada respuesta, respuestas en el LRU de cada proceso y segundos tras
+    # los que una petición en curso se da por abandonada
+    IDEMPOTENCIA_TTL = int(os.getenv("IDEMPOTENCIA_TTL", "86400"))
+    IDEMPOTENCIA_LRU = int(os.getenv("IDEMPOTENCIA_LRU", "1024"))
+    IDEMPOTENCIA_BLOQUEO = int(os.getenv("IDEMPOTENCIA_BLOQUEO", "60"))
+
+    # Medidas de SQL por petición, Server-Timing y registro de lentitud (ver
+    # app/instrumentacion.py); umbrales en milisegundos y en número de consultas
+    INSTRUMENTACION = os.getenv("INSTRUMENTACION", "0") == "1"
+    INSTRUMENTACION_SERVER_TIMING = os.getenv("INSTRUMENTACION_SERVER_TIMING", "1") == "1"
+    INSTRUMENTACION_TOP = int(os.getenv("INSTRUMENTACION_TOP", "3"))
+    LENTO_SQL_MS = float(os.getenv("LENTO_SQL_MS", "100"))
+    LENTO_PETICION_MS = float(os.getenv("LENTO_PETICION_MS", "500"))
+    LENTO_CONSULTAS = int(os.getenv("LENTO_CONSULTAS", "20"))
+
+    # /metrics (ver app/metricas.py). Con varios workers, METRICAS_DIR es el
+    # directorio compartido donde cada uno vuelca sus contadores cada
+    # METRICAS_VOLCADO segundos. Sin METRICAS_TOKEN la ruta no se sirve
+    METRICAS = os.getenv("METRICAS", "1") == "1"
+    METRICAS_DIR = os.getenv("METRICAS_DIR", "")
+    METRICAS_VOLCADO = float(os.getenv("METRICAS_VOLCADO", "5"))
+    METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+
+    # Hash de contraseñas (ver app/contrasenas.py): método de Werkzeug con su
+    # coste, procesos del pool de cada worker (0 = en el propio hilo), hashes
+    # pendientes a partir de los que se responde 503 y segundos de espera máxima
+    HASH_METODO = os.getenv("HASH_METODO", "scrypt")
+    HASH_PROCESOS = int(os.getenv("HASH_PROCESOS", "2"))
+    HASH_COLA_MAX = int(os.getenv("HASH_COLA_MAX", "64"))
+    HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", "10"))
+
+    # Límite de intentos (ver app/limites.py): "peticiones/segundos" por
+    # blueprint y por IP o email; backend "memoria" (por proceso) o "sqlite"
+    # (fichero compartido por los workers de la máquina)
+    LIMITES_ACTIVOS = os.getenv("LIMITES_ACTIVOS", "1") == "1"
+    LIMITES = {
+        "auth": {
+            "ip": os.getenv("LIMITES_AUTH_IP", "30/60"),
+            "email": os.getenv("LIMITES_AUTH_EMAIL", "10/300"),
+        },
+    }
+    LIMITES_BACKEND = os.getenv("LIMITES_BACKEND", "memoria")
+    LIMITES_SQLITE_PATH = os.getenv("LIMITES_SQLITE_PATH", str(INSTANCE_DIR / "limites.db"))
+    LIMITES_PROXIES = int(os.getenv("LIMITES_PROXIES", "0"))
+    LIMITES_MAX_CLAVES = int(os.getenv("LIMITES_MAX_CLAVES", "100000"))
+
+    # Fotos de perfil (ver app/imagenes.py): lados de las variantes cuadradas,
+    # lado máximo de la "grande", calidad WebP, hilos del pool (0 = en la
+    # petición) y píxeles a partir de los que Pillow rechaza la imagen
+    IMAGENES_TAMANOS = tuple(int(t) for t in os.getenv("IMAGENES_TAMANOS", "64,256").split(","))
+    IMAGENES_LADO_MAX = int(os.getenv("IMAGENES_LADO_MAX", "1024"))
+    IMAGENES_CALIDAD = int(os.getenv("IMAGENES_CALIDAD", "80"))
+    IMAGENES_HILOS = int(os.getenv("IMAGENES_HILOS", "2"))
+    IMAGENES_MAX_PIXELES = int(os.getenv("IMAGENES_MAX_PIXELES", str(40_000_000)))
@@ -0,0 +1,308 @@
+"""Consultas de reservas compartidas por la API y el panel de administración.
+
+Cargan de antemano pista, usuario y horarios de cada reserva para que
+serializar un listado cueste un número fijo de consultas (la principal más un
+SELECT ... IN para los horarios) y no una por relación y fila.
+
+Los listados del panel de administración se paginan por keyset sobre ``id``
+y solo seleccionan las columnas pedidas en ``fields``.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from .extensions import db
+from .models import Usuario, Rol, Pista, Horario, Reserva, HorarioReserva
+
+
+def reservas_con_detalle(incluir_usuario: bool = False):
+    """``Reserva.query`` con pista y horarios (y opcionalmente usuario) precargados."""
+    opciones = [
+        joinedload(Reserva.pista),
+        selectinload(Reserva.horarios).joinedload(HorarioReserva.horario),
+    ]
+    if incluir_usuario:
+        opciones.append(joinedload(Reserva.usuario))
+    return Reserva.query.options(*opciones)
+
+
+def serializar_reserva(reserva, incluir_usuario: bool = False) -> dict:
+    horarios = []
+    total = Decimal("0.00")
+
+    for hr in reserva.horarios:
+        h = hr.horario
+        precio = Decimal(str(hr.precio))
+        total += precio
+
+        horarios.append({
+            "horario_reserva_id": hr.id,
+            "horario_id": h.id,
+            "franja": h.franja,
+            "turno": h.turno,
+            "precio": f"{precio:.2f}",
+        })
+
+    result = {
+        "id": reserva.id,
+        "pista_id": reserva.pista_id,
+        "pista_nombre": reserva.pista.nombre if reserva.pista else None,
+        "fecha": reserva.fecha.strftime("%Y-%m-%d") if reserva.fecha else None,
+        "total_precio": f"{total:.2f}",
+        "horarios": horarios,
+    }
+    if incluir_usuario:
+        result["usuario_id"] = reserva.usuario_id
+        result["usuario_email"] = reserva.usuario.email if reserva.usuario else None
+        result["usuario_nombre"] = reserva.usuario.nombre if reserva.usuario else None
+    return result
+
+
+# ==================== LISTADOS PAGINADOS ====================
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 500
+
+CAMPOS_USUARIO = ("id", "nombre", "email", "dni", "foto", "rol_id", "rol_nombre")
+CAMPOS_RESERVA = (
+    "id", "usuario_id", "usuario_email", "usuario_nombre", "pista_id",
+    "pista_nombre", "fecha", "total_precio", "horarios",
+)
+
+
+FILTROS_USUARIO = ("email", "rol_id")
+FILTROS_RESERVA = ("fecha_desde", "fecha_hasta", "pista_id", "usuario_id")
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def comprobar_parametros(args, filtros):
+    """Rechaza parámetros desconocidos: un filtro mal escrito no debe devolver todo."""
+    desconocidos = sorted(set(args) - {"limit", "cursor", "fields", *filtros})
+    if desconocidos:
+        raise ParametroInvalido(f"parámetros no permitidos: {', '.join(desconocidos)}")
+
+
+def parse_paginacion(args):
+    """Lee ``limit`` y ``cursor`` (último id de la página anterior) de la query string."""
+    try:
+        limit = int(args.get("limit", LIMITE_POR_DEFECTO))
+        cursor = int(args["cursor"]) if args.get("cursor") else None
+    except (TypeError, ValueError):
+        raise ParametroInvalido("limit y cursor deben ser enteros")
+    if limit <= 0:
+        raise ParametroInvalido("limit debe ser mayor a 0")
+    return min(limit, LIMITE_MAXIMO), cursor
+
+
+def parse_campos(args, permitidos):
+    """Lee ``fields=a,b,c``; sin el parámetro se devuelven todos los campos."""
+    valor = args.get("fields")
+    if not valor:
+        return list(permitidos)
+    campos = [c.strip() for c in valor.split(",") if c.strip()]
+    desconocidos = [c for c in campos if c not in permitidos]
+    if desconocidos:
+        raise ParametroInvalido(f"campos no permitidos: {', '.join(desconocidos)}")
+    return campos
+
+
+def parse_fecha_arg(args, nombre):
+    valor = args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise ParametroInvalido(f"{nombre} debe tener formato YYYY-MM-DD")
+
+
+def parse_int_arg(args, nombre):
+    valor = args.get(nombre)
+    if valor in (None, ""):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ParametroInvalido(f"{nombre} debe ser entero")
+
+
+def _pagina(query, columna_id, limit, cursor):
+    # Keyset: WHERE id > cursor ORDER BY id LIMIT n+1; la fila extra solo
+    # indica si hay más páginas y no se devuelve.
+    if cursor is not None:
+        query = query.filter(columna_id > cursor)
+    filas = query.order_by(columna_id).limit(limit + 1).all()
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = filas[-1].id
+    return filas, siguiente
+
+
+def pagina_usuarios(args):
+    """Página de usuarios según ``limit``, ``cursor``, ``fields``, ``email`` (prefijo) y ``rol_id``."""
+    comprobar_parametros(args, FILTROS_USUARIO)
+    limit, cursor = parse_paginacion(args)
+    campos = parse_campos(args, CAMPOS_USUARIO)
+    email = (args.get("email") or "").strip().lower()
+    rol_id = parse_int_arg(args, "rol_id")
+
+    columnas = [Usuario.id.label("id")]
+    for campo in campos:
+        if campo in ("id", "rol_nombre"):
+            continue
+        columnas.append(getattr(Usuario, campo).label(campo))
+    if "rol_nombre" in campos:
+        columnas.append(Rol.nombre.label("rol_nombre"))
+
+    query = db.session.query(*columnas)
+    if "rol_nombre" in campos:
+        query = query.outerjoin(Rol, Rol.id == Usuario.rol_id)
+    if email:
+        # Rango en lugar de LIKE para que SQLite use ix_usuarios_email
+        query = query.filter(Usuario.email >= email, Usuario.email < email + "\uffff")
+    if rol_id is not None:
+        query = query.filter(Usuario.rol_id == rol_id)
+
+    filas, siguiente = _pagina(query, Usuario.id, limit, cursor)
+    return [{c: getattr(f, c) for c in campos} for f in filas], siguiente
+
+
+def pagina_reservas(args):
+    """Página de reservas según ``limit``, ``cursor``, ``fields``, ``fecha_desde``,
+    ``fecha_hasta``, ``pista_id`` y ``usuario_id``."""
+    comprobar_parametros(args, FILTROS_RESERVA)
+    limit, cursor = parse_paginacion(args)
+    campos = parse_campos(args, CAMPOS_RESERVA)
+    fecha_desde = parse_fecha_arg(args, "fecha_desde")
+    fecha_hasta = parse_fecha_arg(args, "fecha_hasta")
+    pista_id = parse_int_arg(args, "pista_id")
+    usuario_id = parse_int_arg(args, "usuario_id")
+
+    columnas = [Reserva.id.label("id")]
+    for campo in ("usuario_id", "pista_id", "fecha"):
+        if campo in campos:
+            columnas.append(getattr(Reserva, campo).label(campo))
+    con_usuario = "usuario_email" in campos or "usuario_nombre" in campos
+    if "usuario_email" in campos:
+        columnas.append(Usuario.email.label("usuario_email"))
+    if "usuario_nombre" in campos:
+        columnas.append(Usuario.nombre.label("usuario_nombre"))
+    if "pista_nombre" in campos:
+        columnas.append(Pista.nombre.label("pista_nombre"))
+
+    query = db.session.query(*columnas)
+    if con_usuario:
+        query = query.outerjoin(Usuario, Usuario.id == Reserva.usuario_id)
+    if "pista_nombre" in campos:
+        query = query.outerjoin(Pista, Pista.id == Reserva.pista_id)
+    if fecha_desde:
+        query = query.filter(Reserva.fecha >= fecha_desde)
+    if fecha_hasta:
+        query = query.filter(Reserva.fecha <= fecha_hasta)
+    if pista_id is not None:
+        query = query.filter(Reserva.pista_id == pista_id)
+    if usuario_id is not None:
+        query = query.filter(Reserva.usuario_id == usuario_id)
+
+    filas, siguiente = _pagina(query, Reserva.id, limit, cursor)
+
+    horarios_por_reserva = {}
+    if filas and ("horarios" in campos or "total_precio" in campos):
+        detalle = (
+            db.session.query(
+                HorarioReserva.reserva_id, HorarioReserva.id, HorarioReserva.horario_id,
+                Horario.franja, Horario.turno, HorarioReserva.precio,
+            )
+            .join(Horario, Horario.id == HorarioReserva.horario_id)
+            .filter(HorarioReserva.reserva_id.in_([f.id for f in filas]))
+            .order_by(HorarioReserva.reserva_id, HorarioReserva.id)
+            .all()
+        )
+        for reserva_id, hr_id, horario_id, franja, turno, precio in detalle:
+            horarios_por_reserva.setdefault(reserva_id, []).append({
+                "horario_reserva_id": hr_id,
+                "horario_id": horario_id,
+                "franja": franja,
+                "turno": turno,
+                "precio": Decimal(str(precio)),
+            })
+
+    result = []
+    for f in filas:
+        item = {}
+        horarios = horarios_por_reserva.get(f.id, [])
+        for campo in campos:
+            if campo == "fecha":
+                item["fecha"] = f.fecha.strftime("%Y-%m-%d") if f.fecha else None
+            elif campo == "total_precio":
+                total = sum((h["precio"] for h in horarios), Decimal("0.00"))
+                item["total_precio"] = f"{total:.2f}"
+            elif campo == "horarios":
+                item["horarios"] = [{**h, "precio": f"{h['precio']:.2f}"} for h in horarios]
+            else:
+                item[campo] = getattr(f, campo)
+        result.append(item)
+    return result, siguiente
+
+
+# ==================== EXPORTACIÓN ====================
+
+def iterar_reservas_export(fecha_desde=None, fecha_hasta=None, lote: int = 1000):
+    """Genera las reservas (con usuario, pista, horarios y total) una a una.
+
+    Es una única consulta plana ordenada por reserva que se lee en lotes de
+    ``lote`` filas con ``yield_per``; las filas de una misma reserva son
+    consecutivas y se agrupan al vuelo, así que la memoria no depende del
+    número de reservas.
+    """
+    query = (
+        db.session.query(
+            Reserva.id, Reserva.fecha,
+            Reserva.usuario_id, Usuario.email, Usuario.nombre,
+            Reserva.pista_id, Pista.nombre,
+            HorarioReserva.horario_id, Horario.franja, HorarioReserva.precio,
+        )
+        .join(Usuario, Usuario.id == Reserva.usuario_id)
+        .join(Pista, Pista.id == Reserva.pista_id)
+        .outerjoin(HorarioReserva, HorarioReserva.reserva_id == Reserva.id)
+        .outerjoin(Horario, Horario.id == HorarioReserva.horario_id)
+    )
+    if fecha_desde:
+        query = query.filter(Reserva.fecha >= fecha_desde)
+    if fecha_hasta:
+        query = query.filter(Reserva.fecha <= fecha_hasta)
+    query = query.order_by(Reserva.id, HorarioReserva.id).yield_per(lote)
+
+    actual = None
+    for (reserva_id, fecha, usuario_id, email, nombre, pista_id, pista_nombre,
+         horario_id, franja, precio) in query:
+        if actual is None or actual["id"] != reserva_id:
+            if actual is not None:
+                yield _cerrar_export(actual)
+            actual = {
+                "id": reserva_id,
+                "fecha": fecha.strftime("%Y-%m-%d") if fecha else None,
+                "usuario_id": usuario_id,
+                "usuario_email": email,
+                "usuario_nombre": nombre,
+                "pista_id": pista_id,
+                "pista_nombre": pista_nombre,
+                "horarios": [],
+                "total_precio": Decimal("0.00"),
+            }
+        if horario_id is not None:
+            actual["horarios"].append(franja)
+            actual["total_precio"] += Decimal(str(precio))
+    if actual is not None:
+        yield _cerrar_export(actual)
+
+
+def _cerrar_export(reserva: dict) -> dict:
+    reserva["num_horarios"] = len(reserva["horarios"])
+    reserva["total_precio"] = f"{reserva['total_precio']:.2f}"
+    return reserva
@@ -0,0 +1,134 @@
+"""Hash y verificación de contraseñas en un pool de procesos.
+
+scrypt/pbkdf2 cuestan decenas o cientos de ms de CPU por llamada. Hechos en el
+hilo de la petición, una racha de logins deja a los workers sin CPU para las
+reservas. Aquí cada hash va a un ``ProcessPoolExecutor`` de ``HASH_PROCESOS``
+procesos (se crea en el primer uso, así que cada worker de gunicorn tiene el
+suyo). Así el coste de CPU queda acotado y el hilo de la petición solo espera.
+
+- ``HASH_METODO`` es el método de Werkzeug con su coste
+  (``scrypt:32768:8:1``, ``pbkdf2:sha256:600000``...). Si cambia, los hashes
+  viejos siguen valiendo y se rehacen con el nuevo método en el siguiente login
+  correcto (``verificar_y_rehash``).
+- Si hay ``HASH_COLA_MAX`` hashes pendientes, o uno tarda más de
+  ``HASH_TIMEOUT`` segundos, se lanza ``HashOcupado`` en el acto. Las vistas
+  responden 503 con ``Retry-After`` en lugar de encolar sin límite. Un hash
+  que ha superado el timeout sigue contando como pendiente hasta que acaba.
+- ``HASH_PROCESOS=0`` hace el hash en el propio hilo (tests, scripts).
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashOcupado(Exception):
+    """Demasiados hashes pendientes: el cliente debe reintentar más tarde."""
+
+
+# ---------- funciones que corren en los procesos del pool ----------
+
+def _generar(password: str, metodo: str) -> str:
+    return generate_password_hash(password, method=metodo)
+
+
+def _verificar_y_rehash(hash_actual: str, password: str, metodo: str):
+    if not check_password_hash(hash_actual, password):
+        return False, None
+    if _metodo_de(hash_actual) == metodo:
+        return True, None
+    return True, generate_password_hash(password, method=metodo)
+
+
+def _metodo_de(hash_: str) -> str:
+    return hash_.split("$", 1)[0]
+
+
+class ServicioContrasenas:
+    def __init__(self, metodo: str = "scrypt:32768:8:1", procesos: int = 2,
+                 cola_max: int = 64, timeout: float = 10):
+        self.metodo = metodo
+        self.procesos = procesos
+        self.cola_max = cola_max
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._pool = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.metodo = _metodo_completo(app.config.get("HASH_METODO", self.metodo))
+        self.procesos = app.config.get("HASH_PROCESOS", self.procesos)
+        self.cola_max = app.config.get("HASH_COLA_MAX", self.cola_max)
+        self.timeout = app.config.get("HASH_TIMEOUT", self.timeout)
+        app.extensions["contrasenas"] = self
+
+    # ---------- API ----------
+
+    def generar(self, password: str) -> str:
+        return self._ejecutar(_generar, password, self.metodo)
+
+    def verificar_y_rehash(self, hash_actual: str, password: str):
+        """``(correcta, nuevo_hash)``; ``nuevo_hash`` solo si el método ha cambiado."""
+        return self._ejecutar(_verificar_y_rehash, hash_actual, password, self.metodo)
+
+    def verificar(self, hash_actual: str, password: str) -> bool:
+        return self.verificar_y_rehash(hash_actual, password)[0]
+
+    def estadisticas(self) -> dict:
+        return {"pendientes": self._pendientes, "procesos": self.procesos, "metodo": self.metodo}
+
+    # ---------- pool ----------
+
+    def _ejecutar(self, funcion, *args):
+        with self._lock:
+            if self._pendientes >= self.cola_max:
+                raise HashOcupado()
+            self._pendientes += 1
+        if not self.procesos:
+            try:
+                return funcion(*args)
+            finally:
+                self._liberar()
+
+        try:
+            futuro = self._obtener_pool().submit(funcion, *args)
+        except BaseException:
+            self._liberar()
+            raise
+        # El hueco se libera cuando el hash acaba, no cuando el hilo deja de
+        # esperarlo: cancel() no para un hash que ya está en marcha
+        futuro.add_done_callback(self._liberar)
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturesTimeout:
+            futuro.cancel()
+            raise HashOcupado() from None
+
+    def _liberar(self, futuro=None):
+        with self._lock:
+            self._pendientes -= 1
+
+    def _obtener_pool(self):
+        # Tras un fork (gunicorn --preload) el pool del padre no sirve
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.procesos)
+                    self._pid = os.getpid()
+        return self._pool
+
+    def cerrar(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+
+def _metodo_completo(metodo: str) -> str:
+    """Método con los parámetros por defecto de Werkzeug explícitos ("scrypt" -> "scrypt:32768:8:1")."""
+    return _metodo_de(generate_password_hash("", method=metodo))
+
+
+contrasenas = ServicioContrasenas()
@@ -0,0 +1,322 @@
+"""Índice en memoria de disponibilidad de pistas.
+
+La ocupación de cada (pista, fecha) se guarda como una máscara de bits sobre
+los horarios: el bit ``i`` vale 1 si el horario en la posición ``i`` está
+reservado. Las fechas se cargan de la BD la primera vez que se consultan y a
+partir de ahí se mantienen con ``marcar``/``liberar`` desde las vistas que
+crean o borran reservas.
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+
+from .catalogo import catalogo
+from .extensions import db
+from .models import Reserva, HorarioReserva
+from .replicas import primaria
+
+
+class _Estado:
+    """Pistas, horarios y máscaras de una versión del catálogo.
+
+    Cuando el catálogo cambia se crea un estado nuevo en vez de vaciar este:
+    quien ya tenía el anterior sigue leyendo máscaras y horarios coherentes
+    entre sí.
+    """
+
+    def __init__(self, cat):
+        self.version = cat.version
+        self.pistas = tuple((p.id, p.nombre) for p in cat.pistas)   # (id, nombre)
+        self.horarios = tuple((h.id, h.franja, h.turno) for h in cat.horarios)  # ordenada por id
+        self.bits = {h[0]: i for i, h in enumerate(self.horarios)}  # horario_id -> posición del bit
+        self.ocupacion = {}      # (pista_id, fecha) -> máscara
+        self.cargadas = {}       # fecha -> instante de carga
+        self.cargas = []         # cargas en curso: (fechas, cambios recibidos mientras)
+
+    def aplicar(self, pista_id: int, fecha: date, horario_ids, ocupar: bool):
+        # Llamar con el lock del índice tomado
+        clave = (pista_id, fecha)
+        mascara = self.ocupacion.get(clave, 0)
+        for hid in horario_ids:
+            bit = self.bits.get(hid)
+            if bit is None:
+                continue
+            if ocupar:
+                mascara |= 1 << bit
+            else:
+                mascara &= ~(1 << bit)
+        self.ocupacion[clave] = mascara
+
+
+class IndiceDisponibilidad:
+    def __init__(self, ttl: int = 30):
+        # ttl: segundos que una fecha cargada se da por buena antes de releerla
+        # de la BD (con varios workers cada uno tiene su propio índice).
+        # 0 = no caduca nunca.
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._estado = None      # _Estado de la última versión del catálogo vista
+        self.hits = 0            # fechas pedidas que ya estaban cargadas
+        self.misses = 0          # fechas que hubo que (re)leer de la BD
+
+    def init_app(self, app):
+        self.ttl = app.config.get("DISPONIBILIDAD_TTL", self.ttl)
+        app.extensions["disponibilidad"] = self
+        app.cli.add_command(disponibilidad_cli)
+
+    # ---------- carga ----------
+
+    def _asegurar_catalogo(self) -> _Estado:
+        # Pistas y horarios salen de la caché del catálogo; si su versión
+        # cambia, las posiciones de los bits ya no valen y se empieza de cero.
+        cat = catalogo.get()
+        estado = self._estado
+        if estado is not None and estado.version >= cat.version:
+            return estado
+        with self._lock:
+            # Otro hilo puede haber instalado ya esta versión (o una posterior)
+            if self._estado is None or self._estado.version < cat.version:
+                self._estado = _Estado(cat)
+            return self._estado
+
+    def _caducada(self, estado: _Estado, fecha: date, ahora: float) -> bool:
+        cargada = estado.cargadas.get(fecha)
+        if cargada is None:
+            return True
+        return bool(self.ttl) and ahora - cargada > self.ttl
+
+    def _cargar(self, estado: _Estado, fechas):
+        """Carga desde la BD la ocupación de ``fechas`` con una sola consulta.
+
+        Los ``marcar``/``liberar`` que llegan mientras tanto se apuntan y se
+        vuelven a aplicar sobre lo leído: la consulta puede haberse hecho antes
+        de su commit. Repetirlos es inocuo si ya estaban en la BD.
+        """
+        fechas = set(fechas)
+        carga = (fechas, [])
+        with self._lock:
+            estado.cargas.append(carga)
+        try:
+            # El índice lo comparten todos los usuarios del proceso: se carga de la
+            # primaria para no quedarse con ocupaciones que la réplica aún no tiene
+            with primaria():
+                filas = (
+                    db.session.query(HorarioReserva.pista_id, HorarioReserva.fecha, HorarioReserva.horario_id)
+                    .filter(HorarioReserva.fecha.between(min(fechas), max(fechas)))
+                    .all()
+                )
+        except BaseException:
+            with self._lock:
+                estado.cargas.remove(carga)
+            raise
+
+        nuevas = {}
+        for pista_id, fecha, horario_id in filas:
+            if fecha not in fechas:
+                continue
+            bit = estado.bits.get(horario_id)
+            if bit is None:
+                continue
+            clave = (pista_id, fecha)
+            nuevas[clave] = nuevas.get(clave, 0) | (1 << bit)
+
+        ahora = time.monotonic()
+        with self._lock:
+            estado.cargas.remove(carga)
+            for clave in [c for c in estado.ocupacion if c[1] in fechas]:
+                del estado.ocupacion[clave]
+            estado.ocupacion.update(nuevas)
+            for cambio in carga[1]:
+                estado.aplicar(*cambio)
+            for fecha in fechas:
+                estado.cargadas[fecha] = ahora
+            self._purgar(estado, ahora)
+
+    def _purgar(self, estado: _Estado, ahora: float):
+        # Llamar con el lock tomado
+        if not self.ttl:
+            return
+        viejas = {f for f in estado.cargadas if ahora - estado.cargadas[f] > self.ttl}
+        if not viejas:
+            return
+        for fecha in viejas:
+            del estado.cargadas[fecha]
+        for clave in [c for c in estado.ocupacion if c[1] in viejas]:
+            del estado.ocupacion[clave]
+
+    def _asegurar_fechas(self, fechas) -> _Estado:
+        estado = self._asegurar_catalogo()
+        ahora = time.monotonic()
+        pendientes = [f for f in fechas if self._caducada(estado, f, ahora)]
+        self.misses += len(pendientes)
+        self.hits += len(fechas) - len(pendientes)
+        if pendientes:
+            self._cargar(estado, pendientes)
+        return estado
+
+    # ---------- consultas ----------
+
+    def mascara(self, pista_id: int, fecha: date) -> int:
+        estado = self._asegurar_fechas([fecha])
+        return estado.ocupacion.get((pista_id, fecha), 0)
+
+    @staticmethod
+    def _libres(horarios, mascara: int):
+        return [
+            {"id": hid, "franja": franja, "turno": turno}
+            for i, (hid, franja, turno) in enumerate(horarios)
+            if not mascara >> i & 1
+        ]
+
+    def disponibles(self, pista_id: int, fecha: date):
+        """Horarios libres de una pista en una fecha."""
+        estado = self._asegurar_fechas([fecha])
+        return self._libres(estado.horarios, estado.ocupacion.get((pista_id, fecha), 0))
+
+    def disponibles_por_pista(self, fecha: date):
+        """Horarios libres de todas las pistas en una fecha."""
+        estado = self._asegurar_fechas([fecha])
+        with self._lock:
+            mascaras = [(pid, nombre, estado.ocupacion.get((pid, fecha), 0)) for pid, nombre in estado.pistas]
+        return [
+            {
+                "pista_id": pista_id,
+                "pista_nombre": nombre,
+                "disponibilidades": self._libres(estado.horarios, mascara),
+            }
+            for pista_id, nombre, mascara in mascaras
+        ]
+
+    def ocupacion_rango(self, desde: date, hasta: date, pista_ids=None):
+        """Máscaras de ocupación de cada pista para cada día de ``desde`` a ``hasta``.
+
+        Las fechas que falten en el índice se leen con una única consulta.
+        Devuelve ``(fechas, horarios, [(pista_id, nombre, [mascara por fecha])])``;
+        ``horarios`` sale de la misma instantánea que las máscaras, así que el
+        bit ``i`` es siempre ``horarios[i]`` aunque el catálogo cambie entre medias.
+        """
+        fechas = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+        estado = self._asegurar_fechas(fechas)
+        pistas = estado.pistas
+        if pista_ids is not None:
+            pistas = [p for p in pistas if p[0] in pista_ids]
+        horarios = [{"id": hid, "franja": franja, "turno": turno} for hid, franja, turno in estado.horarios]
+        with self._lock:
+            return fechas, horarios, [
+                (pista_id, nombre, [estado.ocupacion.get((pista_id, f), 0) for f in fechas])
+                for pista_id, nombre in pistas
+            ]
+
+    # ---------- actualización incremental ----------
+
+    def _aplicar(self, pista_id: int, fecha: date, horario_ids, ocupar: bool):
+        with self._lock:
+            estado = self._estado
+            if estado is None:
+                return
+            cambio = (pista_id, fecha, tuple(horario_ids), ocupar)
+            for fechas, cambios in estado.cargas:
+                if fecha in fechas:
+                    cambios.append(cambio)
+            # Si la fecha no está cargada se leerá entera de la BD cuando haga falta
+            if fecha in estado.cargadas:
+                estado.aplicar(*cambio)
+
+    def marcar(self, pista_id: int, fecha: date, horario_ids):
+        """Marca como ocupados los horarios de una reserva ya confirmada."""
+        self._aplicar(pista_id, fecha, horario_ids, True)
+
+    def liberar(self, pista_id: int, fecha: date, horario_ids):
+        """Libera los horarios de una reserva ya borrada."""
+        self._aplicar(pista_id, fecha, horario_ids, False)
+
+    def invalidar(self):
+        """Descarta todo el índice."""
+        with self._lock:
+            self._estado = None
+
+    def estadisticas(self) -> dict:
+        estado = self._estado
+        entradas = len(estado.cargadas) if estado is not None else 0
+        return {"entradas": entradas, "hits": self.hits, "misses": self.misses}
+
+    # ---------- mantenimiento ----------
+
+    def reconstruir(self, desde: date = None) -> int:
+        """Rehace el índice desde la BD para todas las fechas >= ``desde``.
+
+        Devuelve el número de fechas cargadas.
+        """
+        self.invalidar()
+        estado = self._asegurar_catalogo()
+        desde = desde or date.today()
+        fechas = [
+            f for (f,) in db.session.query(Reserva.fecha)
+            .filter(Reserva.fecha >= desde)
+            .distinct()
+            .all()
+        ]
+        if fechas:
+            self._cargar(estado, fechas)
+        return len(fechas)
+
+    def verificar(self, fecha: date):
+        """Compara el índice con la BD para ``fecha``.
+
+        Devuelve una lista de discrepancias ``{"pista_id", "solo_indice",
+        "solo_bd"}``; vacía si el índice es consistente.
+        """
+        estado = self._asegurar_fechas([fecha])
+        with self._lock:
+            indice = {c[0]: m for c, m in estado.ocupacion.items() if c[1] == fecha}
+
+        en_bd = {}
+        filas = (
+            db.session.query(HorarioReserva.pista_id, HorarioReserva.horario_id)
+            .filter(HorarioReserva.fecha == fecha)
+            .all()
+        )
+        for pista_id, horario_id in filas:
+            en_bd.setdefault(pista_id, set()).add(horario_id)
+
+        discrepancias = []
+        for pista_id in sorted(set(indice) | set(en_bd)):
+            mascara = indice.get(pista_id, 0)
+            ocupados = {hid for hid, bit in estado.bits.items() if mascara >> bit & 1}
+            reales = en_bd.get(pista_id, set())
+            if ocupados != reales:
+                discrepancias.append({
+                    "pista_id": pista_id,
+                    "solo_indice": sorted(ocupados - reales),
+                    "solo_bd": sorted(reales - ocupados),
+                })
+        return discrepancias
+
+
+disponibilidad = IndiceDisponibilidad()
+
+disponibilidad_cli = AppGroup("disponibilidad", help="Mantenimiento del índice de disponibilidad.")
+
+
+@disponibilidad_cli.command("reconstruir")
+@click.option("--desde", help="Fecha inicial YYYY-MM-DD (por defecto hoy)")
+def reconstruir_cmd(desde):
+    desde_dt = datetime.strptime(desde, "%Y-%m-%d").date() if desde else None
+    n = disponibilidad.reconstruir(desde_dt)
+    click.echo(f"OK: {n} fechas cargadas.")
+
+
+@disponibilidad_cli.command("verificar")
+@click.option("--fecha", required=True, help="Fecha YYYY-MM-DD")
+def verificar_cmd(fecha):
+    fecha_dt = datetime.strptime(fecha, "%Y-%m-%d").date()
+    discrepancias = disponibilidad.verificar(fecha_dt)
+    if not discrepancias:
+        click.echo("OK: índice consistente.")
+        return
+    for d in discrepancias:
+        click.echo(f"pista {d['pista_id']}: solo índice {d['solo_indice']}, solo BD {d['solo_bd']}")
+    raise SystemExit(1)
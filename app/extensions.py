@@ -2,7 +2,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 
+from .replicas import SesionEnrutada
 
-db = SQLAlchemy()
+
+db = SQLAlchemy(session_options={"class_": SesionEnrutada})
 migrate = Migrate()
 jwt = JWTManager()
\ No newline at end of file
@@ -0,0 +1,236 @@
+"""Cabecera ``Idempotency-Key`` para las rutas que crean o borran reservas.
+
+La primera petición con una clave reserva una fila en ``claves_idempotencia``
+(con ``status`` NULL) antes de ejecutar la vista y, al terminar, guarda en ella
+el status y el cuerpo de la respuesta. Un reintento con la misma clave y el
+mismo usuario recibe esa respuesta tal cual, sin volver a validar ni insertar.
+Las respuestas ya completadas se guardan también en un LRU en memoria, así que
+un reintento que cae en el mismo proceso ni siquiera consulta la BD.
+
+Las claves caducan a los ``IDEMPOTENCIA_TTL`` segundos. Las respuestas 5xx no
+se guardan: la fila se borra y el cliente puede reintentar con la misma clave.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import click
+from flask import Response, current_app, request
+from flask.cli import AppGroup
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import ClaveIdempotencia
+
+CABECERA = "Idempotency-Key"
+MAX_LONGITUD_CLAVE = 255
+
+
+class AlmacenIdempotencia:
+    def __init__(self, ttl: int = 86400, lru: int = 1024, bloqueo: int = 60):
+        self.ttl = ttl          # segundos que se guarda cada respuesta
+        self.lru = lru          # respuestas completadas que se guardan en memoria
+        self.bloqueo = bloqueo  # segundos tras los que una petición en curso se da por abandonada
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # (usuario_id, clave) -> (huella, status, cuerpo, expira)
+        self._ultima_purga = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get("IDEMPOTENCIA_TTL", self.ttl)
+        self.lru = app.config.get("IDEMPOTENCIA_LRU", self.lru)
+        self.bloqueo = app.config.get("IDEMPOTENCIA_BLOQUEO", self.bloqueo)
+        app.extensions["idempotencia"] = self
+        app.cli.add_command(idempotencia_cli)
+
+    # ---------- LRU ----------
+
+    def _de_cache(self, clave):
+        with self._lock:
+            entrada = self._cache.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            if entrada[3] <= time.time():
+                del self._cache[clave]
+                self.misses += 1
+                return None
+            self._cache.move_to_end(clave)
+            self.hits += 1
+            return entrada
+
+    def _a_cache(self, clave, entrada):
+        if not self.lru:
+            return
+        with self._lock:
+            self._cache[clave] = entrada
+            self._cache.move_to_end(clave)
+            while len(self._cache) > self.lru:
+                self._cache.popitem(last=False)
+
+    def vaciar_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def estadisticas(self) -> dict:
+        return {"entradas": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    # ---------- BD ----------
+
+    def _reservar(self, usuario_id: int, clave: str, huella: str):
+        """Intenta quedarse con la clave.
+
+        Devuelve ``None`` si la petición debe ejecutarse o la fila existente
+        (completada o en curso) si no.
+        """
+        for _ in range(2):
+            ahora = int(time.time())
+            try:
+                db.session.add(ClaveIdempotencia(
+                    usuario_id=usuario_id, clave=clave, huella=huella,
+                    creada=ahora, expira=ahora + self.ttl,
+                ))
+                db.session.commit()
+                return None
+            except IntegrityError:
+                db.session.rollback()
+
+            fila = ClaveIdempotencia.query.filter_by(usuario_id=usuario_id, clave=clave).first()
+            if fila is None:
+                continue  # se borró entre el INSERT y el SELECT
+            caducada = fila.expira <= ahora
+            abandonada = fila.status is None and ahora - fila.creada > self.bloqueo
+            if not (caducada or abandonada):
+                return fila
+            # Filtrar también por creada: si otra petición se ha quedado ya
+            # con la clave, no se borra su fila.
+            db.session.execute(delete(ClaveIdempotencia).where(
+                ClaveIdempotencia.id == fila.id, ClaveIdempotencia.creada == fila.creada,
+            ))
+            db.session.commit()
+        return ClaveIdempotencia.query.filter_by(usuario_id=usuario_id, clave=clave).first()
+
+    def _guardar(self, usuario_id: int, clave: str, status: int, cuerpo: bytes):
+        db.session.execute(
+            update(ClaveIdempotencia)
+            .where(ClaveIdempotencia.usuario_id == usuario_id, ClaveIdempotencia.clave == clave)
+            .values(status=status, respuesta=cuerpo.decode("utf-8"))
+        )
+        db.session.commit()
+
+    def _soltar(self, usuario_id: int, clave: str):
+        db.session.rollback()
+        db.session.execute(delete(ClaveIdempotencia).where(
+            ClaveIdempotencia.usuario_id == usuario_id, ClaveIdempotencia.clave == clave,
+        ))
+        db.session.commit()
+
+    def purgar(self) -> int:
+        """Borra las claves caducadas. Devuelve cuántas se han borrado."""
+        resultado = db.session.execute(
+            delete(ClaveIdempotencia).where(ClaveIdempotencia.expira <= int(time.time()))
+        )
+        db.session.commit()
+        return resultado.rowcount
+
+    def _purgar_si_toca(self):
+        # Como mucho una vez por minuto y por proceso, al crear claves nuevas
+        ahora = time.monotonic()
+        if ahora - self._ultima_purga < 60:
+            return
+        self._ultima_purga = ahora
+        self.purgar()
+
+    # ---------- decorador ----------
+
+    def decorar(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            clave = request.headers.get(CABECERA)
+            if clave is None:
+                return fn(*args, **kwargs)
+            clave = clave.strip()
+            if not clave or len(clave) > MAX_LONGITUD_CLAVE:
+                return {"error": f"{CABECERA} debe tener entre 1 y {MAX_LONGITUD_CLAVE} caracteres"}, 400
+
+            usuario_id = int(get_jwt_identity())
+            huella = _huella()
+            cacheada = self._de_cache((usuario_id, clave))
+            if cacheada is not None:
+                return _repetir(cacheada[0], cacheada[1], cacheada[2], huella)
+
+            fila = self._reservar(usuario_id, clave, huella)
+            if fila is not None:
+                if fila.status is None:
+                    if fila.huella != huella:
+                        return _huella_distinta()
+                    return {"error": f"ya hay una petición en curso con esta {CABECERA}"}, 409
+                cuerpo = fila.respuesta.encode("utf-8")
+                self._a_cache((usuario_id, clave), (fila.huella, fila.status, cuerpo, fila.expira))
+                return _repetir(fila.huella, fila.status, cuerpo, huella)
+
+            try:
+                respuesta = current_app.make_response(fn(*args, **kwargs))
+            except Exception:
+                self._soltar(usuario_id, clave)
+                raise
+
+            if respuesta.status_code >= 500 or respuesta.is_streamed:
+                self._soltar(usuario_id, clave)
+                return respuesta
+
+            cuerpo = respuesta.get_data()
+            self._guardar(usuario_id, clave, respuesta.status_code, cuerpo)
+            self._a_cache(
+                (usuario_id, clave),
+                (huella, respuesta.status_code, cuerpo, int(time.time()) + self.ttl),
+            )
+            self._purgar_si_toca()
+            return respuesta
+        return wrapper
+
+
+def _huella() -> str:
+    # Se normaliza el JSON para que un reintento con las claves en otro orden
+    # cuente como la misma petición.
+    datos = request.get_json(silent=True)
+    if datos is None:
+        cuerpo = request.get_data()
+    else:
+        cuerpo = json.dumps(datos, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(request.path.encode("utf-8") + b"\n" + cuerpo).hexdigest()
+
+
+def _huella_distinta():
+    return {"error": f"{CABECERA} ya usada con una petición distinta"}, 422
+
+
+def _repetir(huella_guardada, status, cuerpo, huella):
+    if huella_guardada != huella:
+        return _huella_distinta()
+    respuesta = Response(cuerpo, status=status, mimetype="application/json")
+    respuesta.headers["Idempotent-Replayed"] = "true"
+    return respuesta
+
+
+idempotencia = AlmacenIdempotencia()
+
+
+def idempotente(fn):
+    """Aplica ``Idempotency-Key`` a una vista ya protegida con ``jwt_required()``."""
+    return idempotencia.decorar(fn)
+
+
+idempotencia_cli = AppGroup("idempotencia", help="Mantenimiento de las claves de idempotencia.")
+
+
+@idempotencia_cli.command("purgar")
+def purgar_cmd():
+    n = idempotencia.purgar()
+    click.echo(f"OK: {n} claves caducadas borradas.")
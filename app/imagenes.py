@@ -0,0 +1,324 @@
+"""Procesado de las fotos de perfil.
+
+La subida llega en bloques (``app/subidas.py``). Se rechaza si el tipo
+declarado no es de imagen o si los primeros bytes no son de PNG, JPEG o WebP,
+sin leer el resto. Se escribe en un temporal por bloques y, antes de
+responder, se comprueba que Pillow puede leerla entera (los JPEG a 1/8 de
+tamaño con ``draft``) y que no pasa de ``IMAGENES_MAX_PIXELES``: una imagen
+corrupta o una bomba de descompresión dan 400 también en segundo plano. Un
+pool de ``IMAGENES_HILOS`` hilos genera las variantes, y la vista responde 202
+sin esperar a que terminen.
+
+Cada subida apunta un turno en ``Usuario.foto_pendiente`` y su trabajo solo
+guarda las variantes si el turno sigue siendo el suyo. Si dos trabajos del
+mismo usuario acaban en otro orden, gana la última subida y las variantes de
+la anterior se borran.
+
+Cada variante es un WebP cuadrado de ``IMAGENES_TAMANOS`` píxeles de lado
+(recorte centrado). Se añade una ``"grande"`` que cabe en
+``IMAGENES_LADO_MAX`` y conserva la proporción. Se reencodan desde los píxeles
+tras aplicar la orientación EXIF, así que no llevan EXIF, GPS ni otros
+metadatos.
+
+Las variantes se nombran por el sha256 de la subida original, que se calcula
+según llegan los bloques: ``avatares/ab/<sha256>-<variante>.webp`` dentro de
+``UPLOAD_FOLDER``. Si algún usuario ya tiene ese ``foto_sha`` se reutilizan
+sus variantes sin pasar por el pool. Los ficheros se escriben en un temporal
+y se renombran con ``os.replace``, y uno ya escrito no se sobrescribe, así que
+una URL nunca cambia de contenido y se puede cachear para siempre.
+``Usuario.foto_variantes`` guarda ``{"64": ruta, "256": ruta, "grande":
+ruta}``, ``Usuario.foto`` apunta a la grande y ``Usuario.foto_sha``
+(indexada) es el sha256 del que salen.
+
+Al cambiar la foto se borran los ficheros de la anterior si ningún otro
+usuario tiene su mismo ``foto_sha``.
+
+Hace falta Pillow (está en ``requirements.txt``). Sin él la app arranca pero
+rechaza las subidas con ``ImagenesNoDisponibles``: nunca se publica el
+original, que llevaría su EXIF y pesaría decenas de veces más.
+``IMAGENES_HILOS=0`` procesa en el propio hilo de la petición.
+"""
+import hashlib
+import io
+import logging
+import os
+import secrets
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # las subidas fallan con ImagenesNoDisponibles
+    Image = ImageOps = None
+
+from sqlalchemy import update
+from werkzeug.security import safe_join
+
+from .extensions import db
+from .models import Usuario
+
+logger = logging.getLogger(__name__)
+
+CARPETA = "avatares"
+# Tipos que puede declarar el cliente; octet-stream es "no lo sé" y decide el contenido
+TIPOS_DECLARADOS = {None, "application/octet-stream", "image/png", "image/jpeg", "image/webp"}
+
+
+class ImagenInvalida(Exception):
+    """El fichero subido no es una imagen PNG, JPEG o WebP."""
+
+
+class ImagenesNoDisponibles(Exception):
+    """Falta Pillow: no se pueden generar las variantes."""
+
+
+def detectar_tipo(cabecera: bytes):
+    """Extensión según los primeros bytes del fichero, o ``None``."""
+    if cabecera.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if cabecera.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if len(cabecera) >= 12 and cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _ruta_relativa(sha: str, variante: str) -> str:
+    # Dos niveles para no acabar con cientos de miles de ficheros en un directorio
+    return f"{CARPETA}/{sha[:2]}/{sha}-{variante}.webp"
+
+
+def _guardar(carpeta: str, relativa: str, datos: bytes) -> str:
+    """Escribe ``datos`` en ``relativa`` de forma atómica si aún no existe."""
+    destino = os.path.join(carpeta, relativa)
+    if not os.path.exists(destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporal = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, destino)
+    return relativa
+
+
+class ProcesadorImagenes:
+    def __init__(self, tamanos=(64, 256), lado_max: int = 1024, calidad: int = 80, hilos: int = 2):
+        self.tamanos = tuple(tamanos)
+        self.lado_max = lado_max
+        self.calidad = calidad
+        self.hilos = hilos
+        self._app = None
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.tamanos = tuple(app.config.get("IMAGENES_TAMANOS", self.tamanos))
+        self.lado_max = app.config.get("IMAGENES_LADO_MAX", self.lado_max)
+        self.calidad = app.config.get("IMAGENES_CALIDAD", self.calidad)
+        self.hilos = app.config.get("IMAGENES_HILOS", self.hilos)
+        if Image is not None:
+            Image.MAX_IMAGE_PIXELS = app.config.get("IMAGENES_MAX_PIXELES", Image.MAX_IMAGE_PIXELS)
+        self._app = app
+        app.extensions["imagenes"] = self
+
+    @property
+    def disponible(self) -> bool:
+        """Hay Pillow para generar variantes."""
+        return Image is not None
+
+    # ---------- subida ----------
+
+    def recibir(self, usuario_id: int, fichero) -> bool:
+        """Valida la subida y encarga sus variantes.
+
+        ``fichero`` es un ``FicheroEnStreaming`` (o cualquier iterable de
+        bloques con ``content_type``). Devuelve True si el procesado sigue en
+        segundo plano y False si ya ha terminado o no hacía falta. Lanza
+        ``ImagenInvalida`` si no es una imagen e ``ImagenesNoDisponibles`` si
+        falta Pillow, en ambos casos sin leer el cuerpo entero.
+        """
+        if not self.disponible:
+            raise ImagenesNoDisponibles()
+        if getattr(fichero, "content_type", None) not in TIPOS_DECLARADOS:
+            raise ImagenInvalida()
+        bloques = iter(fichero)
+        cabecera = b""
+        for bloque in bloques:
+            cabecera += bloque
+            if len(cabecera) >= 16:
+                break
+        extension = detectar_tipo(cabecera)
+        if extension is None:
+            raise ImagenInvalida()
+
+        # El original nunca se publica: va a un temporal fuera de UPLOAD_FOLDER
+        resumen = hashlib.sha256(cabecera)
+        descriptor, temporal = tempfile.mkstemp(prefix="avatar-", suffix="." + extension)
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(cabecera)
+                for bloque in bloques:
+                    resumen.update(bloque)
+                    f.write(bloque)
+            sha = resumen.hexdigest()
+            # Ya validada y procesada antes (por este u otro usuario)
+            existentes = self._variantes_de(sha)
+            if existentes is None:
+                self._validar(temporal)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+        turno = secrets.token_hex(16)
+        db.session.execute(update(Usuario).where(Usuario.id == usuario_id).values(foto_pendiente=turno))
+        db.session.commit()
+
+        if existentes is not None:
+            os.unlink(temporal)
+            self._asignar(usuario_id, turno, sha, existentes)
+            return False
+        if not self.hilos:
+            self._procesar(usuario_id, temporal, turno, sha)
+            return False
+        self._obtener_pool().submit(self._procesar_en_contexto, usuario_id, temporal, turno, sha)
+        return True
+
+    def _variantes_de(self, sha: str):
+        """Variantes ya generadas de la subida ``sha``, o ``None`` si hay que generarlas."""
+        fila = db.session.query(Usuario.foto_variantes).filter(
+            Usuario.foto_sha == sha, Usuario.foto_variantes.isnot(None),
+        ).first()
+        if fila is None:
+            return None
+        variantes = fila.foto_variantes
+        # Con otros IMAGENES_TAMANOS, o si falta algún fichero, se regeneran
+        carpeta = self._app.config["UPLOAD_FOLDER"]
+        if set(variantes) != {"grande", *map(str, self.tamanos)}:
+            return None
+        if not all(os.path.exists(os.path.join(carpeta, r)) for r in variantes.values()):
+            return None
+        return variantes
+
+    def _validar(self, ruta: str):
+        """Lanza ``ImagenInvalida`` si la imagen está corrupta o tiene demasiados píxeles."""
+        try:
+            with Image.open(ruta) as imagen:
+                ancho, alto = imagen.size
+                # verify() revisa la estructura (los CRC de PNG) sin decodificar
+                imagen.verify()
+            maximo = Image.MAX_IMAGE_PIXELS
+            if maximo and ancho * alto > maximo:
+                raise ImagenInvalida()
+            # verify() deja el fichero inservible y no mira los datos de un
+            # JPEG o WebP: se decodifica de nuevo, a la escala mínima que
+            # permita draft(), para detectar un contenido truncado
+            with Image.open(ruta) as imagen:
+                lado = min(self.tamanos, default=self.lado_max)
+                imagen.draft("RGB", (lado, lado))
+                imagen.load()
+        except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+            raise ImagenInvalida() from e
+
+    def _obtener_pool(self):
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="imagenes")
+                    self._pid = os.getpid()
+        return self._pool
+
+    def cerrar(self):
+        """Espera a que acaben los procesados en curso y cierra el pool."""
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=True)
+        self._pool = None
+
+    # ---------- procesado ----------
+
+    def _procesar_en_contexto(self, usuario_id: int, temporal: str, turno: str, sha: str):
+        with self._app.app_context():
+            try:
+                self._procesar(usuario_id, temporal, turno, sha)
+            except Exception:
+                logger.exception("no se ha podido procesar la foto del usuario %s", usuario_id)
+
+    def _procesar(self, usuario_id: int, temporal: str, turno: str, sha: str):
+        carpeta = self._app.config["UPLOAD_FOLDER"]
+        try:
+            variantes = self.generar_variantes(temporal, carpeta, sha)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Cabecera válida pero contenido corrupto, truncado o enorme
+            raise ImagenInvalida() from e
+        finally:
+            os.unlink(temporal)
+        self._asignar(usuario_id, turno, sha, variantes)
+
+    def _asignar(self, usuario_id: int, turno: str, sha: str, variantes: dict):
+        carpeta = self._app.config["UPLOAD_FOLDER"]
+        usuario = db.session.get(Usuario, usuario_id)
+        anterior_sha, anteriores = None, set()
+        if usuario is not None:
+            anterior_sha = usuario.foto_sha
+            anteriores = set((usuario.foto_variantes or {}).values()) | {usuario.foto}
+        # Solo si no ha empezado otra subida del usuario desde que empezó esta
+        guardada = db.session.execute(
+            update(Usuario)
+            .where(Usuario.id == usuario_id, Usuario.foto_pendiente == turno)
+            .values(foto=variantes["grande"], foto_variantes=variantes, foto_sha=sha, foto_pendiente=None)
+        ).rowcount
+        db.session.commit()
+        if not guardada:
+            self._borrar_sin_uso(carpeta, sha, set(variantes.values()))
+        elif anterior_sha != sha:
+            self._borrar_sin_uso(carpeta, anterior_sha, anteriores - {None})
+
+    def _borrar_sin_uso(self, carpeta: str, sha, rutas):
+        """Borra ``rutas`` (las variantes de ``sha``) si ningún usuario tiene ese ``foto_sha``."""
+        # Varios usuarios pueden compartir los ficheros de una misma subida: se
+        # comprueba después del commit para no borrar unos que acaban de
+        # quedar en uso
+        if sha is None:
+            # Foto anterior a foto_sha: el original que se guardaba tal cual
+            # era de un solo usuario; las variantes podrían ser compartidas
+            rutas = {r for r in rutas if not r.startswith(CARPETA + "/")}
+        elif db.session.query(Usuario.id).filter(Usuario.foto_sha == sha).first() is not None:
+            return
+        for ruta in rutas:
+            completa = safe_join(carpeta, ruta)
+            if completa is not None:
+                with suppress(FileNotFoundError):
+                    os.unlink(completa)
+
+    def generar_variantes(self, origen, carpeta: str, sha: str) -> dict:
+        """Genera los WebP sin metadatos de ``origen`` y devuelve ``{nombre: ruta}``.
+
+        ``sha`` es el sha256 de ``origen`` y da nombre a los ficheros.
+        """
+        with Image.open(origen) as imagen:
+            # Con JPEG, draft() decodifica directamente a 1/2, 1/4 u 1/8 de
+            # tamaño si sigue siendo mayor que lo que vamos a generar
+            imagen.draft("RGB", (self.lado_max, self.lado_max))
+            imagen = ImageOps.exif_transpose(imagen)
+            modo = "RGBA" if imagen.mode in ("RGBA", "LA", "P") else "RGB"
+            imagen = imagen.convert(modo)
+
+            # thumbnail() reduce sin ampliar nunca ni cambiar la proporción
+            imagen.thumbnail((self.lado_max, self.lado_max), Image.LANCZOS)
+            variantes = {"grande": self._guardar_webp(imagen, carpeta, _ruta_relativa(sha, "grande"))}
+            for tamano in self.tamanos:
+                cuadrada = ImageOps.fit(imagen, (tamano, tamano), Image.LANCZOS)
+                variantes[str(tamano)] = self._guardar_webp(cuadrada, carpeta, _ruta_relativa(sha, str(tamano)))
+        return variantes
+
+    def _guardar_webp(self, imagen, carpeta: str, relativa: str) -> str:
+        if os.path.exists(os.path.join(carpeta, relativa)):
+            return relativa
+        salida = io.BytesIO()
+        # Sin exif= ni icc_profile=: la imagen nueva no lleva metadatos
+        imagen.save(salida, "WEBP", quality=self.calidad, method=4)
+        return _guardar(carpeta, relativa, salida.getvalue())
+
+
+imagenes = ProcesadorImagenes()
@@ -0,0 +1,142 @@
+"""Medidas de SQL por petición y registro de peticiones y consultas lentas.
+
+Con ``INSTRUMENTACION=1`` cada petición cuenta sus sentencias SQL, el tiempo
+que pasan en la BD y guarda las ``INSTRUMENTACION_TOP`` más lentas:
+
+- La respuesta lleva ``Server-Timing`` (``db`` y ``app``), que las herramientas
+  de desarrollo del navegador muestran en la pestaña de red
+  (``INSTRUMENTACION_SERVER_TIMING=0`` lo quita).
+- Las consultas de más de ``LENTO_SQL_MS`` y las peticiones de más de
+  ``LENTO_PETICION_MS`` o con más de ``LENTO_CONSULTAS`` sentencias (el síntoma
+  típico de un N+1) se registran como warning en el logger
+  ``app.instrumentacion`` con el endpoint.
+
+Desactivada no se registra ningún evento ni hook, así que no cuesta nada.
+Las medidas de la petición en curso están en ``g.medidas`` (``MedidasPeticion``).
+En respuestas en streaming la cabecera solo cuenta hasta enviar las
+cabeceras; el registro de petición lenta, en cambio, se hace al terminar.
+"""
+import heapq
+import logging
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from .extensions import db
+
+logger = logging.getLogger(__name__)
+
+LARGO_SQL_LOG = 500
+
+
+class MedidasPeticion:
+    __slots__ = ("inicio", "consultas", "tiempo_bd", "lentas")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_bd = 0.0
+        self.lentas = []  # montículo de (segundos, sql) con las más lentas
+
+    def anotar(self, sql: str, duracion: float, top: int):
+        self.consultas += 1
+        self.tiempo_bd += duracion
+        if len(self.lentas) < top:
+            heapq.heappush(self.lentas, (duracion, sql))
+        elif self.lentas and duracion > self.lentas[0][0]:
+            heapq.heapreplace(self.lentas, (duracion, sql))
+
+    def mas_lentas(self):
+        return sorted(self.lentas, reverse=True)
+
+
+def _recortar(sql: str) -> str:
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= LARGO_SQL_LOG else sql[:LARGO_SQL_LOG] + "..."
+
+
+def _endpoint() -> str:
+    return (request.endpoint or request.path) if has_request_context() else "-"
+
+
+class Instrumentacion:
+    def __init__(self):
+        self.top = 3
+        self.lento_sql = 0.1
+        self.lento_peticion = 0.5
+        self.max_consultas = 20
+        self.server_timing = True
+
+    def init_app(self, app):
+        """Llamar después de ``db.init_app(app)``: escucha todos los engines."""
+        app.extensions["instrumentacion"] = self
+        if not app.config.get("INSTRUMENTACION", False):
+            return
+        self.top = app.config.get("INSTRUMENTACION_TOP", self.top)
+        self.lento_sql = app.config.get("LENTO_SQL_MS", 100) / 1000
+        self.lento_peticion = app.config.get("LENTO_PETICION_MS", 500) / 1000
+        self.max_consultas = app.config.get("LENTO_CONSULTAS", self.max_consultas)
+        self.server_timing = app.config.get("INSTRUMENTACION_SERVER_TIMING", self.server_timing)
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._antes_sql)
+            event.listen(engine, "after_cursor_execute", self._despues_sql)
+
+        app.before_request(self._antes)
+        app.after_request(self._cabecera)
+        app.teardown_request(self._al_terminar)
+
+    # ---------- SQL ----------
+
+    # El inicio se guarda en el contexto de ejecución y no en la conexión: si la
+    # sentencia falla no hay after_cursor_execute y no queda nada colgando
+    def _antes_sql(self, conn, cursor, sql, params, context, executemany):
+        if context is not None:
+            context._instr_inicio = time.perf_counter()
+
+    def _despues_sql(self, conn, cursor, sql, params, context, executemany):
+        inicio = getattr(context, "_instr_inicio", None)
+        if inicio is None:
+            return
+        duracion = time.perf_counter() - inicio
+        medidas = g.get("medidas") if has_request_context() else None
+        if medidas is not None:
+            medidas.anotar(sql, duracion, self.top)
+        if duracion >= self.lento_sql:
+            logger.warning("consulta lenta (%.1f ms) en %s: %s", duracion * 1000, _endpoint(), _recortar(sql))
+
+    # ---------- por petición ----------
+
+    def _antes(self):
+        g.medidas = MedidasPeticion()
+
+    def _cabecera(self, respuesta):
+        medidas = g.get("medidas")
+        if medidas is not None and self.server_timing:
+            total = time.perf_counter() - medidas.inicio
+            respuesta.headers.add(
+                "Server-Timing",
+                f'db;dur={medidas.tiempo_bd * 1000:.1f};desc="SQL: {medidas.consultas}", '
+                f"app;dur={total * 1000:.1f}",
+            )
+        return respuesta
+
+    def _al_terminar(self, _error=None):
+        medidas = g.pop("medidas", None)
+        if medidas is None:
+            return
+        total = time.perf_counter() - medidas.inicio
+        if total < self.lento_peticion and medidas.consultas <= self.max_consultas:
+            return
+        lentas = "; ".join(f"{d * 1000:.1f} ms {_recortar(sql)}" for d, sql in medidas.mas_lentas())
+        logger.warning(
+            "petición lenta %s %s (%s): %.1f ms, %d consultas, %.1f ms en BD; más lentas: %s",
+            request.method, request.path, request.endpoint, total * 1000,
+            medidas.consultas, medidas.tiempo_bd * 1000, lentas or "-",
+        )
+
+
+instrumentacion = Instrumentacion()
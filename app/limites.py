@@ -0,0 +1,225 @@
+"""Límite de intentos por IP y por email en login y registro.
+
+``@limitado`` se pone en la vista y comprueba los límites antes de ejecutarla,
+así que una petición rechazada no llega a consultar la BD ni a calcular ningún
+hash: responde 429 con ``Retry-After``. Los límites se configuran por
+blueprint en ``LIMITES`` (``{"auth": {"ip": "30/60", "email": "10/300"}}`` =
+30 peticiones por IP cada 60 s y 10 por email cada 300 s). Cada endpoint lleva
+sus propios contadores.
+
+Se cuenta con una ventana deslizante aproximada: por clave se guarda la cuenta
+de la ventana fija actual y la de la anterior, y la anterior pesa en
+proporción a lo que queda de ella dentro de los últimos ``segundos``. Son
+tres números por clave y no hace falta guardar cada intento.
+
+Backends (``LIMITES_BACKEND``):
+
+- ``memoria``: un diccionario en cada proceso. Con N workers el límite efectivo
+  es N veces el configurado.
+- ``sqlite``: un fichero SQLite aparte (``LIMITES_SQLITE_PATH``) compartido
+  por todos los workers de la máquina.
+
+Detrás de un proxy, ``LIMITES_PROXIES`` es el número de proxies de confianza
+que añaden ``X-Forwarded-For``; sin él se usa la IP de la conexión.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request
+
+
+def parsear_limite(texto: str):
+    """``"30/60"`` -> ``(30, 60)`` (peticiones, segundos)."""
+    peticiones, segundos = texto.split("/")
+    return int(peticiones), int(segundos)
+
+
+def _estimar(cuenta, anterior, inicio, segundos, ahora):
+    """Peticiones en los últimos ``segundos`` según la ventana deslizante."""
+    return anterior * (1 - (ahora - inicio) / segundos) + cuenta
+
+
+def _espera(cuenta, anterior, inicio, segundos, ahora, maximo) -> int:
+    """Segundos hasta que la estimación baje de ``maximo``."""
+    fin = inicio + segundos
+    if anterior and cuenta < maximo:
+        # El peso de la ventana anterior cae linealmente hasta el final de la actual
+        restante = (maximo - cuenta) / anterior
+        return max(1, math.ceil(fin - restante * segundos - ahora))
+    return max(1, math.ceil(fin - ahora))
+
+
+class MemoriaLimites:
+    def __init__(self, max_claves: int = 100_000):
+        self.max_claves = max_claves
+        self._lock = threading.Lock()
+        self._ventanas = {}  # clave -> (inicio de la ventana, cuenta, cuenta de la anterior)
+
+    def intentar(self, clave: str, maximo: int, segundos: int, ahora: float):
+        """Apunta un intento si cabe. Devuelve ``None`` o los segundos de espera."""
+        inicio_actual = int(ahora // segundos) * segundos
+        with self._lock:
+            inicio, cuenta, anterior = self._ventanas.get(clave, (inicio_actual, 0, 0))
+            if inicio != inicio_actual:
+                anterior = cuenta if inicio_actual - inicio == segundos else 0
+                inicio, cuenta = inicio_actual, 0
+            if _estimar(cuenta, anterior, inicio, segundos, ahora) >= maximo:
+                self._ventanas[clave] = (inicio, cuenta, anterior)
+                return _espera(cuenta, anterior, inicio, segundos, ahora, maximo)
+            self._ventanas[clave] = (inicio, cuenta + 1, anterior)
+            if len(self._ventanas) > self.max_claves:
+                self._purgar(ahora)
+        return None
+
+    def _purgar(self, ahora: float):
+        # Sin los segundos de cada clave, se descartan las que llevan una hora
+        # quietas y, si no basta, la mitad más antigua
+        viejas = [c for c, v in self._ventanas.items() if ahora - v[0] > 3600]
+        for c in viejas:
+            del self._ventanas[c]
+        if len(self._ventanas) > self.max_claves:
+            orden = sorted(self._ventanas, key=lambda c: self._ventanas[c][0])
+            for c in orden[: len(orden) // 2]:
+                del self._ventanas[c]
+
+    def vaciar(self):
+        with self._lock:
+            self._ventanas.clear()
+
+
+class SQLiteLimites:
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._ultima_purga = 0.0
+        conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+        try:
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS limites ("
+                " clave TEXT PRIMARY KEY, inicio REAL NOT NULL, cuenta INTEGER NOT NULL,"
+                " anterior INTEGER NOT NULL, expira REAL NOT NULL)"
+            )
+            conexion.execute("CREATE INDEX IF NOT EXISTS ix_limites_expira ON limites (expira)")
+        finally:
+            conexion.close()
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso: no se reutiliza tras un fork
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    def intentar(self, clave: str, maximo: int, segundos: int, ahora: float):
+        conexion = self._conexion()
+        inicio_actual = int(ahora // segundos) * segundos
+        # BEGIN IMMEDIATE toma el bloqueo de escritura antes de leer: dos
+        # workers no pueden leer la misma cuenta y apuntar los dos
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conexion.execute(
+                "SELECT inicio, cuenta, anterior FROM limites WHERE clave = ?", (clave,)
+            ).fetchone()
+            inicio, cuenta, anterior = fila or (inicio_actual, 0, 0)
+            if inicio != inicio_actual:
+                anterior = cuenta if inicio_actual - inicio == segundos else 0
+                inicio, cuenta = inicio_actual, 0
+            espera = None
+            if _estimar(cuenta, anterior, inicio, segundos, ahora) >= maximo:
+                espera = _espera(cuenta, anterior, inicio, segundos, ahora, maximo)
+            else:
+                cuenta += 1
+            conexion.execute(
+                "INSERT INTO limites (clave, inicio, cuenta, anterior, expira) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(clave) DO UPDATE SET inicio = excluded.inicio, cuenta = excluded.cuenta,"
+                " anterior = excluded.anterior, expira = excluded.expira",
+                (clave, inicio, cuenta, anterior, inicio + 2 * segundos),
+            )
+            if ahora - self._ultima_purga > 60:
+                self._ultima_purga = ahora
+                conexion.execute("DELETE FROM limites WHERE expira < ?", (ahora,))
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return espera
+
+    def vaciar(self):
+        self._conexion().execute("DELETE FROM limites")
+
+
+class Limitador:
+    def __init__(self):
+        self.limites = {}   # blueprint -> {"ip": (peticiones, segundos), "email": ...}
+        self.proxies = 0
+        self.backend = MemoriaLimites()
+
+    def init_app(self, app):
+        self.limites = {
+            blueprint: {tipo: parsear_limite(texto) for tipo, texto in por_tipo.items() if texto}
+            for blueprint, por_tipo in app.config.get("LIMITES", {}).items()
+        }
+        self.proxies = app.config.get("LIMITES_PROXIES", 0)
+        if app.config.get("LIMITES_BACKEND", "memoria") == "sqlite":
+            self.backend = SQLiteLimites(app.config["LIMITES_SQLITE_PATH"])
+        else:
+            self.backend = MemoriaLimites(app.config.get("LIMITES_MAX_CLAVES", 100_000))
+        app.extensions["limites"] = self
+
+    def _ip(self) -> str:
+        if self.proxies:
+            ruta = request.access_route
+            if len(ruta) >= self.proxies:
+                return ruta[-self.proxies]
+        return request.remote_addr or "-"
+
+    def comprobar(self):
+        """Segundos de espera si la petición supera algún límite, o ``None``."""
+        if not current_app.config.get("LIMITES_ACTIVOS", True):
+            return None
+        limites = self.limites.get(request.blueprint)
+        if not limites:
+            return None
+        claves = []
+        if "ip" in limites:
+            claves.append(("ip", self._ip()))
+        if "email" in limites:
+            # El cuerpo puede ser JSON válido sin ser un objeto (lista, número...)
+            datos = request.get_json(silent=True)
+            email = datos.get("email") if isinstance(datos, dict) else None
+            if isinstance(email, str) and email.strip():
+                claves.append(("email", email.strip().lower()))
+
+        ahora = time.time()
+        for tipo, valor in claves:
+            maximo, segundos = limites[tipo]
+            espera = self.backend.intentar(f"{request.endpoint}:{tipo}:{valor}", maximo, segundos, ahora)
+            if espera is not None:
+                return espera
+        return None
+
+    def decorar(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            espera = self.comprobar()
+            if espera is not None:
+                return {"error": "demasiados intentos, reintenta más tarde"}, 429, {"Retry-After": str(espera)}
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+
+limitador = Limitador()
+
+
+def limitado(fn):
+    """Aplica a la vista los límites de ``LIMITES`` de su blueprint."""
+    return limitador.decorar(fn)
@@ -1,12 +1,94 @@
-import os
-from flask import Blueprint, current_app, send_from_directory, abort
+"""Ficheros subidos (fotos de perfil) en ``/media/<ruta>``.
+
+- Solo se sirven imágenes (``ALLOWED_EXTENSIONS``) dentro de
+  ``UPLOAD_FOLDER``. Se rechazan los segmentos ocultos y los ``.tmp`` que
+  quedan a medio escribir.
+- Los nombres que no pueden cambiar de contenido (uuid de
+  ``make_safe_filename`` o sha256 de ``app/imagenes.py``) van con
+  ``Cache-Control: public, max-age=1 año, immutable``; el resto con
+  ``MEDIA_MAX_AGE``. Siempre con ETag y Last-Modified, así que un navegador
+  revalida con un 304, y con soporte de ``Range``.
+- ``MEDIA_OFFLOAD`` deja el envío de los bytes al servidor web:
+
+  - ``x-accel`` (nginx): la respuesta lleva ``X-Accel-Redirect:
+    MEDIA_ACCEL_PREFIX + ruta`` y nginx sirve el fichero desde una location
+    interna::
+
+        location /_media/ {
+            internal;
+            alias /ruta/a/uploads/;
+        }
+
+  - ``x-sendfile`` (Apache mod_xsendfile, lighttpd): ``X-Sendfile`` con la
+    ruta absoluta.
+"""
+import mimetypes
+import re
+
+from flask import Blueprint, Response, abort, current_app, request
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from .utils import ALLOWED_EXTENSIONS
 
 media_bp = Blueprint("media", __name__)
 
+UN_ANIO = 365 * 24 * 3600
+
+# 32 hex = uuid4().hex de make_safe_filename; <64 hex>-<variante> = app/imagenes.py
+NOMBRE_INMUTABLE = re.compile(r"^(?:[0-9a-f]{32}|[0-9a-f]{64}-[a-z0-9]+)\.[a-z0-9]+$")
+
+
+def _ruta_valida(filename: str) -> bool:
+    partes = filename.split("/")
+    if any(not p or p.startswith(".") for p in partes):
+        return False
+    nombre = partes[-1]
+    return "." in nombre and nombre.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def _inmutable(filename: str) -> bool:
+    return bool(NOMBRE_INMUTABLE.match(filename.rsplit("/", 1)[-1]))
+
+
+def _cache(respuesta, filename: str):
+    respuesta.cache_control.no_cache = None
+    respuesta.cache_control.public = True
+    if _inmutable(filename):
+        respuesta.cache_control.max_age = UN_ANIO
+        respuesta.cache_control.immutable = True
+    else:
+        respuesta.cache_control.max_age = current_app.config.get("MEDIA_MAX_AGE", 3600)
+    respuesta.headers["X-Content-Type-Options"] = "nosniff"
+    return respuesta
+
+
 @media_bp.get("/<path:filename>")
 def get_media(filename):
+    if not _ruta_valida(filename):
+        abort(404)
     folder = current_app.config["UPLOAD_FOLDER"]
-    full = os.path.join(folder, filename)
-    if not os.path.exists(full):
+    ruta = safe_join(folder, filename)
+    if ruta is None:
+        abort(404)
+
+    if current_app.config.get("MEDIA_OFFLOAD") == "x-accel":
+        # nginx comprueba el fichero y se encarga de ETag, Range y 404
+        respuesta = Response(mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        respuesta.headers["X-Accel-Redirect"] = current_app.config.get("MEDIA_ACCEL_PREFIX", "/_media/") + filename
+        return _cache(respuesta, filename)
+
+    # send_file hace el único stat: sin os.path.exists previo
+    try:
+        respuesta = send_file(
+            ruta,
+            request.environ,
+            conditional=True,
+            etag=True,
+            max_age=UN_ANIO if _inmutable(filename) else current_app.config.get("MEDIA_MAX_AGE", 3600),
+            use_x_sendfile=current_app.config.get("MEDIA_OFFLOAD") == "x-sendfile",
+            response_class=current_app.response_class,
+        )
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
         abort(404)
-    return send_from_directory(folder, filename)
+    return _cache(respuesta, filename)
@@ -0,0 +1,309 @@
+"""Métricas en formato de texto de Prometheus en ``/metrics``.
+
+Se exponen:
+
+- ``padel_peticiones_total`` y el histograma ``padel_peticion_segundos`` por
+  endpoint, método y status (las rutas que no existen van juntas como
+  ``sin_ruta`` para no disparar la cardinalidad).
+- ``padel_reservas_total`` de ``reservar`` y ``reservar_lote`` por resultado
+  (``ok``, ``conflicto`` = 409, ``rechazada`` = otros 4xx, ``error`` = 5xx) y
+  ``padel_logins_total`` de ``auth.login`` (``ok``, ``fallo``, ``error``). Los
+  reintentos que devuelve ``Idempotency-Key`` no cuentan dos veces.
+- Uso del pool de conexiones de cada engine y aciertos, fallos y entradas de
+  las cachés en memoria (catálogo, índice de disponibilidad, versiones de
+  token, LRU de idempotencia) y hashes de contraseña pendientes.
+
+Cada proceso acumula en memoria; apuntar una petición cuesta un único lock.
+Con varios workers (gunicorn) hay que dar un directorio compartido en
+``METRICAS_DIR``: cada worker vuelca allí su foto cada ``METRICAS_VOLCADO``
+segundos (al acabar una petición, si toca) y el que atiende ``/metrics`` suma
+las de todos. Los contadores de workers muertos se siguen sumando; los valores
+instantáneos (pool, entradas de caché) solo de los ficheros recientes. El
+directorio se vacía con ``flask metricas limpiar`` antes de arrancar el
+servidor. La ruta exige ``Authorization: Bearer <METRICAS_TOKEN>``; sin token
+configurado responde 404, aunque las métricas se sigan recogiendo.
+"""
+import atexit
+import hmac
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import click
+from flask import Response, current_app, g, request
+from flask.cli import AppGroup
+
+from .extensions import db
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nombre -> (tipo, ayuda)
+DEFINICIONES = {
+    "padel_peticiones_total": ("counter", "Peticiones atendidas por endpoint, método y status."),
+    "padel_peticion_segundos": ("histogram", "Duración de las peticiones por endpoint y método."),
+    "padel_reservas_total": ("counter", "Intentos de reserva por endpoint y resultado."),
+    "padel_logins_total": ("counter", "Intentos de login por resultado."),
+    "padel_bd_pool_conexiones": ("gauge", "Conexiones del pool por engine y estado."),
+    "padel_bd_pool_tamano": ("gauge", "Tamaño configurado del pool por engine."),
+    "padel_cache_aciertos_total": ("counter", "Aciertos de las cachés en memoria."),
+    "padel_cache_fallos_total": ("counter", "Fallos de las cachés en memoria."),
+    "padel_cache_entradas": ("gauge", "Entradas guardadas en las cachés en memoria."),
+    "padel_hash_pendientes": ("gauge", "Hashes de contraseña en curso o en cola."),
+}
+
+# endpoint -> contador de resultados (ver CLASIFICADORES)
+EVENTOS = {
+    "api.reservar": "padel_reservas_total",
+    "api.reservar_lote": "padel_reservas_total",
+    "auth.login": "padel_logins_total",
+}
+
+# nombre en la métrica -> clave en app.extensions de las cachés con estadisticas()
+CACHES = {
+    "catalogo": "catalogo",
+    "disponibilidad": "disponibilidad",
+    "versiones_token": "versiones_token",
+    "idempotencia": "idempotencia",
+}
+
+
+def _resultado_reserva(status: int) -> str:
+    if status < 400:
+        return "ok"
+    if status == 409:
+        return "conflicto"
+    return "error" if status >= 500 else "rechazada"
+
+
+def _resultado_login(status: int) -> str:
+    if status < 400:
+        return "ok"
+    return "error" if status >= 500 else "fallo"
+
+
+CLASIFICADORES = {
+    "padel_reservas_total": _resultado_reserva,
+    "padel_logins_total": _resultado_login,
+}
+
+
+def _etiquetas(**kwargs) -> tuple:
+    return tuple(sorted(kwargs.items()))
+
+
+class Metricas:
+    def __init__(self, volcado: float = 5):
+        self.volcado = volcado  # segundos entre volcados al directorio compartido
+        self.directorio = None
+        self._lock = threading.Lock()
+        self._contadores = {}   # (nombre, etiquetas) -> valor
+        self._histogramas = {}  # (nombre, etiquetas) -> [cuenta por bucket..., +Inf, suma]
+        self._ultimo_volcado = 0.0
+        self._app = None
+
+    def init_app(self, app):
+        app.extensions["metricas"] = self
+        app.cli.add_command(metricas_cli)
+        if not app.config.get("METRICAS", True):
+            return
+        self._app = app
+        self.volcado = app.config.get("METRICAS_VOLCADO", self.volcado)
+        directorio = app.config.get("METRICAS_DIR")
+        if directorio:
+            self.directorio = Path(directorio)
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            atexit.register(self.volcar)
+
+        app.before_request(self._antes)
+        app.after_request(self._despues)
+        app.add_url_rule("/metrics", "metricas", self.vista, methods=["GET"])
+
+    # ---------- por petición ----------
+
+    def _antes(self):
+        g.metricas_inicio = time.perf_counter()
+
+    def _despues(self, respuesta):
+        inicio = g.pop("metricas_inicio", None)
+        if inicio is None or request.endpoint == "metricas":
+            return respuesta
+        duracion = time.perf_counter() - inicio
+        endpoint = request.endpoint or "sin_ruta"
+        status = respuesta.status_code
+
+        evento = EVENTOS.get(endpoint)
+        if evento is not None and respuesta.headers.get("Idempotent-Replayed") == "true":
+            evento = None
+        bucket = next((i for i, limite in enumerate(BUCKETS) if duracion <= limite), len(BUCKETS))
+        clave_hist = ("padel_peticion_segundos", _etiquetas(endpoint=endpoint, metodo=request.method))
+        clave_pet = ("padel_peticiones_total", _etiquetas(endpoint=endpoint, metodo=request.method, status=str(status)))
+
+        with self._lock:
+            self._contadores[clave_pet] = self._contadores.get(clave_pet, 0) + 1
+            hist = self._histogramas.get(clave_hist)
+            if hist is None:
+                hist = self._histogramas[clave_hist] = [0] * (len(BUCKETS) + 2)
+            hist[bucket] += 1
+            hist[-1] += duracion
+            if evento is not None:
+                etiquetas = {"resultado": CLASIFICADORES[evento](status)}
+                if evento == "padel_reservas_total":
+                    etiquetas["endpoint"] = endpoint
+                clave_ev = (evento, _etiquetas(**etiquetas))
+                self._contadores[clave_ev] = self._contadores.get(clave_ev, 0) + 1
+
+        if self.directorio is not None and time.monotonic() - self._ultimo_volcado >= self.volcado:
+            self.volcar()
+        return respuesta
+
+    # ---------- foto del proceso ----------
+
+    def _instantaneas(self):
+        """Pool y cachés: ``(contadores, medidores)`` leídos en este momento."""
+        contadores, medidores = {}, {}
+        app = self._app
+        for nombre, clave in CACHES.items():
+            extension = app.extensions.get(clave)
+            if extension is None or not hasattr(extension, "estadisticas"):
+                continue
+            est = extension.estadisticas()
+            etiquetas = _etiquetas(cache=nombre)
+            contadores[("padel_cache_aciertos_total", etiquetas)] = est.get("hits", 0)
+            contadores[("padel_cache_fallos_total", etiquetas)] = est.get("misses", 0)
+            if "entradas" in est:
+                medidores[("padel_cache_entradas", etiquetas)] = est["entradas"]
+
+        servicio_hash = app.extensions.get("contrasenas")
+        if servicio_hash is not None:
+            medidores[("padel_hash_pendientes", ())] = servicio_hash.estadisticas()["pendientes"]
+
+        with app.app_context():
+            engines = dict(db.engines)
+        for bind, engine in engines.items():
+            pool = engine.pool
+            nombre = bind or "primaria"
+            if hasattr(pool, "checkedout"):
+                en_uso = pool.checkedout()
+                medidores[("padel_bd_pool_conexiones", _etiquetas(engine=nombre, estado="en_uso"))] = en_uso
+                medidores[("padel_bd_pool_conexiones", _etiquetas(engine=nombre, estado="libres"))] = pool.checkedin()
+                medidores[("padel_bd_pool_conexiones", _etiquetas(engine=nombre, estado="desbordadas"))] = max(pool.overflow(), 0)
+                medidores[("padel_bd_pool_tamano", _etiquetas(engine=nombre))] = pool.size()
+        return contadores, medidores
+
+    def foto(self) -> dict:
+        with self._lock:
+            contadores = dict(self._contadores)
+            histogramas = {k: list(v) for k, v in self._histogramas.items()}
+        otros, medidores = self._instantaneas()
+        contadores.update(otros)
+        return {"contadores": contadores, "histogramas": histogramas, "medidores": medidores}
+
+    def volcar(self):
+        """Escribe la foto de este proceso en ``METRICAS_DIR`` (escritura atómica)."""
+        if self.directorio is None:
+            return
+        self._ultimo_volcado = time.monotonic()
+        foto = self.foto()
+        datos = {tipo: [[n, list(e), v] for (n, e), v in valores.items()] for tipo, valores in foto.items()}
+        destino = self.directorio / f"metricas_{os.getpid()}.json"
+        temporal = destino.with_suffix(".tmp")
+        temporal.write_text(json.dumps(datos), encoding="utf-8")
+        os.replace(temporal, destino)
+
+    def _agregada(self) -> dict:
+        if self.directorio is None:
+            return self.foto()
+        self.volcar()
+        total = {"contadores": {}, "histogramas": {}, "medidores": {}}
+        # Un worker que lleva tres volcados sin escribir se da por parado
+        limite = time.time() - max(3 * self.volcado, 30)
+        for fichero in self.directorio.glob("metricas_*.json"):
+            try:
+                datos = json.loads(fichero.read_text(encoding="utf-8"))
+                reciente = fichero.stat().st_mtime >= limite
+            except (OSError, ValueError):
+                continue
+            for nombre, etiquetas, valor in datos.get("contadores", []):
+                clave = (nombre, tuple(map(tuple, etiquetas)))
+                total["contadores"][clave] = total["contadores"].get(clave, 0) + valor
+            for nombre, etiquetas, valores in datos.get("histogramas", []):
+                clave = (nombre, tuple(map(tuple, etiquetas)))
+                actual = total["histogramas"].setdefault(clave, [0] * len(valores))
+                for i, v in enumerate(valores):
+                    actual[i] += v
+            if reciente:
+                for nombre, etiquetas, valor in datos.get("medidores", []):
+                    clave = (nombre, tuple(map(tuple, etiquetas)))
+                    total["medidores"][clave] = total["medidores"].get(clave, 0) + valor
+        return total
+
+    # ---------- exposición ----------
+
+    def texto(self) -> str:
+        foto = self._agregada()
+        por_nombre = {}
+        for tipo in ("contadores", "medidores", "histogramas"):
+            for (nombre, etiquetas), valor in foto[tipo].items():
+                por_nombre.setdefault(nombre, []).append((etiquetas, valor))
+
+        lineas = []
+        for nombre in sorted(por_nombre):
+            tipo, ayuda = DEFINICIONES.get(nombre, ("untyped", ""))
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, valor in sorted(por_nombre[nombre]):
+                if tipo == "histogram":
+                    acumulado = 0
+                    for limite, cuenta in zip(BUCKETS + ("+Inf",), valor[:-1]):
+                        acumulado += cuenta
+                        le = limite if limite == "+Inf" else repr(float(limite))
+                        lineas.append(f"{nombre}_bucket{_formato(etiquetas + (('le', le),))} {acumulado}")
+                    lineas.append(f"{nombre}_sum{_formato(etiquetas)} {valor[-1]:.6f}")
+                    lineas.append(f"{nombre}_count{_formato(etiquetas)} {acumulado}")
+                else:
+                    lineas.append(f"{nombre}{_formato(etiquetas)} {valor}")
+        return "\n".join(lineas) + "\n"
+
+    def vista(self):
+        # Nombres de endpoints, tráfico y tiempos de BD no son públicos
+        token = current_app.config.get("METRICAS_TOKEN")
+        if not token:
+            return {"error": "no encontrado"}, 404
+        recibido = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(recibido.encode(), f"Bearer {token}".encode()):
+            return {"error": "no autorizado"}, 401
+        return Response(self.texto(), content_type=CONTENT_TYPE)
+
+    def limpiar(self) -> int:
+        if self.directorio is None:
+            return 0
+        ficheros = list(self.directorio.glob("metricas_*.json"))
+        for fichero in ficheros:
+            fichero.unlink(missing_ok=True)
+        return len(ficheros)
+
+
+def _formato(etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for clave, valor in etiquetas:
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+metricas = Metricas()
+
+metricas_cli = AppGroup("metricas", help="Mantenimiento de las métricas compartidas entre workers.")
+
+
+@metricas_cli.command("limpiar")
+def limpiar_cmd():
+    """Borra las fotos de METRICAS_DIR (lanzar antes de arrancar los workers)."""
+    n = metricas.limpiar()
+    click.echo(f"OK: {n} ficheros de métricas borrados.")
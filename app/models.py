@@ -1,10 +1,12 @@
 from datetime import datetime
 from .extensions import db
 from sqlalchemy import (
+    DDL,
     CheckConstraint,
     UniqueConstraint,
     ForeignKey,
 )
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 class Rol(db.Model):
     __tablename__ = "roles"
@@ -28,6 +30,14 @@ class Usuario(db.Model):
     email = db.Column(db.String(255), nullable=False, unique=True, index=True)
     password = db.Column(db.String(255), nullable=False)  # almacenar HASH, no texto plano
     foto = db.Column(db.String(500), nullable=True)
+    # {"64": ruta, "256": ruta, "grande": ruta} que genera app/imagenes.py
+    foto_variantes = db.Column(db.JSON, nullable=True)
+    # sha256 de la subida original de la que salen las variantes
+    foto_sha = db.Column(db.String(64), nullable=True, index=True)
+    # Turno de la última subida de foto aún sin procesar (ver app/imagenes.py)
+    foto_pendiente = db.Column(db.String(32), nullable=True)
+    # Se incrementa para invalidar los tokens ya emitidos (p. ej. al cambiar de rol)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     rol_id = db.Column(
         db.Integer,
@@ -103,6 +113,45 @@ class Extra(db.Model):
         return f"<Extra {self.id} {self.nombre}>"
 
 
+class CatalogoVersion(db.Model):
+    """Fila única (id=1) cuya versión sube con cada cambio de pistas, horarios o extras."""
+    __tablename__ = "catalogo_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<CatalogoVersion {self.version}>"
+
+
+# La fila existe siempre: la inserta la migración y, con ``create_all``, esto
+event.listen(
+    CatalogoVersion.__table__, "after_create",
+    DDL("INSERT INTO catalogo_version (id, version) VALUES (1, 0)"),
+)
+
+
+class ClaveIdempotencia(db.Model):
+    """Respuesta guardada de una petición con cabecera ``Idempotency-Key``."""
+    __tablename__ = "claves_idempotencia"
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    clave = db.Column(db.String(255), nullable=False)
+    huella = db.Column(db.String(64), nullable=False)  # sha256 de ruta + cuerpo
+    status = db.Column(db.Integer, nullable=True)      # NULL mientras la petición está en curso
+    respuesta = db.Column(db.Text, nullable=True)
+    creada = db.Column(db.Integer, nullable=False)     # epoch en segundos
+    expira = db.Column(db.Integer, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "clave", name="uq_claves_idempotencia_usuario_clave"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<ClaveIdempotencia {self.usuario_id} {self.clave} status={self.status}>"
+
+
 class Reserva(db.Model):
     __tablename__ = "reservas"
 
@@ -115,15 +164,19 @@ class Reserva(db.Model):
         index=True,
     )
 
+    # Indexada por ix_reservas_pista_fecha
     pista_id = db.Column(
         db.Integer,
         ForeignKey("pistas.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
 
     fecha = db.Column(db.Date, nullable=False, index=True)
 
+    __table_args__ = (
+        db.Index("ix_reservas_pista_fecha", "pista_id", "fecha"),
+    )
+
     # Relaciones
     usuario = relationship("Usuario", back_populates="reservas")
     pista = relationship("Pista", back_populates="reservas")
@@ -144,11 +197,11 @@ class HorarioReserva(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
 
+    # Indexada por uq_horarios_reserva_reserva_horario (reserva_id, horario_id)
     reserva_id = db.Column(
         db.Integer,
         ForeignKey("reservas.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
 
     horario_id = db.Column(
@@ -158,12 +211,21 @@ class HorarioReserva(db.Model):
         index=True,
     )
 
+    # Copia de Reserva.pista_id / Reserva.fecha para poder declarar la
+    # unicidad de cada franja ocupada en la propia BD
+    pista_id = db.Column(db.Integer, nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+
     precio = db.Column(db.Numeric(10, 2), nullable=False)
 
     __table_args__ = (
         CheckConstraint("precio >= 0", name="ck_horarios_reserva_precio_ge_0"),
         # Evita duplicar el mismo horario dentro de la misma reserva
         UniqueConstraint("reserva_id", "horario_id", name="uq_horarios_reserva_reserva_horario"),
+        # Evita que dos reservas ocupen la misma franja de la misma pista el mismo día
+        UniqueConstraint("pista_id", "fecha", "horario_id", name="uq_horarios_reserva_pista_fecha_horario"),
+        # Ocupación de un día o un rango de días sin leer la tabla (índice de disponibilidad)
+        db.Index("ix_horarios_reserva_fecha_pista_horario", "fecha", "pista_id", "horario_id"),
     )
 
     # Relaciones
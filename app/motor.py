@@ -0,0 +1,59 @@
+"""Ajustes del motor de BD.
+
+Con SQLite cada conexión nueva recibe los PRAGMA de ``Config`` (WAL,
+``synchronous``, ``busy_timeout``, caché, mmap y claves foráneas). En modo WAL
+los lectores no bloquean al escritor ni al revés, y ``busy_timeout`` hace que
+un segundo escritor espere su turno en lugar de fallar en el acto con
+"database is locked".
+
+Con PostgreSQL u otros motores con servidor no se ejecuta nada por conexión: el
+pool se configura con ``SQLALCHEMY_ENGINE_OPTIONS`` (ver ``Config``).
+"""
+from sqlalchemy import event
+
+from .extensions import db
+
+
+class AjustesMotor:
+    def init_app(self, app):
+        """Llamar después de ``db.init_app(app)``: necesita el engine ya creado."""
+        app.extensions["motor"] = self
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name != "sqlite":
+            return
+
+        # Se lee app.config al abrir cada conexión, no al registrar el evento,
+        # para que los cambios de config antes de la primera conexión cuenten.
+        @event.listens_for(engine, "connect")
+        def _al_conectar(conexion_dbapi, _registro):
+            if app.config.get("SQLITE_AJUSTES", True):
+                aplicar_pragmas(conexion_dbapi, pragmas_sqlite(app.config))
+
+
+def pragmas_sqlite(config) -> list:
+    """Lista de ``(pragma, valor)`` en el orden en que hay que aplicarlos."""
+    pragmas = [
+        # WAL queda guardado en el fichero; repetirlo en cada conexión no cuesta nada
+        ("journal_mode", config.get("SQLITE_JOURNAL_MODE", "WAL")),
+        ("synchronous", config.get("SQLITE_SYNCHRONOUS", "NORMAL")),
+        ("busy_timeout", int(config.get("SQLITE_BUSY_TIMEOUT_MS", 5000))),
+        # Valor negativo = tamaño en KiB en lugar de en páginas
+        ("cache_size", -int(config.get("SQLITE_CACHE_SIZE_KB", 20000))),
+        ("mmap_size", int(config.get("SQLITE_MMAP_SIZE_MB", 256)) * 1024 * 1024),
+    ]
+    if config.get("SQLITE_FOREIGN_KEYS", True):
+        pragmas.append(("foreign_keys", "ON"))
+    return pragmas
+
+
+def aplicar_pragmas(conexion_dbapi, pragmas):
+    cursor = conexion_dbapi.cursor()
+    try:
+        for nombre, valor in pragmas:
+            cursor.execute(f"PRAGMA {nombre}={valor}")
+    finally:
+        cursor.close()
+
+
+motor = AjustesMotor()
@@ -0,0 +1,77 @@
+"""Autorización a partir de los claims del JWT.
+
+El rol del usuario viaja en el token (claim ``rol``) junto con su versión de
+token (claim ``tv``). Cambiar el rol de un usuario incrementa
+``Usuario.token_version`` y los tokens emitidos antes dejan de valer para
+las rutas protegidas con ``admin_required``. Las versiones se guardan en una
+caché con TTL para no consultar la BD en cada petición.
+"""
+import threading
+import time
+from functools import wraps
+
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
+
+from .extensions import db
+from .models import Usuario
+from .replicas import primaria
+
+ROL_ADMIN = "admin"
+
+
+class CacheVersionesToken:
+    def __init__(self, ttl: int = 60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._versiones = {}  # usuario_id -> (version o None, instante de carga)
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get("TOKEN_VERSION_TTL", self.ttl)
+        app.extensions["versiones_token"] = self
+
+    def get(self, usuario_id: int):
+        """Versión de token vigente del usuario (None si no existe)."""
+        ahora = time.monotonic()
+        entrada = self._versiones.get(usuario_id)
+        if entrada is not None and ahora - entrada[1] <= self.ttl:
+            self.hits += 1
+            return entrada[0]
+        self.misses += 1
+        # La caché la comparten todas las peticiones del proceso: una versión
+        # atrasada de la réplica dejaría pasar tokens revocados durante el TTL
+        with primaria():
+            version = db.session.query(Usuario.token_version).filter(Usuario.id == usuario_id).scalar()
+        with self._lock:
+            self._versiones[usuario_id] = (version, ahora)
+        return version
+
+    def invalidar(self, usuario_id: int):
+        with self._lock:
+            self._versiones.pop(usuario_id, None)
+
+    def estadisticas(self) -> dict:
+        return {"entradas": len(self._versiones), "hits": self.hits, "misses": self.misses}
+
+
+versiones_token = CacheVersionesToken()
+
+
+def claims_usuario(usuario) -> dict:
+    """Claims adicionales para ``create_access_token``."""
+    return {"rol": usuario.rol.nombre if usuario.rol else None, "tv": usuario.token_version}
+
+
+def admin_required(fn):
+    """Como ``jwt_required()`` pero exige además el claim ``rol == "admin"`` vigente."""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        claims = get_jwt()
+        if claims.get("rol") != ROL_ADMIN:
+            return {"error": "acceso denegado: requiere rol de administrador"}, 403
+        if claims.get("tv") != versiones_token.get(int(get_jwt_identity())):
+            return {"error": "token caducado: vuelve a iniciar sesión"}, 401
+        return fn(*args, **kwargs)
+    return wrapper
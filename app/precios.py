@@ -0,0 +1,138 @@
+"""Motor de precios.
+
+Las reglas salen de la tabla ``extras`` según su nombre (sin distinguir
+mayúsculas):
+
+- ``"Fin de semana"``: importe fijo por reserva en sábado o domingo.
+- ``"Festivo"``: importe fijo por reserva en los días de ``FESTIVOS``; si
+  existe, sustituye al de fin de semana en esas fechas.
+- ``"Cubierta"``: suplemento por franja en las pistas cubiertas.
+- ``"Turno <turno>"``: suplemento por franja en ese turno (p. ej.
+  ``"Turno noche"``). Con los sufijos ``" laborable"`` o ``" fin de semana"``
+  solo se aplica esos días.
+
+Al compilar una tarifa se precalcula el precio de cada franja en una tabla
+indexada por (pista, día de la semana, horario), de modo que presupuestar
+una reserva es O(franjas). La tarifa se guarda en la instantánea del
+catálogo, así que se recompila sola cuando el catálogo cambia.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app
+
+from .catalogo import Catalogo, catalogo
+
+DIAS_LABORABLES = frozenset(range(0, 5))
+DIAS_FIN_DE_SEMANA = frozenset((5, 6))
+
+Presupuesto = namedtuple("Presupuesto", "total precio_por_franja precios extras")
+Presupuesto.__doc__ = """Resultado de ``Tarifa.presupuestar``.
+
+``precios`` son pares ``(horario_id, precio)`` en el orden pedido y
+``extras`` los ``ExtraCat`` aplicados una vez por reserva.
+"""
+
+
+def parse_festivos(valor: str) -> frozenset:
+    """Lee una lista ``YYYY-MM-DD`` separada por comas.
+
+    ``create_app`` la llama al arrancar y guarda el resultado en
+    ``FESTIVOS``, así que un valor mal escrito impide arrancar en vez de
+    romper cada presupuesto.
+    """
+    festivos = set()
+    for f in (valor or "").split(","):
+        if not f.strip():
+            continue
+        try:
+            festivos.add(datetime.strptime(f.strip(), "%Y-%m-%d").date())
+        except ValueError:
+            raise ValueError(f"FESTIVOS: {f.strip()!r} no tiene formato YYYY-MM-DD") from None
+    return frozenset(festivos)
+
+
+class Tarifa:
+    def __init__(self, cat: Catalogo, festivos=frozenset()):
+        self.festivos = frozenset(festivos)
+        self.extra_fin_de_semana = cat.extra("fin de semana")
+        self.extra_festivo = cat.extra("festivo")
+        cubierta = cat.extra("cubierta")
+
+        # turno -> lista de (días, importe)
+        suplementos_turno = {}
+        for h in cat.horarios:
+            turno = h.turno.lower()
+            if turno in suplementos_turno:
+                continue
+            reglas = []
+            for sufijo, dias in (
+                ("", DIAS_LABORABLES | DIAS_FIN_DE_SEMANA),
+                (" laborable", DIAS_LABORABLES),
+                (" fin de semana", DIAS_FIN_DE_SEMANA),
+            ):
+                extra = cat.extra(f"turno {turno}{sufijo}")
+                if extra:
+                    reglas.append((dias, extra.precio_extra))
+            suplementos_turno[turno] = reglas
+
+        self.precios_base = {p.id: p.precio_base for p in cat.pistas}
+        self._precios = {}
+        for p in cat.pistas:
+            base = p.precio_base
+            if p.cubierta and cubierta:
+                base += cubierta.precio_extra
+            for h in cat.horarios:
+                reglas = suplementos_turno[h.turno.lower()]
+                for dia in range(7):
+                    precio = base
+                    for dias, importe in reglas:
+                        if dia in dias:
+                            precio += importe
+                    self._precios[(p.id, dia, h.id)] = precio
+
+    def precio_franja(self, pista_id: int, fecha: date, horario_id: int) -> Decimal:
+        return self._precios[(pista_id, fecha.weekday(), horario_id)]
+
+    def extras_reserva(self, fecha: date):
+        """Extras que se cobran una vez por reserva en ``fecha``."""
+        if fecha in self.festivos and self.extra_festivo:
+            return (self.extra_festivo,)
+        if fecha.weekday() in DIAS_FIN_DE_SEMANA and self.extra_fin_de_semana:
+            return (self.extra_fin_de_semana,)
+        return ()
+
+    def presupuestar(self, pista_id: int, fecha: date, horario_ids) -> Presupuesto:
+        """Precio de reservar ``horario_ids`` (sin repetidos) de una pista en una fecha.
+
+        Pista y horarios deben existir en el catálogo del que sale la tarifa.
+        """
+        dia = fecha.weekday()
+        precios = tuple(
+            (hid, self._precios[(pista_id, dia, hid)]) for hid in dict.fromkeys(horario_ids)
+        )
+        extras = self.extras_reserva(fecha)
+        total = sum((p for _, p in precios), Decimal("0.00"))
+        total += sum((e.precio_extra for e in extras), Decimal("0.00"))
+        return Presupuesto(total, self.precios_base[pista_id], precios, extras)
+
+
+def tarifa_vigente(cat: Catalogo = None) -> Tarifa:
+    """Tarifa compilada para ``cat`` o, sin él, para la versión actual del catálogo.
+
+    Las vistas le pasan la instantánea con la que han validado los ids, para
+    que la validación y el precio salgan de la misma versión.
+    """
+    if cat is None:
+        cat = catalogo.get()
+    festivos = current_app.config.get("FESTIVOS") or frozenset()
+    return cat.derivado(("tarifa", festivos), lambda: Tarifa(cat, festivos))
+
+
+def extra_json(extra) -> dict:
+    return {
+        "id": extra.id,
+        "nombre": extra.nombre,
+        "precio_extra": f"{extra.precio_extra:.2f}",
+    }
@@ -0,0 +1,142 @@
+"""Enrutado de lecturas a una réplica de la BD.
+
+Si ``SQLALCHEMY_BINDS`` tiene una entrada ``"replica"`` (ver
+``DATABASE_REPLICA_URL`` en ``Config``), las consultas de las vistas de solo
+lectura van a la réplica y todo lo demás a la primaria:
+
+- Son de solo lectura las peticiones GET/HEAD y las vistas marcadas con
+  ``@solo_lectura`` (p. ej. los POST que solo consultan disponibilidad o
+  precios). ``@en_primaria`` fuerza la primaria en una vista concreta, y el
+  context manager ``primaria()`` en un bloque de código.
+- En cuanto una petición escribe (flush o INSERT/UPDATE/DELETE), el resto de
+  sus consultas van a la primaria.
+- Lectura de lo escrito: durante ``BD_REPLICA_VENTANA`` segundos después de
+  que un usuario escriba, sus lecturas también van a la primaria, para que no
+  vea datos de antes de su propio cambio mientras la réplica se pone al día.
+  La ventana se guarda en memoria en cada proceso.
+
+Sin réplica configurada no cambia nada: ``get_bind`` devuelve la primaria.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+CLAVE_REPLICA = "replica"
+METODOS_LECTURA = frozenset(("GET", "HEAD"))
+
+
+class SesionEnrutada(Session):
+    """``db.session`` que envía a la réplica las lecturas de vistas de solo lectura."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine
+        replica = self._db.engines.get(CLAVE_REPLICA)
+        if replica is not None and enrutador.usar_replica(clause):
+            return replica
+        return engine
+
+
+@event.listens_for(SesionEnrutada, "before_flush")
+def _al_hacer_flush(session, flush_context, instances):
+    if has_request_context():
+        g.bd_escrito = True
+
+
+class EnrutadorReplica:
+    def __init__(self, ventana: int = 5):
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._escrituras = {}  # usuario_id -> instante de su última escritura
+
+    def init_app(self, app):
+        self.ventana = app.config.get("BD_REPLICA_VENTANA", self.ventana)
+        app.extensions["replicas"] = self
+        app.before_request(self._antes)
+        app.teardown_request(self._despues)
+
+    # ---------- por petición ----------
+
+    def _antes(self):
+        vista = current_app.view_functions.get(request.endpoint)
+        marca = getattr(vista, "_bd_lectura", None)
+        g.bd_lectura = request.method in METODOS_LECTURA if marca is None else marca
+        g.bd_escrito = False
+        g.pop("bd_reciente", None)
+
+    def _despues(self, _error=None):
+        if not g.get("bd_escrito"):
+            return
+        usuario_id = _usuario_actual()
+        if usuario_id is None:
+            return
+        ahora = time.monotonic()
+        with self._lock:
+            self._escrituras[usuario_id] = ahora
+            if len(self._escrituras) > 10000:
+                self._escrituras = {
+                    u: t for u, t in self._escrituras.items() if ahora - t <= self.ventana
+                }
+
+    def usar_replica(self, clause=None) -> bool:
+        if not has_request_context():
+            return False
+        if not g.get("bd_lectura") or g.get("bd_primaria") or g.get("bd_escrito"):
+            return False
+        if clause is not None and getattr(clause, "is_dml", False):
+            g.bd_escrito = True
+            return False
+        if "bd_reciente" not in g:
+            usuario_id = _usuario_actual()
+            if usuario_id is None:
+                return True
+            g.bd_reciente = self._escribio_hace_poco(usuario_id)
+        return not g.bd_reciente
+
+    def _escribio_hace_poco(self, usuario_id: int) -> bool:
+        instante = self._escrituras.get(usuario_id)
+        return instante is not None and time.monotonic() - instante <= self.ventana
+
+
+def _usuario_actual():
+    # Antes de que jwt_required() valide el token no hay identidad
+    try:
+        identidad = get_jwt_identity()
+    except RuntimeError:
+        return None
+    return int(identidad) if identidad is not None else None
+
+
+enrutador = EnrutadorReplica()
+
+
+def solo_lectura(fn):
+    """Marca una vista (de cualquier método) como de solo lectura."""
+    fn._bd_lectura = True
+    return fn
+
+
+def en_primaria(fn):
+    """Fuerza que una vista lea de la primaria aunque sea GET."""
+    fn._bd_lectura = False
+    return fn
+
+
+@contextmanager
+def primaria():
+    """Bloque cuyas consultas van siempre a la primaria (cachés compartidas...)."""
+    if not has_request_context():
+        yield
+        return
+    anterior = g.get("bd_primaria", False)
+    g.bd_primaria = True
+    try:
+        yield
+    finally:
+        g.bd_primaria = anterior
@@ -0,0 +1,76 @@
+"""Lectura en streaming de un fichero subido con ``multipart/form-data``.
+
+``request.files`` hace que Werkzeug lea el cuerpo entero (a memoria o a un
+temporal) antes de que la vista pueda mirar nada. ``abrir_fichero`` decodifica
+``request.stream`` según llega y se para en la cabecera del campo pedido; el
+contenido se recorre después en bloques de ``TAMANO_BLOQUE``. Así la vista
+puede rechazar la subida por el tipo declarado o por los primeros bytes sin
+haber leído el resto, y la memoria por subida no pasa de un par de bloques.
+Los campos que van antes del fichero se descartan.
+"""
+from flask import request
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+TAMANO_BLOQUE = 64 * 1024
+MAX_PARTES = 16
+
+
+class SubidaInvalida(Exception):
+    def __init__(self, mensaje: str, status: int = 400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+class FicheroEnStreaming:
+    """Un campo de fichero a medio leer: se itera una sola vez, por bloques."""
+
+    def __init__(self, nombre, filename, content_type, eventos):
+        self.nombre = nombre
+        self.filename = filename
+        self.content_type = content_type
+        self._eventos = eventos
+
+    def __iter__(self):
+        for evento in self._eventos:
+            if not isinstance(evento, Data):
+                raise SubidaInvalida("cuerpo multipart mal formado")
+            if evento.data:
+                yield evento.data
+            if not evento.more_data:
+                return
+
+
+def _eventos(stream, boundary: bytes, tamano_bloque: int):
+    # El buffer del decodificador se vacía tras cada bloque, así que nunca
+    # debería acercarse al límite salvo con cabeceras de parte absurdas
+    decodificador = MultipartDecoder(boundary, max_form_memory_size=2 * tamano_bloque, max_parts=MAX_PARTES)
+    while True:
+        try:
+            evento = decodificador.next_event()
+        except ValueError as e:
+            raise SubidaInvalida("cuerpo multipart mal formado") from e
+        if isinstance(evento, NeedData):
+            if decodificador.complete:
+                raise SubidaInvalida("cuerpo multipart incompleto")
+            bloque = stream.read(tamano_bloque)
+            decodificador.receive_data(bloque or None)
+            continue
+        yield evento
+        if isinstance(evento, Epilogue):
+            return
+
+
+def abrir_fichero(campo: str, tamano_bloque: int = TAMANO_BLOQUE) -> FicheroEnStreaming:
+    """Avanza por la petición actual hasta el fichero ``campo`` sin leer su contenido."""
+    tipo, opciones = parse_options_header(request.headers.get("Content-Type", ""))
+    if tipo != "multipart/form-data" or not opciones.get("boundary"):
+        raise SubidaInvalida("se esperaba multipart/form-data", 415)
+
+    eventos = _eventos(request.stream, opciones["boundary"].encode("latin-1"), tamano_bloque)
+    for evento in eventos:
+        if isinstance(evento, File) and evento.name == campo:
+            content_type = parse_options_header(evento.headers.get("Content-Type", ""))[0] or None
+            return FicheroEnStreaming(campo, evento.filename, content_type, eventos)
+    raise SubidaInvalida(f"no se ha enviado ninguna imagen en '{campo}'")
@@ -0,0 +1,82 @@
+"""Bytes y tiempo de decodificación del avatar: foto original frente a variantes.
+
+Genera una foto sintética del tamaño de una cámara de móvil (``--ancho`` x
+``--alto``, JPEG con EXIF), la pasa por ``ProcesadorImagenes.generar_variantes``
+y compara lo que tendría que descargar y decodificar un cliente para pintar
+el avatar. Necesita Pillow.
+
+    python -m benchmarks.avatares --ancho 4032 --alto 3024
+"""
+import argparse
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def foto_sintetica(ancho: int, alto: int) -> bytes:
+    # Ruido + degradado: comprime como una foto real, no como un color plano
+    ruido = Image.effect_noise((ancho, alto), 40).convert("L")
+    degradado = Image.linear_gradient("L").resize((ancho, alto))
+    imagen = Image.merge("RGB", (ruido, degradado, Image.blend(ruido, degradado, 0.5)))
+    exif = Image.Exif()
+    exif[0x0110] = "Camara de prueba"  # Model
+    exif[0x0112] = 6                   # Orientation: girada 90º
+    salida = io.BytesIO()
+    imagen.save(salida, "JPEG", quality=92, exif=exif)
+    return salida.getvalue()
+
+
+def decodificar(ruta: str, repeticiones: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        with Image.open(ruta) as imagen:
+            imagen.load()
+    return (time.perf_counter() - t0) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ancho", type=int, default=4032)
+    parser.add_argument("--alto", type=int, default=3024)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    if Image is None:
+        raise SystemExit("hace falta Pillow: pip install Pillow")
+
+    from app.imagenes import ProcesadorImagenes
+
+    carpeta = tempfile.mkdtemp()
+    original = os.path.join(carpeta, "original.jpg")
+    with open(original, "wb") as f:
+        f.write(foto_sintetica(args.ancho, args.alto))
+
+    procesador = ProcesadorImagenes()
+    t0 = time.perf_counter()
+    with open(original, "rb") as f:
+        sha = hashlib.sha256(f.read()).hexdigest()
+    variantes = procesador.generar_variantes(original, carpeta, sha)
+    print(f"variantes generadas en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    bytes_original = os.path.getsize(original)
+    ms_original = decodificar(original, args.repeticiones) * 1000
+    print(f"{'original':10} {bytes_original:>10} B  decodificar {ms_original:8.2f} ms")
+    for nombre, relativa in variantes.items():
+        ruta = os.path.join(carpeta, relativa)
+        with Image.open(ruta) as imagen:
+            sin_exif = not imagen.getexif()
+            lado = imagen.size
+        tam = os.path.getsize(ruta)
+        ms = decodificar(ruta, args.repeticiones) * 1000
+        print(f"{nombre:10} {tam:>10} B ({1 - tam / bytes_original:6.1%} menos)  "
+              f"decodificar {ms:8.2f} ms ({1 - ms / ms_original:6.1%} menos)  {lado}  sin EXIF: {sin_exif}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Utilidades compartidas por los scripts de ``benchmarks/``.
+
+Se ejecutan desde la raíz del proyecto, p. ej.::
+
+    python -m benchmarks.concurrencia_reservas
+"""
+import os
+import tempfile
+from pathlib import Path
+
+
+def crear_app_temporal(db_path: str = None, **config):
+    """Crea la app contra una BD SQLite nueva con el catálogo de ``seed_padel``.
+
+    Hay que llamarla antes de importar nada de ``app`` en el script, porque
+    ``Config`` lee ``DATABASE_URL`` al importarse.
+    """
+    if db_path is None:
+        db_path = str(Path(tempfile.mkdtemp()) / "bench.db")
+    os.environ["DATABASE_URL"] = "sqlite:///" + Path(db_path).resolve().as_posix()
+
+    from app import create_app
+    from app.extensions import db
+    import seed_padel
+
+    app = create_app()
+    app.config.update(config)
+    with app.app_context():
+        db.create_all()
+        seed_padel.seed_roles()
+        seed_padel.seed_pistas()
+        seed_padel.seed_horarios()
+        seed_padel.seed_extras()
+        db.session.commit()
+    return app
+
+
+def crear_usuarios(app, n: int, rol: str = "usuario", prefijo: str = "bench"):
+    """Crea ``n`` usuarios y devuelve sus cabeceras ``Authorization``."""
+    from flask_jwt_extended import create_access_token
+    from werkzeug.security import generate_password_hash
+
+    from app.extensions import db
+    from app.models import Rol, Usuario
+    from app.permisos import claims_usuario
+
+    with app.app_context():
+        rol_obj = Rol.query.filter_by(nombre=rol).first()
+        # Hash barato: aquí no se mide el login
+        password = generate_password_hash("bench", method="pbkdf2:sha256:1000")
+        usuarios = [
+            Usuario(
+                nombre=f"{prefijo} {i}",
+                dni=f"{prefijo}-{rol}-{i}",
+                email=f"{prefijo}{i}@{rol}.bench",
+                password=password,
+                rol_id=rol_obj.id,
+            )
+            for i in range(n)
+        ]
+        db.session.add_all(usuarios)
+        db.session.commit()
+        return [
+            {"Authorization": "Bearer " + create_access_token(identity=str(u.id), additional_claims=claims_usuario(u))}
+            for u in usuarios
+        ]
@@ -0,0 +1,67 @@
+"""Comprueba que /api/reservar no permite dobles reservas bajo concurrencia.
+
+Lanza muchos hilos que intentan reservar a la vez la misma franja y verifica
+que exactamente uno obtiene 201, el resto 409, y que en la BD queda una
+sola fila para esa franja. ``tests/test_concurrencia_reservas.py`` ejecuta
+lo mismo a menor escala.
+
+    python -m benchmarks.concurrencia_reservas --hilos 32 --rondas 5
+"""
+import argparse
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+from benchmarks.comun import crear_app_temporal, crear_usuarios
+
+
+def ronda(app, cabeceras, fecha: date):
+    """Todos los hilos reservan a la vez la misma franja.
+
+    Devuelve ``(Counter de status, filas de la franja en la BD)``.
+    """
+    from app.models import HorarioReserva
+
+    cuerpo = {"pista_id": 1, "fecha": fecha.isoformat(), "horario_ids": [1, 2]}
+    barrera = threading.Barrier(len(cabeceras))
+    estados = []
+
+    def reservar(cabecera):
+        cliente = app.test_client()
+        barrera.wait()
+        estados.append(cliente.post("/api/reservar", json=cuerpo, headers=cabecera).status_code)
+
+    hilos = [threading.Thread(target=reservar, args=(c,)) for c in cabeceras]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    with app.app_context():
+        filas = HorarioReserva.query.filter_by(pista_id=1, fecha=fecha).count()
+    return Counter(estados), filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hilos", type=int, default=32)
+    parser.add_argument("--rondas", type=int, default=5)
+    args = parser.parse_args()
+
+    app = crear_app_temporal()
+    cabeceras = crear_usuarios(app, args.hilos)
+
+    fallos = 0
+    for numero in range(args.rondas):
+        resumen, filas = ronda(app, cabeceras, date.today() + timedelta(days=numero + 1))
+        ok = resumen[201] == 1 and resumen[409] == args.hilos - 1 and filas == 2
+        fallos += not ok
+        print(f"ronda {numero + 1}: {dict(resumen)} filas={filas} {'OK' if ok else 'FALLO'}")
+
+    if fallos:
+        raise SystemExit(f"{fallos} rondas con resultado incorrecto")
+    print("OK: ninguna doble reserva.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+"""Latencia, throughput, SQL y bytes de cada ruta de la API.
+
+Arranca ``create_app()`` contra una BD nueva llenada con ``seed_padel`` y lanza
+``--iteraciones`` peticiones a cada ruta de los blueprints auth, api y admin,
+con ``--concurrencia`` hilos a la vez, a través del test client de Flask
+(``--modo cliente``) o de un servidor WSGI real con un hilo por petición
+(``--modo wsgi``, el servidor de Werkzeug en un puerto local).
+
+Para cada escenario informa de p50/p95/p99, throughput, sentencias SQL por
+petición (cabecera ``X-Bench-Sql`` que añade el propio benchmark; en
+respuestas en streaming solo cuenta hasta enviar las cabeceras) y bytes por
+respuesta. ``--salida`` guarda los resultados en JSON con el commit actual y
+``--comparar`` los compara con los de otra ejecución::
+
+    python -m benchmarks.endpoints --iteraciones 200 --salida antes.json
+    python -m benchmarks.endpoints --iteraciones 200 --comparar antes.json
+    python -m benchmarks.endpoints --modo wsgi --concurrencia 8 --solo api/
+"""
+import argparse
+import functools
+import hashlib
+import io
+import itertools
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from benchmarks.comun import crear_app_temporal, crear_usuarios
+
+CABECERA_SQL = "X-Bench-Sql"
+
+
+class Contexto:
+    """Datos que necesitan los escenarios: tokens, ids existentes, fechas libres..."""
+
+    def __init__(self, app, dias: int):
+        self.app = app
+        self.hoy = date.today()
+        # A partir de aquí no hay reservas sembradas: las crean los escenarios
+        self.libre = self.hoy + timedelta(days=dias + 30)
+        self.admin = crear_usuarios(app, 1, rol="admin", prefijo="benchadmin")[0]
+        self.usuarios = []
+        self.usuario_ids = []
+        self.reserva_ids = []
+        self.desechables = {}  # escenario -> ids que puede borrar
+        self.media = None      # ruta de un avatar dentro de UPLOAD_FOLDER
+
+
+def _tokens(app, prefijo: str, n: int):
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy.orm import joinedload
+
+    from app.models import Usuario
+    from app.permisos import claims_usuario
+
+    with app.app_context():
+        usuarios = (
+            Usuario.query.options(joinedload(Usuario.rol))
+            .filter(Usuario.email.like(f"{prefijo}%"))
+            .order_by(Usuario.id).limit(n).all()
+        )
+        return [u.id for u in usuarios], [
+            {"Authorization": "Bearer " + create_access_token(
+                identity=str(u.id), additional_claims=claims_usuario(u))}
+            for u in usuarios
+        ]
+
+
+def preparar(args) -> Contexto:
+    # Sin límite de intentos: el escenario de login repite siempre la misma IP
+    app = crear_app_temporal(UPLOAD_FOLDER=tempfile.mkdtemp(), LIMITES_ACTIVOS=False)
+
+    import seed_padel
+    from app.extensions import db
+    from app.imagenes import _guardar, _ruta_relativa
+    from app.models import Reserva
+
+    with app.app_context():
+        seed_padel.generar_usuarios(args.usuarios, prefijo="bench")
+        seed_padel.generar_reservas(date.today(), args.dias, args.ocupacion, usuarios_prefijo="bench")
+        db.session.commit()
+
+    ctx = Contexto(app, args.dias)
+    ctx.usuario_ids, ctx.usuarios = _tokens(app, "bench", 50)
+    with app.app_context():
+        ctx.reserva_ids = [r for (r,) in db.session.query(Reserva.id).order_by(Reserva.id).limit(1000)]
+    datos = os.urandom(20 * 1024)
+    ctx.media = _guardar(app.config["UPLOAD_FOLDER"], _ruta_relativa(hashlib.sha256(datos).hexdigest(), "256"), datos)
+    return ctx
+
+
+# ==================== PREPARACIÓN DE ESCENARIOS DESTRUCTIVOS ====================
+
+def _reservas_desechables(ctx, n, usuario_id, desde_dia):
+    from sqlalchemy import insert
+
+    from app.extensions import db
+    from app.models import Reserva, HorarioReserva
+
+    inicio = ctx.libre + timedelta(days=desde_dia)
+    with ctx.app.app_context():
+        filas = [{"usuario_id": usuario_id, "pista_id": 1, "fecha": inicio + timedelta(days=i)} for i in range(n)]
+        ids = sorted(db.session.execute(insert(Reserva).returning(Reserva.id), filas).scalars().all())
+        db.session.execute(insert(HorarioReserva), [
+            {"reserva_id": rid, "pista_id": 1, "fecha": f["fecha"], "horario_id": 1, "precio": 12}
+            for rid, f in zip(ids, filas)
+        ])
+        db.session.commit()
+    return ids
+
+
+def _usuarios_desechables(ctx, n, prefijo):
+    import seed_padel
+    from app.extensions import db
+    from app.models import Usuario
+
+    with ctx.app.app_context():
+        seed_padel.generar_usuarios(n, prefijo=prefijo)
+        db.session.commit()
+        return [u for (u,) in db.session.query(Usuario.id).filter(Usuario.email.like(f"{prefijo}%"))]
+
+
+def _catalogo_desechable(ctx, modelo, filas):
+    from sqlalchemy import insert
+
+    from app.catalogo import catalogo
+    from app.extensions import db
+
+    with ctx.app.app_context():
+        ids = sorted(db.session.execute(insert(modelo).returning(modelo.id), filas).scalars().all())
+        catalogo.registrar_cambio()
+        db.session.commit()
+        catalogo.invalidar()
+    return ids
+
+
+def _preparar_destructivos(ctx, n):
+    from app.models import Pista, Horario, Extra
+
+    ctx.desechables["cancelar_reserva"] = _reservas_desechables(ctx, n, ctx.usuario_ids[0], 3000)
+    ctx.desechables["admin_borrar_reserva"] = _reservas_desechables(ctx, n, ctx.usuario_ids[1], 3000 + n)
+    ctx.desechables["admin_borrar_usuario"] = _usuarios_desechables(ctx, n, "benchborrar")
+    ctx.desechables["auth_delete"] = _usuarios_desechables(ctx, n, "benchbaja")
+    ctx.desechables["admin_borrar_pista"] = _catalogo_desechable(ctx, Pista, [
+        {"nombre": f"Bench borrar {i}", "cubierta": False, "plazas": 4, "precio_base": 10} for i in range(n)
+    ])
+    ctx.desechables["admin_borrar_horario"] = _catalogo_desechable(ctx, Horario, [
+        {"franja": f"bench-{i}", "turno": "bench"} for i in range(n)
+    ])
+    ctx.desechables["admin_borrar_extra"] = _catalogo_desechable(ctx, Extra, [
+        {"nombre": f"Bench borrar {i}", "precio_extra": 1} for i in range(n)
+    ])
+
+
+# ==================== ESCENARIOS ====================
+# Cada escenario: (nombre, método, regla de la ruta, petición(ctx, i) ->
+# (ruta, kwargs)). ``i`` es único dentro del escenario, así que las escrituras
+# usan franjas, nombres o ids distintos en cada iteración.
+
+def _u(ctx, i):
+    return ctx.usuarios[i % len(ctx.usuarios)]
+
+
+def _cuerpo_cesta(ctx, i):
+    return {"pista_id": 1 + i % 8, "fecha": (ctx.hoy + timedelta(days=i % 30)).isoformat(), "horario_ids": [1, 2, 3]}
+
+
+@functools.lru_cache(maxsize=1)
+def _png() -> bytes:
+    from PIL import Image
+
+    salida = io.BytesIO()
+    Image.linear_gradient("L").resize((512, 512)).convert("RGB").save(salida, "PNG")
+    return salida.getvalue()
+
+
+def _imagen():
+    return (io.BytesIO(_png()), "foto.png")
+
+
+ESCENARIOS = [
+    ("index", "GET", "/", lambda ctx, i: ("/", {})),
+
+    # ---------- auth ----------
+    ("auth_register", "POST", "/auth/register", lambda ctx, i: ("/auth/register", {"json": {
+        "email": f"nuevo{i}@bench.test", "nombre": f"nuevo {i}", "dni": f"nuevo-{i}", "password": "padel"}})),
+    ("auth_login", "POST", "/auth/login", lambda ctx, i: ("/auth/login", {"json": {
+        "email": f"bench{i % 50}@padel.test", "password": "padel"}})),
+    ("auth_me", "GET", "/auth/me", lambda ctx, i: ("/auth/me", {"headers": _u(ctx, i)})),
+    ("auth_change_password", "POST", "/auth/change_password", lambda ctx, i: ("/auth/change_password", {
+        "headers": ctx.usuarios[-1], "json": {"old_password": "padel", "new_password": "padel"}})),
+    ("auth_update_image_profile", "POST", "/auth/update_image_profile", lambda ctx, i: (
+        "/auth/update_image_profile", {"headers": _u(ctx, i), "data": {"foto": _imagen()}})),
+    ("auth_delete", "POST", "/auth/delete", lambda ctx, i: ("/auth/delete", {"json": {
+        "user_id": ctx.desechables["auth_delete"][i]}})),
+
+    # ---------- api ----------
+    ("api_pistas", "GET", "/api/pistas", lambda ctx, i: ("/api/pistas", {"headers": _u(ctx, i)})),
+    ("api_horarios", "GET", "/api/horarios", lambda ctx, i: ("/api/horarios", {"headers": _u(ctx, i)})),
+    ("api_disponibilidadpista", "POST", "/api/disponibilidadpista", lambda ctx, i: ("/api/disponibilidadpista", {
+        "headers": _u(ctx, i), "json": {"pista_id": 1 + i % 8, "fecha": (ctx.hoy + timedelta(days=i % 30)).isoformat()}})),
+    ("api_disponibilidad", "POST", "/api/disponibilidad", lambda ctx, i: ("/api/disponibilidad", {
+        "headers": _u(ctx, i), "json": {"fecha": (ctx.hoy + timedelta(days=i % 30)).isoformat()}})),
+    ("api_disponibilidad_rango", "POST", "/api/disponibilidad_rango", lambda ctx, i: ("/api/disponibilidad_rango", {
+        "headers": _u(ctx, i), "json": {"fecha_desde": ctx.hoy.isoformat(),
+                                        "fecha_hasta": (ctx.hoy + timedelta(days=13)).isoformat()}})),
+    ("api_calcular_precio", "POST", "/api/calcular_precio", lambda ctx, i: ("/api/calcular_precio", {
+        "headers": _u(ctx, i), "json": _cuerpo_cesta(ctx, i)})),
+    ("api_calcular_precio_lote", "POST", "/api/calcular_precio_lote", lambda ctx, i: ("/api/calcular_precio_lote", {
+        "headers": _u(ctx, i), "json": {"cestas": [_cuerpo_cesta(ctx, i + k) for k in range(20)]}})),
+    ("api_mis_reservas", "GET", "/api/mis_reservas", lambda ctx, i: ("/api/mis_reservas", {"headers": _u(ctx, i)})),
+    ("api_reservar", "POST", "/api/reservar", lambda ctx, i: ("/api/reservar", {
+        "headers": _u(ctx, i), "json": {"pista_id": 1 + i % 8, "fecha": (ctx.libre + timedelta(days=i // 8)).isoformat(),
+                                        "horario_ids": [1, 2]}})),
+    ("api_reservar_lote", "POST", "/api/reservar_lote", lambda ctx, i: ("/api/reservar_lote", {
+        "headers": _u(ctx, i), "json": {"ocurrencias": [
+            {"pista_id": 1 + i % 8, "fecha": (ctx.libre + timedelta(days=1000 + i // 8)).isoformat(),
+             "horario_ids": [2 * k + 1, 2 * k + 2]}
+            for k in range(4)
+        ]}})),
+    ("api_cancelar_reserva", "POST", "/api/cancelar_reserva", lambda ctx, i: ("/api/cancelar_reserva", {
+        "headers": ctx.usuarios[0], "json": {"reserva_id": ctx.desechables["cancelar_reserva"][i]}})),
+
+    # ---------- media ----------
+    ("media", "GET", "/media/<path:filename>", lambda ctx, i: (f"/media/{ctx.media}", {})),
+
+    # ---------- admin ----------
+    ("admin_usuarios", "GET", "/admin/usuarios", lambda ctx, i: ("/admin/usuarios?limit=50", {"headers": ctx.admin})),
+    ("admin_usuario", "GET", "/admin/usuarios/<int:usuario_id>", lambda ctx, i: (
+        f"/admin/usuarios/{ctx.usuario_ids[i % len(ctx.usuario_ids)]}", {"headers": ctx.admin})),
+    ("admin_actualizar_usuario", "PUT", "/admin/usuarios/<int:usuario_id>", lambda ctx, i: (
+        f"/admin/usuarios/{ctx.usuario_ids[-1]}", {"headers": ctx.admin, "json": {"nombre": f"renombrado {i}"}})),
+    ("admin_borrar_usuario", "DELETE", "/admin/usuarios/<int:usuario_id>", lambda ctx, i: (
+        f"/admin/usuarios/{ctx.desechables['admin_borrar_usuario'][i]}", {"headers": ctx.admin})),
+    ("admin_crear_pista", "POST", "/admin/pistas", lambda ctx, i: ("/admin/pistas", {
+        "headers": ctx.admin, "json": {"nombre": f"Bench nueva {i}", "plazas": 4, "precio_base": 10}})),
+    ("admin_actualizar_pista", "PUT", "/admin/pistas/<int:pista_id>", lambda ctx, i: (
+        f"/admin/pistas/{ctx.desechables['admin_borrar_pista'][0]}", {"headers": ctx.admin, "json": {"plazas": 2 + i % 3}})),
+    ("admin_borrar_pista", "DELETE", "/admin/pistas/<int:pista_id>", lambda ctx, i: (
+        f"/admin/pistas/{ctx.desechables['admin_borrar_pista'][i]}", {"headers": ctx.admin})),
+    ("admin_crear_horario", "POST", "/admin/horarios", lambda ctx, i: ("/admin/horarios", {
+        "headers": ctx.admin, "json": {"franja": f"bench-nueva-{i}", "turno": "bench"}})),
+    ("admin_actualizar_horario", "PUT", "/admin/horarios/<int:horario_id>", lambda ctx, i: (
+        f"/admin/horarios/{ctx.desechables['admin_borrar_horario'][0]}", {
+            "headers": ctx.admin, "json": {"turno": f"bench-{i % 2}"}})),
+    ("admin_borrar_horario", "DELETE", "/admin/horarios/<int:horario_id>", lambda ctx, i: (
+        f"/admin/horarios/{ctx.desechables['admin_borrar_horario'][i]}", {"headers": ctx.admin})),
+    ("admin_crear_extra", "POST", "/admin/extras", lambda ctx, i: ("/admin/extras", {
+        "headers": ctx.admin, "json": {"nombre": f"Bench nuevo {i}", "precio_extra": 1}})),
+    ("admin_actualizar_extra", "PUT", "/admin/extras/<int:extra_id>", lambda ctx, i: (
+        f"/admin/extras/{ctx.desechables['admin_borrar_extra'][0]}", {
+            "headers": ctx.admin, "json": {"precio_extra": 1 + i % 5}})),
+    ("admin_borrar_extra", "DELETE", "/admin/extras/<int:extra_id>", lambda ctx, i: (
+        f"/admin/extras/{ctx.desechables['admin_borrar_extra'][i]}", {"headers": ctx.admin})),
+    ("admin_reservas", "GET", "/admin/reservas", lambda ctx, i: ("/admin/reservas?limit=50", {"headers": ctx.admin})),
+    ("admin_reservas_export", "GET", "/admin/reservas/export", lambda ctx, i: (
+        f"/admin/reservas/export?fecha_desde={ctx.hoy}&fecha_hasta={ctx.hoy + timedelta(days=6)}", {"headers": ctx.admin})),
+    ("admin_reserva", "GET", "/admin/reservas/<int:reserva_id>", lambda ctx, i: (
+        f"/admin/reservas/{ctx.reserva_ids[i % len(ctx.reserva_ids)]}", {"headers": ctx.admin})),
+    ("admin_borrar_reserva", "DELETE", "/admin/reservas/<int:reserva_id>", lambda ctx, i: (
+        f"/admin/reservas/{ctx.desechables['admin_borrar_reserva'][i]}", {"headers": ctx.admin})),
+    ("admin_verificar_disponibilidad", "GET", "/admin/disponibilidad/verificar", lambda ctx, i: (
+        f"/admin/disponibilidad/verificar?fecha={ctx.hoy + timedelta(days=i % 30)}", {"headers": ctx.admin})),
+    ("admin_reconstruir_disponibilidad", "POST", "/admin/disponibilidad/reconstruir", lambda ctx, i: (
+        "/admin/disponibilidad/reconstruir", {"headers": ctx.admin})),
+]
+
+
+# ==================== EJECUCIÓN ====================
+
+def instrumentar(app):
+    """Cuenta las sentencias SQL de cada petición y las devuelve en ``X-Bench-Sql``."""
+    from flask import g, has_request_context
+    from sqlalchemy import event
+
+    from app.extensions import db
+
+    def contar(*_):
+        if has_request_context():
+            g.bench_sql = g.get("bench_sql", 0) + 1
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", contar)
+
+    @app.before_request
+    def _inicio():
+        g.bench_sql = 0
+
+    @app.after_request
+    def _fin(respuesta):
+        respuesta.headers[CABECERA_SQL] = str(g.get("bench_sql", 0))
+        return respuesta
+
+
+class ClientePrueba:
+    def __init__(self, app):
+        self.app = app
+
+    def peticion(self, metodo, ruta, kwargs):
+        respuesta = self.app.test_client().open(ruta, method=metodo, **kwargs)
+        cuerpo = respuesta.get_data()
+        return respuesta.status_code, len(cuerpo), int(respuesta.headers.get(CABECERA_SQL, 0))
+
+
+class ClienteWSGI:
+    """Servidor de Werkzeug con un hilo por petición y peticiones HTTP reales."""
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class SinLog(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.servidor = make_server("127.0.0.1", 0, app, threaded=True, request_handler=SinLog)
+        self.base = f"http://127.0.0.1:{self.servidor.server_port}"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def peticion(self, metodo, ruta, kwargs):
+        from werkzeug.test import EnvironBuilder
+
+        # EnvironBuilder codifica json/data/multipart igual que el test client
+        cuerpo = None
+        cabeceras = dict(kwargs.get("headers") or {})
+        if "json" in kwargs or "data" in kwargs:
+            entorno = EnvironBuilder(path=ruta, method=metodo, json=kwargs.get("json"), data=kwargs.get("data"))
+            environ = entorno.get_environ()
+            cuerpo = environ["wsgi.input"].read()
+            cabeceras["Content-Type"] = environ["CONTENT_TYPE"]
+        req = urllib.request.Request(self.base + ruta, data=cuerpo, method=metodo, headers=cabeceras)
+        try:
+            with urllib.request.urlopen(req) as r:
+                datos = r.read()
+                return r.status, len(datos), int(r.headers.get(CABECERA_SQL, 0))
+        except urllib.error.HTTPError as e:
+            datos = e.read()
+            return e.code, len(datos), int(e.headers.get(CABECERA_SQL, 0))
+
+    def cerrar(self):
+        self.servidor.shutdown()
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def medir(cliente, ctx, escenario, iteraciones, calentamiento, concurrencia):
+    nombre, metodo, _, peticion = escenario
+    for i in range(calentamiento):
+        cliente.peticion(metodo, *peticion(ctx, iteraciones + i))
+
+    indices = itertools.count()
+    lock = threading.Lock()
+    tiempos, estados, sqls, bytes_ = [], Counter(), [], []
+
+    def trabajador():
+        while True:
+            i = next(indices)
+            if i >= iteraciones:
+                return
+            ruta, kwargs = peticion(ctx, i)
+            t0 = time.perf_counter()
+            status, tam, n_sql = cliente.peticion(metodo, ruta, kwargs)
+            dt = time.perf_counter() - t0
+            with lock:
+                tiempos.append(dt)
+                estados[status] += 1
+                sqls.append(n_sql)
+                bytes_.append(tam)
+
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    total = time.perf_counter() - t0
+
+    return {
+        "n": len(tiempos),
+        "estados": {str(k): v for k, v in sorted(estados.items())},
+        "p50_ms": round(_percentil(tiempos, 50) * 1000, 3),
+        "p95_ms": round(_percentil(tiempos, 95) * 1000, 3),
+        "p99_ms": round(_percentil(tiempos, 99) * 1000, 3),
+        "rps": round(len(tiempos) / total, 1) if total else 0.0,
+        "sql_por_peticion": round(sum(sqls) / len(sqls), 2) if sqls else 0.0,
+        "bytes_por_respuesta": round(sum(bytes_) / len(bytes_)) if bytes_ else 0,
+    }
+
+
+def rutas_sin_escenario(app):
+    cubiertas = {(m, regla) for _, m, regla, _ in ESCENARIOS}
+    return sorted(
+        f"{m} {r.rule}"
+        for r in app.url_map.iter_rules() if r.endpoint != "static"
+        for m in r.methods - {"HEAD", "OPTIONS"}
+        if (m, r.rule) not in cubiertas
+    )
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(resultados, parametros, base):
+    print(f"\ncomparación con {base.get('commit')} ({base.get('fecha')}):")
+    antes, ahora = base.get("parametros", {}), parametros
+    distintos = [k for k in ("modo", "concurrencia", "usuarios", "dias", "ocupacion") if antes.get(k) != ahora.get(k)]
+    if distintos:
+        print("  AVISO: parámetros distintos (" + ", ".join(f"{k} {antes.get(k)}->{ahora.get(k)}" for k in distintos)
+              + "), los tiempos no son comparables")
+    for nombre, r in resultados.items():
+        antes = base["resultados"].get(nombre)
+        if not antes:
+            continue
+        cambios = []
+        for campo in ("p50_ms", "p95_ms", "sql_por_peticion", "bytes_por_respuesta"):
+            a, d = antes[campo], r[campo]
+            if a:
+                cambios.append(f"{campo} {a}->{d} ({(d - a) / a * 100:+.0f}%)")
+            elif d:
+                cambios.append(f"{campo} {a}->{d}")
+        print(f"  {nombre:34} " + "  ".join(cambios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modo", choices=("cliente", "wsgi"), default="cliente")
+    parser.add_argument("--iteraciones", type=int, default=100)
+    parser.add_argument("--calentamiento", type=int, default=5)
+    parser.add_argument("--concurrencia", type=int, default=1)
+    parser.add_argument("--solo", help="solo los escenarios cuyo nombre contenga este texto (api_, admin_...)")
+    parser.add_argument("--usuarios", type=int, default=500, help="usuarios sembrados")
+    parser.add_argument("--dias", type=int, default=90, help="días de reservas sembradas desde hoy")
+    parser.add_argument("--ocupacion", type=float, default=0.5)
+    parser.add_argument("--salida", help="fichero JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con el que comparar")
+    args = parser.parse_args()
+
+    ctx = preparar(args)
+    _preparar_destructivos(ctx, args.iteraciones + args.calentamiento)
+    instrumentar(ctx.app)
+
+    faltan = rutas_sin_escenario(ctx.app)
+    if faltan:
+        print("AVISO: rutas sin escenario: " + ", ".join(faltan))
+
+    escenarios = [e for e in ESCENARIOS if not args.solo or args.solo.replace("/", "_") in e[0]]
+    cliente = ClienteWSGI(ctx.app) if args.modo == "wsgi" else ClientePrueba(ctx.app)
+
+    resultados = {}
+    print(f"{'escenario':34} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>8} {'sql':>6} {'bytes':>8}  estados")
+    try:
+        for escenario in escenarios:
+            r = medir(cliente, ctx, escenario, args.iteraciones, args.calentamiento, args.concurrencia)
+            resultados[escenario[0]] = r
+            print(f"{escenario[0]:34} {r['n']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} "
+                  f"{r['rps']:>8} {r['sql_por_peticion']:>6} {r['bytes_por_respuesta']:>8}  {r['estados']}")
+    finally:
+        if isinstance(cliente, ClienteWSGI):
+            cliente.cerrar()
+
+    informe = {
+        "commit": _commit(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "parametros": vars(args),
+        "resultados": resultados,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\nresultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultados, vars(args), json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Logins por segundo y por núcleo con el hash en el hilo y en el pool de procesos.
+
+Durante ``--segundos`` segundos, ``--logins`` hilos hacen login sin parar
+mientras ``--lectores`` hilos piden /api/mis_reservas, para ver cuánto
+frena una racha de logins al resto de peticiones. Cada perfil corre en un
+proceso aparte con su ``HASH_PROCESOS`` (0 = hash en el hilo de la petición,
+como antes) y el ``HASH_METODO`` que se pase. Las contraseñas se guardan ya
+con ese método, así que no hay rehash durante la medida.
+
+    python -m benchmarks.hash_login --procesos 0 1 2 4 --logins 16 --lectores 4
+    python -m benchmarks.hash_login --metodo pbkdf2:sha256:600000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.comun import crear_app_temporal, crear_usuarios
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def medir(logins: int, lectores: int, segundos: float) -> dict:
+    app = crear_app_temporal(LIMITES_ACTIVOS=False)
+    cabeceras = crear_usuarios(app, lectores)
+
+    from sqlalchemy import insert
+
+    from app.contrasenas import contrasenas
+    from app.extensions import db
+    from app.models import Rol, Usuario
+
+    with app.app_context():
+        password = contrasenas.generar("padel")
+        rol_id = db.session.query(Rol.id).filter_by(nombre="usuario").scalar()
+        db.session.execute(insert(Usuario), [
+            {"nombre": f"login {i}", "dni": f"login-{i}", "email": f"login{i}@bench.test",
+             "password": password, "rol_id": rol_id}
+            for i in range(logins)
+        ])
+        db.session.commit()
+
+    resultados = {"login": [], "lectura": []}
+    fallos = {"login": 0, "lectura": 0}
+    lock = threading.Lock()
+    barrera = threading.Barrier(logins + lectores)
+    fin = []
+
+    def bucle(tipo, peticion):
+        cliente = app.test_client()
+        barrera.wait()
+        while not fin:
+            t0 = time.perf_counter()
+            try:
+                ok = peticion(cliente)
+            except Exception:
+                ok = False
+            with lock:
+                resultados[tipo].append(time.perf_counter() - t0)
+                fallos[tipo] += not ok
+
+    def login(i):
+        cuerpo = {"email": f"login{i}@bench.test", "password": "padel"}
+        return lambda cliente: cliente.post("/auth/login", json=cuerpo).status_code == 200
+
+    def lector(cabecera):
+        return lambda cliente: cliente.get("/api/mis_reservas", headers=cabecera).status_code == 200
+
+    hilos = [threading.Thread(target=bucle, args=("login", login(i))) for i in range(logins)]
+    hilos += [threading.Thread(target=bucle, args=("lectura", lector(c))) for c in cabeceras]
+    for h in hilos:
+        h.start()
+    time.sleep(segundos)
+    fin.append(True)
+    for h in hilos:
+        h.join()
+    contrasenas.cerrar()
+
+    informe = {"procesos": contrasenas.procesos, "metodo": contrasenas.metodo}
+    for tipo, tiempos in resultados.items():
+        informe[tipo] = {
+            "ops_s": round(len(tiempos) / segundos, 1),
+            "p50_ms": round(_percentil(tiempos, 50) * 1000, 2),
+            "p95_ms": round(_percentil(tiempos, 95) * 1000, 2),
+            "fallos": fallos[tipo],
+        }
+    return informe
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procesos", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--metodo", default="scrypt", help="HASH_METODO (método de Werkzeug con su coste)")
+    parser.add_argument("--logins", type=int, default=8, help="hilos haciendo login")
+    parser.add_argument("--lectores", type=int, default=4, help="hilos pidiendo /api/mis_reservas")
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--medir", action="store_true", help="medir un solo perfil (uso interno)")
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.logins, args.lectores, args.segundos)))
+        return
+
+    nucleos = os.cpu_count() or 1
+    print(f"{nucleos} núcleos, logins={args.logins} lectores={args.lectores}")
+    for procesos in args.procesos:
+        entorno = dict(os.environ, HASH_PROCESOS=str(procesos), HASH_METODO=args.metodo)
+        salida = subprocess.run(
+            [sys.executable, "-m", "benchmarks.hash_login", "--medir",
+             "--logins", str(args.logins), "--lectores", str(args.lectores), "--segundos", str(args.segundos)],
+            check=True, capture_output=True, text=True, env=entorno,
+        ).stdout
+        informe = json.loads(salida.strip().splitlines()[-1])
+        # Con pool, los núcleos que puede usar el hash son los del pool
+        usados = min(procesos, nucleos) if procesos else 1
+        login = informe["login"]
+        print(f"HASH_PROCESOS={procesos} ({informe['metodo']})")
+        print(f"  login     {login['ops_s']:>8} ops/s  {login['ops_s'] / usados:>8.1f} ops/s/núcleo  "
+              f"p50 {login['p50_ms']:>8} ms  p95 {login['p95_ms']:>8} ms  fallos {login['fallos']}")
+        r = informe["lectura"]
+        print(f"  lectura   {r['ops_s']:>8} ops/s  {'':>21}  p50 {r['p50_ms']:>8} ms  "
+              f"p95 {r['p95_ms']:>8} ms  fallos {r['fallos']}")
+
+
+if __name__ == "__main__":
+    main()
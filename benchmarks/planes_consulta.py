@@ -0,0 +1,171 @@
+"""Comprueba que las consultas calientes usan índices y no recorren tablas enteras.
+
+Llena una BD SQLite nueva con ``seed_padel.generar_reservas`` (``--dias`` días
+al ``--ocupacion`` de ocupación), ejecuta el código real de cada consulta
+caliente (índice de disponibilidad, comprobación de franjas, listados,
+exportación...) capturando el SQL que emite y pide su plan con ``EXPLAIN
+QUERY PLAN``. Falla si alguna recorre entera una de las tablas
+grandes. ``plan()`` y ``recorridos_completos()`` entienden también el
+``EXPLAIN`` de PostgreSQL ("Seq Scan on ...").
+``tests/test_planes_consulta.py`` lo ejecuta sobre un conjunto pequeño.
+
+    python -m benchmarks.planes_consulta --dias 365 --ocupacion 0.3
+    python -m benchmarks.planes_consulta --verbose     # imprime los planes
+"""
+import argparse
+import re
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from benchmarks.comun import crear_app_temporal
+
+# Tablas que crecen con el uso; las del catálogo son pequeñas y recorrerlas es normal
+TABLAS_GRANDES = {"usuarios", "reservas", "horarios_reserva", "claves_idempotencia"}
+
+FECHA_BASE = date(2030, 1, 1)
+
+
+def poblar(app, dias: int, ocupacion: float, n_usuarios: int = 200):
+    import seed_padel
+    from app.extensions import db
+
+    with app.app_context():
+        seed_padel.generar_usuarios(n_usuarios, prefijo="plan")
+        seed_padel.generar_reservas(FECHA_BASE, dias, ocupacion, usuarios_prefijo="plan")
+        db.session.commit()
+
+
+@contextmanager
+def capturar(engine):
+    """Guarda ``(sql, parámetros)`` de cada sentencia ejecutada en ``engine``."""
+    from sqlalchemy import event
+
+    sentencias = []
+
+    def antes(conn, cursor, sql, params, context, executemany):
+        if not executemany:
+            sentencias.append((sql, params))
+
+    event.listen(engine, "before_cursor_execute", antes)
+    try:
+        yield sentencias
+    finally:
+        event.remove(engine, "before_cursor_execute", antes)
+
+
+def plan(conexion, sql, params):
+    """Filas del plan de ``sql`` como texto."""
+    if conexion.dialect.name == "sqlite":
+        return [fila[-1] for fila in conexion.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params)]
+    return [fila[0] for fila in conexion.exec_driver_sql("EXPLAIN " + sql, params)]
+
+
+def recorridos_completos(dialecto: str, lineas) -> list:
+    """Tablas grandes que el plan recorre enteras."""
+    tablas = []
+    for linea in lineas:
+        if dialecto == "sqlite":
+            # SCAN recorre la tabla (o un índice) entero, aunque sea "USING
+            # COVERING INDEX"; las búsquedas por índice salen como SEARCH
+            m = re.match(r"\s*SCAN (\w+)", linea)
+            if m:
+                tablas.append(m.group(1))
+        else:
+            m = re.search(r"Seq Scan on (\w+)", linea)
+            if m:
+                tablas.append(m.group(1))
+    # Los alias anónimos de SQLAlchemy llevan sufijo numérico (reservas_1)
+    return [t for t in tablas if re.sub(r"_\d+$", "", t) in TABLAS_GRANDES]
+
+
+def consultas_calientes(usuario_id: int):
+    """``(nombre, función)`` de cada camino caliente; se ejecutan dentro de una petición."""
+    from werkzeug.datastructures import MultiDict
+
+    from app import api
+    from app.consultas import iterar_reservas_export, pagina_reservas, pagina_usuarios, reservas_con_detalle
+    from app.disponibilidad import disponibilidad
+    from app.models import Reserva
+
+    dia = FECHA_BASE + timedelta(days=40)
+
+    def indice_dia():
+        disponibilidad.invalidar()
+        disponibilidad.disponibles_por_pista(dia)
+
+    def indice_rango():
+        disponibilidad.invalidar()
+        disponibilidad.ocupacion_rango(dia, dia + timedelta(days=13))
+
+    return [
+        ("índice de disponibilidad (un día)", indice_dia),
+        ("índice de disponibilidad (rango)", indice_rango),
+        ("verificar índice", lambda: disponibilidad.verificar(dia)),
+        ("reservar: franjas ocupadas", lambda: api._horarios_ocupados(1, dia, [1, 2, 3])),
+        ("reservar_lote: conflictos", lambda: api._conflictos_lote(
+            [(i, 1, dia + timedelta(days=7 * i), [1, 2]) for i in range(8)]
+        )),
+        ("mis_reservas", lambda: reservas_con_detalle().filter(Reserva.usuario_id == usuario_id).all()),
+        ("admin reservas por pista y fechas", lambda: pagina_reservas(MultiDict({
+            "pista_id": "1", "fecha_desde": dia.isoformat(),
+            "fecha_hasta": (dia + timedelta(days=6)).isoformat(),
+        }))),
+        ("admin reservas por usuario", lambda: pagina_reservas(MultiDict({"usuario_id": str(usuario_id)}))),
+        ("admin usuarios por email", lambda: pagina_usuarios(MultiDict({"email": "plan1"}))),
+        ("exportación por fechas", lambda: next(iterar_reservas_export(dia, dia + timedelta(days=6)), None)),
+        ("reconstruir índice", lambda: disponibilidad.reconstruir(dia + timedelta(days=300))),
+    ]
+
+
+def comprobar(app, verbose: bool = False):
+    """``(nombre, malas)`` de cada consulta caliente; ``malas`` son las
+    ``(sql, plan, tablas recorridas)`` que recorren tablas grandes enteras."""
+    from app.extensions import db
+    from app.models import Usuario
+
+    resultados = []
+    with app.test_request_context():
+        usuario_id = db.session.query(Usuario.id).filter(Usuario.email.like("plan%")).first()[0]
+        conexion = db.session.connection()
+        dialecto = conexion.dialect.name
+        for nombre, funcion in consultas_calientes(usuario_id):
+            with capturar(db.engine) as sentencias:
+                funcion()
+            malas = []
+            for sql, params in sentencias:
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                lineas = plan(conexion, sql, params)
+                recorridos = recorridos_completos(dialecto, lineas)
+                if recorridos:
+                    malas.append((sql, lineas, recorridos))
+                if verbose:
+                    print(f"--- {nombre}\n{sql}\n  " + "\n  ".join(lineas))
+            resultados.append((nombre, malas))
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--ocupacion", type=float, default=0.3)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    app = crear_app_temporal()
+    poblar(app, args.dias, args.ocupacion)
+
+    fallos = 0
+    for nombre, malas in comprobar(app, verbose=args.verbose):
+        fallos += bool(malas)
+        print(f"{'FALLO' if malas else 'OK   '} {nombre}")
+        for sql, lineas, recorridos in malas:
+            print(f"      recorre {', '.join(recorridos)}:\n      {sql}\n        " + "\n        ".join(lineas))
+
+    if fallos:
+        raise SystemExit(f"{fallos} consultas recorren tablas enteras")
+    print("OK: todas las consultas calientes usan índices.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Concurrencia de lecturas y escrituras en SQLite con y sin los ajustes de app/motor.py.
+
+Durante ``--segundos`` segundos, ``--lectores`` hilos piden /api/mis_reservas
+y ``--escritores`` hilos reservan franjas distintas con /api/reservar. Se
+repite con ``SQLITE_AJUSTES=0`` (journal DELETE y PRAGMA por defecto, como
+antes) y con los ajustes activos (WAL, synchronous=NORMAL, busy_timeout...).
+Cada perfil corre en un proceso aparte sobre una BD nueva.
+
+    python -m benchmarks.sqlite_concurrencia --lectores 8 --escritores 4 --segundos 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.comun import crear_app_temporal, crear_usuarios
+
+PERFILES = {
+    "antes": {"SQLITE_AJUSTES": False},
+    "despues": {"SQLITE_AJUSTES": True},
+}
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def medir(perfil: str, lectores: int, escritores: int, segundos: float) -> dict:
+    app = crear_app_temporal(**PERFILES[perfil])
+    cabeceras = crear_usuarios(app, lectores + escritores)
+
+    from app.extensions import db
+    with app.app_context():
+        journal = db.session.execute(db.text("PRAGMA journal_mode")).scalar()
+
+    resultados = {"lectura": [], "escritura": []}
+    fallos = {"lectura": 0, "escritura": 0}
+    lock = threading.Lock()
+    barrera = threading.Barrier(lectores + escritores)
+    fin = []
+
+    def lector(cabecera):
+        cliente = app.test_client()
+        barrera.wait()
+        while not fin:
+            t0 = time.perf_counter()
+            try:
+                ok = cliente.get("/api/mis_reservas", headers=cabecera).status_code == 200
+            except Exception:
+                ok = False
+            with lock:
+                resultados["lectura"].append(time.perf_counter() - t0)
+                fallos["lectura"] += not ok
+
+    def escritor(n, cabecera):
+        cliente = app.test_client()
+        barrera.wait()
+        i = 0
+        while not fin:
+            # Cada escritor usa sus propias fechas: los 409 no cuentan aquí
+            fecha = (date.today() + timedelta(days=1 + n * 10000 + i // 30)).isoformat()
+            cuerpo = {"pista_id": 1, "fecha": fecha, "horario_ids": [1 + i % 30]}
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                ok = cliente.post("/api/reservar", json=cuerpo, headers=cabecera).status_code == 201
+            except Exception:
+                ok = False
+            with lock:
+                resultados["escritura"].append(time.perf_counter() - t0)
+                fallos["escritura"] += not ok
+
+    hilos = [threading.Thread(target=lector, args=(c,)) for c in cabeceras[:lectores]]
+    hilos += [
+        threading.Thread(target=escritor, args=(n, c))
+        for n, c in enumerate(cabeceras[lectores:])
+    ]
+    for h in hilos:
+        h.start()
+    time.sleep(segundos)
+    fin.append(True)
+    for h in hilos:
+        h.join()
+
+    informe = {"perfil": perfil, "journal_mode": journal}
+    for tipo, tiempos in resultados.items():
+        informe[tipo] = {
+            "ops_s": round(len(tiempos) / segundos, 1),
+            "p50_ms": round(_percentil(tiempos, 50) * 1000, 2),
+            "p95_ms": round(_percentil(tiempos, 95) * 1000, 2),
+            "fallos": fallos[tipo],
+        }
+    return informe
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lectores", type=int, default=8)
+    parser.add_argument("--escritores", type=int, default=4)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--perfil", choices=sorted(PERFILES), help="medir solo este perfil (uso interno)")
+    args = parser.parse_args()
+
+    if args.perfil:
+        print(json.dumps(medir(args.perfil, args.lectores, args.escritores, args.segundos)))
+        return
+
+    for perfil in ("antes", "despues"):
+        salida = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_concurrencia", "--perfil", perfil,
+             "--lectores", str(args.lectores), "--escritores", str(args.escritores),
+             "--segundos", str(args.segundos)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        informe = json.loads(salida.strip().splitlines()[-1])
+        print(f"{perfil} (journal_mode={informe['journal_mode']})")
+        for tipo in ("lectura", "escritura"):
+            r = informe[tipo]
+            print(f"  {tipo:9} {r['ops_s']:>8} ops/s  p50 {r['p50_ms']:>8} ms  "
+                  f"p95 {r['p95_ms']:>8} ms  fallos {r['fallos']}")
+
+
+if __name__ == "__main__":
+    main()
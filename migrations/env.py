@@ -97,6 +97,13 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            # app/motor.py activa foreign_keys en cada conexión, pero las
+            # migraciones batch recrean tablas (DROP + rename) y con las claves
+            # foráneas activas el DROP dispararía los ON DELETE CASCADE.
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
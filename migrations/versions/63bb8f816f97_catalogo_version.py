@@ -0,0 +1,29 @@
+"""tabla catalogo_version
+
+Revision ID: 63bb8f816f97
+Revises: 7c7a39c181ab
+Create Date: 2026-10-16 11:03:27.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '63bb8f816f97'
+down_revision = '7c7a39c181ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalogo_version = op.create_table('catalogo_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(catalogo_version, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('catalogo_version')
@@ -0,0 +1,26 @@
+"""token_version en usuarios
+
+Revision ID: 7c7a39c181ab
+Revises: 61416d988382
+Create Date: 2026-10-16 10:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c7a39c181ab'
+down_revision = '61416d988382'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
@@ -0,0 +1,26 @@
+"""foto_pendiente en usuarios
+
+Revision ID: a7d2e5c91f30
+Revises: f4a9c2d17b83
+Create Date: 2026-10-17 21:05:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d2e5c91f30'
+down_revision = 'f4a9c2d17b83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('foto_pendiente', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_column('foto_pendiente')
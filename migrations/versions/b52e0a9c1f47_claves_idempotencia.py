@@ -0,0 +1,40 @@
+"""tabla claves_idempotencia
+
+Revision ID: b52e0a9c1f47
+Revises: d3c31cc33b84
+Create Date: 2026-10-17 12:20:08.415903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b52e0a9c1f47'
+down_revision = 'd3c31cc33b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('claves_idempotencia',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('clave', sa.String(length=255), nullable=False),
+    sa.Column('huella', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.Integer(), nullable=True),
+    sa.Column('respuesta', sa.Text(), nullable=True),
+    sa.Column('creada', sa.Integer(), nullable=False),
+    sa.Column('expira', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('usuario_id', 'clave', name='uq_claves_idempotencia_usuario_clave')
+    )
+    with op.batch_alter_table('claves_idempotencia', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_claves_idempotencia_expira'), ['expira'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('claves_idempotencia', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_claves_idempotencia_expira'))
+
+    op.drop_table('claves_idempotencia')
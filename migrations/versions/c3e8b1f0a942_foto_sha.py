@@ -0,0 +1,28 @@
+"""foto_sha en usuarios
+
+Revision ID: c3e8b1f0a942
+Revises: a7d2e5c91f30
+Create Date: 2026-10-17 21:48:09.551632
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8b1f0a942'
+down_revision = 'a7d2e5c91f30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('foto_sha', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_usuarios_foto_sha'), ['foto_sha'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_usuarios_foto_sha'))
+        batch_op.drop_column('foto_sha')
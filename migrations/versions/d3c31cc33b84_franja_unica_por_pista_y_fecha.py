@@ -0,0 +1,45 @@
+"""franja única por pista y fecha en horarios_reserva
+
+Revision ID: d3c31cc33b84
+Revises: 63bb8f816f97
+Create Date: 2026-10-17 09:41:55.120734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3c31cc33b84'
+down_revision = '63bb8f816f97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('horarios_reserva', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pista_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('fecha', sa.Date(), nullable=True))
+
+    # Franjas de reservas ya borradas (SQLite no aplicaba el ON DELETE CASCADE)
+    op.execute("DELETE FROM horarios_reserva WHERE reserva_id NOT IN (SELECT id FROM reservas)")
+
+    # Rellenar desde la reserva; si ya hubiera dobles reservas la restricción
+    # de abajo fallará y habrá que resolverlas a mano antes de migrar.
+    op.execute(
+        "UPDATE horarios_reserva SET "
+        "pista_id = (SELECT reservas.pista_id FROM reservas WHERE reservas.id = horarios_reserva.reserva_id), "
+        "fecha = (SELECT reservas.fecha FROM reservas WHERE reservas.id = horarios_reserva.reserva_id)"
+    )
+
+    with op.batch_alter_table('horarios_reserva', schema=None) as batch_op:
+        batch_op.alter_column('pista_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('fecha', existing_type=sa.Date(), nullable=False)
+        batch_op.create_unique_constraint('uq_horarios_reserva_pista_fecha_horario', ['pista_id', 'fecha', 'horario_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('horarios_reserva', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_horarios_reserva_pista_fecha_horario', type_='unique')
+        batch_op.drop_column('fecha')
+        batch_op.drop_column('pista_id')
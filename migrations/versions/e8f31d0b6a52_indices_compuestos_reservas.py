@@ -0,0 +1,38 @@
+"""índices compuestos en reservas y horarios_reserva
+
+Revision ID: e8f31d0b6a52
+Revises: b52e0a9c1f47
+Create Date: 2026-10-17 15:02:44.381276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8f31d0b6a52'
+down_revision = 'b52e0a9c1f47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ix_reservas_pista_id e ix_horarios_reserva_reserva_id son prefijos de
+    # ix_reservas_pista_fecha y uq_horarios_reserva_reserva_horario: sobran.
+    with op.batch_alter_table('reservas', schema=None) as batch_op:
+        batch_op.create_index('ix_reservas_pista_fecha', ['pista_id', 'fecha'], unique=False)
+        batch_op.drop_index('ix_reservas_pista_id')
+
+    with op.batch_alter_table('horarios_reserva', schema=None) as batch_op:
+        batch_op.create_index('ix_horarios_reserva_fecha_pista_horario', ['fecha', 'pista_id', 'horario_id'], unique=False)
+        batch_op.drop_index('ix_horarios_reserva_reserva_id')
+
+
+def downgrade():
+    with op.batch_alter_table('horarios_reserva', schema=None) as batch_op:
+        batch_op.create_index('ix_horarios_reserva_reserva_id', ['reserva_id'], unique=False)
+        batch_op.drop_index('ix_horarios_reserva_fecha_pista_horario')
+
+    with op.batch_alter_table('reservas', schema=None) as batch_op:
+        batch_op.create_index('ix_reservas_pista_id', ['pista_id'], unique=False)
+        batch_op.drop_index('ix_reservas_pista_fecha')
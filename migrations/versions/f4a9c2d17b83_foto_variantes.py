@@ -0,0 +1,26 @@
+"""foto_variantes en usuarios
+
+Revision ID: f4a9c2d17b83
+Revises: e8f31d0b6a52
+Create Date: 2026-10-17 18:40:12.904517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a9c2d17b83'
+down_revision = 'e8f31d0b6a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('foto_variantes', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_column('foto_variantes')
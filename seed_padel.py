@@ -1,9 +1,26 @@
-from datetime import datetime, timedelta
+"""Datos iniciales y generador de datos sintéticos.
+
+Sin argumentos carga el catálogo base (8 pistas, la rejilla de horarios de 30
+minutos, el extra de fin de semana y los roles). Con argumentos genera además
+clubs, usuarios y reservas a escala de producción, p. ej.::
+
+    python seed_padel.py --clubs 20 --pistas-por-club 8 --anios 2 --ocupacion 0.6 --usuarios 20000
+
+Todo se inserta en bloque con ``session.execute(insert(...), filas)`` y con una
+semilla fija (``--semilla``) para que dos ejecuciones den los mismos datos.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+
 from app import create_app                  # si create_app está en app/__init__.py
 from app.extensions import db
-from app.models import Pista, Horario, Extra,Rol 
+from app.models import Pista, Horario, Extra, Rol, Usuario, Reserva, HorarioReserva
 
 
 def get_turno(hh_mm: str) -> str:
@@ -15,6 +32,16 @@ def get_turno(hh_mm: str) -> str:
     return "noche"
 
 
+def _insertar_nuevas(modelo, filas, *claves):
+    """Inserta de una vez las filas cuyas ``claves`` aún no existen en la tabla."""
+    columnas = [getattr(modelo, c) for c in claves]
+    existentes = set(db.session.query(*columnas).all())
+    nuevas = [f for f in filas if tuple(f[c] for c in claves) not in existentes]
+    if nuevas:
+        db.session.execute(insert(modelo), nuevas)
+    return len(nuevas)
+
+
 def seed_pistas():
     pistas = [
         {"nombre": "Pista 1", "cubierta": False, "plazas": 4, "precio_base": Decimal("12.00")},
@@ -26,48 +53,205 @@ def seed_pistas():
         {"nombre": "Pista 7", "cubierta": True,  "plazas": 4, "precio_base": Decimal("12.00")},
         {"nombre": "Pista 8", "cubierta": True,  "plazas": 2, "precio_base": Decimal("6.00")},
     ]
-    for p in pistas:
-        if not Pista.query.filter_by(nombre=p["nombre"]).first():
-            db.session.add(Pista(**p))
+    _insertar_nuevas(Pista, pistas, "nombre")
 
 
 def seed_horarios():
     start = datetime.strptime("08:00", "%H:%M")
     end = datetime.strptime("23:00", "%H:%M")
 
+    horarios = []
     t = start
     while t < end:
         t2 = t + timedelta(minutes=30)
         franja = f"{t.strftime('%H:%M')}-{t2.strftime('%H:%M')}"
-        turno = get_turno(t.strftime("%H:%M"))
-
-        if not Horario.query.filter_by(franja=franja, turno=turno).first():
-            db.session.add(Horario(franja=franja, turno=turno))
-
+        horarios.append({"franja": franja, "turno": get_turno(t.strftime("%H:%M"))})
         t = t2
 
+    _insertar_nuevas(Horario, horarios, "franja", "turno")
+
 
 def seed_extras():
-    if not Extra.query.filter_by(nombre="Fin de semana").first():
-        db.session.add(Extra(nombre="Fin de semana", precio_extra=Decimal("3.00")))
+    _insertar_nuevas(Extra, [{"nombre": "Fin de semana", "precio_extra": Decimal("3.00")}], "nombre")
+
 
 def seed_roles():
-    if not Rol.query.filter_by(nombre="admin").first():
-        db.session.add(Rol(nombre="admin"))
-    if not Rol.query.filter_by(nombre="usuario").first():
-        db.session.add(Rol(nombre="usuario"))
+    _insertar_nuevas(Rol, [{"nombre": "admin"}, {"nombre": "usuario"}], "nombre")
+
+
+# ==================== DATOS SINTÉTICOS ====================
+
+def generar_clubs(n_clubs: int, pistas_por_club: int, semilla: int = 1) -> int:
+    """Crea ``n_clubs * pistas_por_club`` pistas "Club C - Pista P".
+
+    El modelo no tiene clubs: cada club es solo un grupo de pistas con el
+    mismo prefijo. Devuelve cuántas pistas se han creado.
+    """
+    rnd = random.Random(semilla)
+    pistas = [
+        {
+            "nombre": f"Club {c} - Pista {p}",
+            "cubierta": rnd.random() < 0.4,
+            "plazas": 4 if rnd.random() < 0.9 else 2,
+            "precio_base": Decimal(rnd.choice(("10.00", "12.00", "14.00", "16.00"))),
+        }
+        for c in range(1, n_clubs + 1)
+        for p in range(1, pistas_por_club + 1)
+    ]
+    return _insertar_nuevas(Pista, pistas, "nombre")
+
+
+def generar_usuarios(n: int, prefijo: str = "sintetico", lote: int = 50_000) -> int:
+    """Crea ``n`` usuarios con rol "usuario" y contraseña "padel" (un solo hash para todos)."""
+    rol_id = db.session.query(Rol.id).filter_by(nombre="usuario").scalar()
+    desde = db.session.query(func.count(Usuario.id)).filter(Usuario.email.like(f"{prefijo}%")).scalar()
+    password = generate_password_hash("padel")
+    for inicio in range(desde, desde + n, lote):
+        db.session.execute(insert(Usuario), [
+            {
+                "nombre": f"Usuario {i}",
+                "dni": f"{prefijo}-{i}",
+                "email": f"{prefijo}{i}@padel.test",
+                "password": password,
+                "rol_id": rol_id,
+            }
+            for i in range(inicio, min(inicio + lote, desde + n))
+        ])
+    return n
+
+
+def generar_reservas(desde: date, dias: int, ocupacion: float, semilla: int = 1,
+                     lote: int = 100_000, usuarios_prefijo: str = None):
+    """Llena de reservas todas las pistas durante ``dias`` días a partir de ``desde``.
+
+    Cada reserva ocupa de 2 a 3 franjas seguidas (1 h o 1 h 30) y se reparten
+    para que, en media, la fracción ``ocupacion`` de las franjas quede
+    ocupada. Los precios salen de la tarifa vigente. Los ids de las reservas
+    se asignan aquí, así que no hace falta RETURNING y todo va en INSERT
+    masivos de ``lote`` filas. Devuelve ``(reservas, franjas)`` creadas.
+    """
+    from app.precios import tarifa_vigente
+
+    hasta = desde + timedelta(days=dias - 1)
+    if db.session.query(HorarioReserva.id).filter(HorarioReserva.fecha.between(desde, hasta)).first():
+        raise SystemExit(f"ya hay reservas entre {desde} y {hasta}: elige otras fechas")
+
+    consulta = db.session.query(Usuario.id)
+    if usuarios_prefijo:
+        consulta = consulta.filter(Usuario.email.like(f"{usuarios_prefijo}%"))
+    usuario_ids = [u for (u,) in consulta.order_by(Usuario.id)]
+    if not usuario_ids:
+        raise SystemExit("no hay usuarios a los que asignar reservas (usa --usuarios)")
+
+    tarifa = tarifa_vigente()
+    pista_ids = [p for (p,) in db.session.query(Pista.id).order_by(Pista.id)]
+    horario_ids = [h for (h,) in db.session.query(Horario.id).order_by(Horario.id)]
+    n_horarios = len(horario_ids)
+
+    # Con reservas de L franjas de media, empezar una en cada franja libre con
+    # probabilidad p deja ocupada una fracción p*L / (1 + p*(L-1)).
+    largo_medio = 2.5
+    p_inicio = min(1.0, ocupacion / (largo_medio - ocupacion * (largo_medio - 1)))
+
+    rnd = random.Random(semilla)
+    siguiente_id = (db.session.query(func.max(Reserva.id)).scalar() or 0) + 1
+    reservas, franjas = [], []
+    total_reservas = total_franjas = 0
+
+    # insert() sobre la tabla y no sobre el modelo: evita el paso por el bulk
+    # del ORM, que aquí no aporta nada y se come casi la mitad del tiempo
+    def volcar():
+        nonlocal reservas, franjas
+        if reservas:
+            db.session.execute(insert(Reserva.__table__), reservas)
+            db.session.execute(insert(HorarioReserva.__table__), franjas)
+        reservas, franjas = [], []
+
+    for d in range(dias):
+        fecha = desde + timedelta(days=d)
+        for pista_id in pista_ids:
+            i = 0
+            while i < n_horarios:
+                if rnd.random() >= p_inicio:
+                    i += 1
+                    continue
+                largo = min(rnd.choice((2, 3)), n_horarios - i)
+                reservas.append({
+                    "id": siguiente_id,
+                    "usuario_id": rnd.choice(usuario_ids),
+                    "pista_id": pista_id,
+                    "fecha": fecha,
+                })
+                for hid in horario_ids[i:i + largo]:
+                    franjas.append({
+                        "reserva_id": siguiente_id,
+                        "pista_id": pista_id,
+                        "fecha": fecha,
+                        "horario_id": hid,
+                        "precio": tarifa.precio_franja(pista_id, fecha, hid),
+                    })
+                siguiente_id += 1
+                total_reservas += 1
+                total_franjas += largo
+                i += largo
+        if len(franjas) >= lote:
+            volcar()
+    volcar()
+    return total_reservas, total_franjas
+
+
+def seed_base():
+    seed_roles()
+    seed_pistas()
+    seed_horarios()
+    seed_extras()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Carga el catálogo base y, opcionalmente, datos sintéticos.")
+    parser.add_argument("--clubs", type=int, default=0, help="clubs sintéticos (grupos de pistas)")
+    parser.add_argument("--pistas-por-club", type=int, default=8)
+    parser.add_argument("--usuarios", type=int, default=0, help="usuarios sintéticos")
+    parser.add_argument("--anios", type=float, default=0, help="años de reservas a generar")
+    parser.add_argument("--desde", help="primer día de reservas YYYY-MM-DD (por defecto hoy)")
+    parser.add_argument("--ocupacion", type=float, default=0.5, help="fracción de franjas ocupadas (0-1)")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--lote", type=int, default=100_000, help="filas por INSERT masivo")
+    args = parser.parse_args()
+
+    if not 0 <= args.ocupacion <= 1:
+        parser.error("--ocupacion debe estar entre 0 y 1")
+
     app = create_app()
     with app.app_context():
-        seed_pistas()
-        seed_horarios()
-        seed_extras()
-        seed_roles()
+        from app.catalogo import catalogo
+
+        inicio = time.perf_counter()
+        seed_base()
+        nuevas_pistas = generar_clubs(args.clubs, args.pistas_por_club, args.semilla) if args.clubs else 0
+        catalogo.registrar_cambio()
         db.session.commit()
+        catalogo.invalidar()
         print("OK: datos iniciales cargados.")
+        if nuevas_pistas:
+            print(f"OK: {nuevas_pistas} pistas sintéticas.")
+
+        if args.usuarios:
+            generar_usuarios(args.usuarios)
+            db.session.commit()
+            print(f"OK: {args.usuarios} usuarios sintéticos.")
+
+        if args.anios:
+            desde = datetime.strptime(args.desde, "%Y-%m-%d").date() if args.desde else date.today()
+            reservas, franjas = generar_reservas(
+                desde, int(args.anios * 365), args.ocupacion, args.semilla, args.lote,
+                usuarios_prefijo="sintetico" if args.usuarios else None,
+            )
+            db.session.commit()
+            print(f"OK: {reservas} reservas y {franjas} franjas ocupadas.")
+
+        print(f"Tiempo: {time.perf_counter() - inicio:.1f} s")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
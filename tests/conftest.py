@@ -0,0 +1,86 @@
+"""Fixtures comunes: una app contra una BD SQLite nueva en cada test.
+
+``Config`` lee las variables de entorno al importarse, así que se fijan aquí
+antes de importar ``app``. La URL de la BD se cambia en ``Config`` para cada
+test; las cachés de proceso (catálogo, índice de disponibilidad, versiones de
+token) se vacían para que no pasen de un test a otro.
+
+    python -m pytest -q
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "tests.db")
+os.environ["JWT_SECRET_KEY"] = "clave-de-tests-de-al-menos-32-bytes"
+os.environ["HASH_PROCESOS"] = "0"
+os.environ["IMAGENES_HILOS"] = "0"
+os.environ["LIMITES_ACTIVOS"] = "0"
+
+import pytest  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.catalogo import catalogo  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.disponibilidad import disponibilidad  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.permisos import versiones_token  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import seed_padel
+
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", "sqlite:///" + (tmp_path / "padel.db").as_posix())
+    monkeypatch.setattr(Config, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    app = create_app()
+    app.config["TESTING"] = True
+    catalogo.invalidar()
+    disponibilidad.invalidar()
+    versiones_token._versiones.clear()
+
+    with app.app_context():
+        db.create_all()
+        seed_padel.seed_roles()
+        seed_padel.seed_pistas()
+        seed_padel.seed_horarios()
+        seed_padel.seed_extras()
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def usuario(app):
+    """``(id, cabeceras)`` de un usuario con rol "usuario"."""
+    return _crear_usuario(app, "usuario", "usuario@test.local")
+
+
+@pytest.fixture
+def admin(app):
+    """``(id, cabeceras)`` de un administrador."""
+    return _crear_usuario(app, "admin", "admin@test.local")
+
+
+def _crear_usuario(app, rol: str, email: str):
+    from flask_jwt_extended import create_access_token
+
+    from app.models import Rol, Usuario
+    from app.permisos import claims_usuario
+
+    with app.app_context():
+        usuario = Usuario(
+            nombre=email, dni=email, email=email, password="-",
+            rol_id=Rol.query.filter_by(nombre=rol).first().id,
+        )
+        db.session.add(usuario)
+        db.session.commit()
+        token = create_access_token(identity=str(usuario.id), additional_claims=claims_usuario(usuario))
+        return usuario.id, {"Authorization": "Bearer " + token}
@@ -0,0 +1,69 @@
+"""Versión del catálogo (la fila existe siempre y solo se actualiza) y ETag de sus rutas."""
+import threading
+
+from app.extensions import db
+from app.models import CatalogoVersion
+
+
+def _version(app) -> int:
+    with app.app_context():
+        return db.session.get(CatalogoVersion, 1).version
+
+
+def _crear_pista(client, cabeceras, nombre):
+    return client.post("/admin/pistas", headers=cabeceras, json={
+        "nombre": nombre, "cubierta": True, "plazas": 4, "precio_base": 20,
+    })
+
+
+def test_cada_cambio_sube_la_version(app, client, admin):
+    assert _version(app) == 0
+    assert _crear_pista(client, admin[1], "Pista nueva").status_code == 201
+    assert _version(app) == 1
+    assert any(p["nombre"] == "Pista nueva" for p in client.get("/api/pistas", headers=admin[1]).get_json()["pistas"])
+
+
+def test_cambios_concurrentes(app, admin):
+    hilos = 6
+    barrera = threading.Barrier(hilos)
+    estados = []
+
+    def crear(i):
+        cliente = app.test_client()
+        barrera.wait()
+        estados.append(_crear_pista(cliente, admin[1], f"Concurrente {i}").status_code)
+
+    trabajadores = [threading.Thread(target=crear, args=(i,)) for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+
+    assert estados == [201] * hilos
+    assert _version(app) == hilos
+
+
+def test_etag_del_catalogo(app, client, usuario, admin):
+    _, cabeceras = usuario
+    primera = client.get("/api/horarios", headers=cabeceras)
+    assert primera.status_code == 200
+    etag = primera.headers["ETag"]
+    assert primera.headers["Cache-Control"] == app.config["CATALOGO_CACHE_CONTROL"]
+
+    for valor in (etag, "W/" + etag, f'"otro", {etag}', "*"):
+        repetida = client.get("/api/horarios", headers={**cabeceras, "If-None-Match": valor})
+        assert repetida.status_code == 304, valor
+        assert repetida.headers["ETag"] == etag
+        assert not repetida.data
+
+    distinta = client.get("/api/horarios", headers={**cabeceras, "If-None-Match": '"otro"'})
+    assert distinta.status_code == 200
+    assert distinta.data == primera.data
+
+    # Cada recurso tiene su propio ETag y cambia con la versión del catálogo
+    pistas = client.get("/api/pistas", headers=cabeceras).headers["ETag"]
+    assert pistas != etag
+    assert _crear_pista(client, admin[1], "Otra pista").status_code == 201
+    nueva = client.get("/api/pistas", headers={**cabeceras, "If-None-Match": pistas})
+    assert nueva.status_code == 200
+    assert nueva.headers["ETag"] != pistas
@@ -0,0 +1,16 @@
+"""Reservas simultáneas de la misma franja: una gana y el resto recibe 409."""
+from datetime import date, timedelta
+
+from benchmarks.comun import crear_usuarios
+from benchmarks.concurrencia_reservas import ronda
+
+HILOS = 16
+RONDAS = 3
+
+
+def test_sin_dobles_reservas(app):
+    cabeceras = crear_usuarios(app, HILOS)
+    for numero in range(RONDAS):
+        resumen, filas = ronda(app, cabeceras, date(2030, 1, 1) + timedelta(days=numero))
+        assert resumen == {201: 1, 409: HILOS - 1}
+        assert filas == 2
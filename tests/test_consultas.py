@@ -0,0 +1,142 @@
+"""Listados: mismas consultas con 1 reserva que con N, paginación por keyset y
+validación de parámetros."""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from app.extensions import db
+from app.models import HorarioReserva, Reserva
+
+N = 20
+
+
+def _crear_reservas(app, usuario_id: int, n: int, franjas: int = 2, desde: date = date(2030, 1, 1)):
+    """Crea ``n`` reservas de ``franjas`` franjas cada una y devuelve sus ids."""
+    with app.app_context():
+        filas = [{"usuario_id": usuario_id, "pista_id": 1 + i % 8, "fecha": desde + timedelta(days=i)} for i in range(n)]
+        ids = sorted(db.session.execute(insert(Reserva).returning(Reserva.id), filas).scalars().all())
+        db.session.execute(insert(HorarioReserva), [
+            {"reserva_id": rid, "pista_id": f["pista_id"], "fecha": f["fecha"], "horario_id": h, "precio": 12}
+            for rid, f in zip(ids, filas)
+            for h in range(1, franjas + 1)
+        ])
+        db.session.commit()
+    return ids
+
+
+def _contar_consultas(app, client, url, cabeceras) -> int:
+    # Una petición previa deja cargadas las cachés (catálogo, versión de token)
+    assert client.get(url, headers=cabeceras).status_code == 200
+    sentencias = []
+
+    def contar(conn, cursor, sql, params, context, executemany):
+        sentencias.append(sql)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        respuesta = client.get(url, headers=cabeceras)
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+    assert respuesta.status_code == 200
+    return len(sentencias)
+
+
+@pytest.mark.parametrize("url, de_admin", [
+    ("/api/mis_reservas", False),
+    ("/admin/reservas", True),
+])
+def test_listados_sin_n_mas_1(app, client, usuario, admin, url, de_admin):
+    usuario_id, cabeceras = usuario
+    if de_admin:
+        cabeceras = admin[1]
+
+    _crear_reservas(app, usuario_id, 1)
+    con_una = _contar_consultas(app, client, url, cabeceras)
+
+    _crear_reservas(app, usuario_id, N - 1, desde=date(2031, 1, 1))
+    con_n = _contar_consultas(app, client, url, cabeceras)
+
+    listado = client.get(url, headers=cabeceras).get_json()["reservas"]
+    assert len(listado) == N
+    assert con_n == con_una
+
+
+def test_detalle_admin_sin_n_mas_1(app, client, usuario, admin):
+    usuario_id, _ = usuario
+    [una_franja] = _crear_reservas(app, usuario_id, 1, franjas=1)
+    [muchas_franjas] = _crear_reservas(app, usuario_id, 1, franjas=N, desde=date(2031, 1, 1))
+
+    con_una = _contar_consultas(app, client, f"/admin/reservas/{una_franja}", admin[1])
+    con_n = _contar_consultas(app, client, f"/admin/reservas/{muchas_franjas}", admin[1])
+
+    detalle = client.get(f"/admin/reservas/{muchas_franjas}", headers=admin[1]).get_json()
+    assert len(detalle["horarios"]) == N
+    assert con_n == con_una
+
+
+def _recorrer(client, url, cabeceras, clave):
+    """Sigue ``siguiente_cursor`` hasta el final y devuelve las filas de todas las páginas."""
+    filas, cursor, paginas = [], None, 0
+    while True:
+        pagina = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=cabeceras)
+        assert pagina.status_code == 200, pagina.get_json()
+        cuerpo = pagina.get_json()
+        filas += cuerpo[clave]
+        paginas += 1
+        cursor = cuerpo["siguiente_cursor"]
+        if cursor is None:
+            return filas, paginas
+
+
+def test_paginas_de_usuarios_sin_huecos(app, client, usuario, admin):
+    from app.models import Rol, Usuario
+
+    with app.app_context():
+        rol_id = Rol.query.filter_by(nombre="usuario").first().id
+        db.session.add_all(
+            Usuario(nombre=f"p{i}", dni=f"p{i}", email=f"pagina{i}@test.local", password="-", rol_id=rol_id)
+            for i in range(7)
+        )
+        db.session.commit()
+        todos = [u.id for u in Usuario.query.order_by(Usuario.id)]
+
+    filas, paginas = _recorrer(client, "/admin/usuarios?limit=3", admin[1], "usuarios")
+    assert [f["id"] for f in filas] == todos
+    assert paginas == 3
+
+    filas, _ = _recorrer(client, "/admin/usuarios?limit=2&fields=email&email=PAGINA", admin[1], "usuarios")
+    assert [set(f) for f in filas] == [{"email"}] * 7
+    assert all(f["email"].startswith("pagina") for f in filas)
+
+
+def test_paginas_de_reservas_con_filtro(app, client, usuario, admin):
+    ids = _crear_reservas(app, usuario[0], N)
+    # _crear_reservas reparte las reservas entre las pistas 1..8
+    de_la_pista_2 = [rid for i, rid in enumerate(ids) if 1 + i % 8 == 2]
+
+    filas, paginas = _recorrer(client, "/admin/reservas?limit=2&pista_id=2&fields=id,pista_id", admin[1], "reservas")
+    assert [f["id"] for f in filas] == de_la_pista_2
+    assert {f["pista_id"] for f in filas} == {2}
+    assert paginas == 2
+
+    filas, _ = _recorrer(client, "/admin/reservas?limit=7", admin[1], "reservas")
+    assert [f["id"] for f in filas] == ids
+
+
+@pytest.mark.parametrize("url", [
+    "/admin/usuarios?fields=id,password",
+    "/admin/usuarios?rol=1",
+    "/admin/usuarios?rol_id=admin",
+    "/admin/usuarios?limit=0",
+    "/admin/reservas?cursor=abc",
+    "/admin/reservas?fields=id,precio",
+    "/admin/reservas?pista=1",
+    "/admin/reservas?fecha_desde=04/03/2030",
+])
+def test_parametros_no_validos(client, admin, url):
+    respuesta = client.get(url, headers=admin[1])
+    assert respuesta.status_code == 400
+    assert "error" in respuesta.get_json()
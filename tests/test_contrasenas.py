@@ -0,0 +1,80 @@
+"""Pool de hashes: 503 cuando está lleno y rehash al cambiar de método."""
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.contrasenas import HashOcupado, contrasenas
+from app.extensions import db
+from app.models import Rol, Usuario
+
+METODO_VIEJO = "pbkdf2:sha256:1000"
+METODO_NUEVO = "pbkdf2:sha256:2000"
+
+
+@pytest.fixture
+def servicio(monkeypatch):
+    # Métodos baratos para que los tests no dependan del coste de scrypt
+    monkeypatch.setattr(contrasenas, "metodo", METODO_NUEVO)
+    yield contrasenas
+    contrasenas.cerrar()
+
+
+def _crear(app, email, password, metodo):
+    with app.app_context():
+        db.session.add(Usuario(
+            nombre=email, dni=email, email=email,
+            password=generate_password_hash(password, method=metodo),
+            rol_id=Rol.query.filter_by(nombre="usuario").first().id,
+        ))
+        db.session.commit()
+
+
+def _hash(app, email) -> str:
+    with app.app_context():
+        return Usuario.query.filter_by(email=email).first().password
+
+
+def test_rehash_en_el_login(app, client, servicio):
+    _crear(app, "viejo@test.local", "secreta", METODO_VIEJO)
+    assert client.post("/auth/login", json={"email": "viejo@test.local", "password": "mala"}).status_code == 401
+    assert _hash(app, "viejo@test.local").startswith(METODO_VIEJO + "$")
+
+    assert client.post("/auth/login", json={"email": "viejo@test.local", "password": "secreta"}).status_code == 200
+    nuevo = _hash(app, "viejo@test.local")
+    assert nuevo.startswith(METODO_NUEVO + "$")
+
+    # Con el método al día no se vuelve a escribir
+    assert client.post("/auth/login", json={"email": "viejo@test.local", "password": "secreta"}).status_code == 200
+    assert _hash(app, "viejo@test.local") == nuevo
+
+
+def test_cola_llena_responde_503(app, client, servicio, monkeypatch):
+    _crear(app, "lleno@test.local", "secreta", METODO_NUEVO)
+    monkeypatch.setattr(servicio, "cola_max", 0)
+    for url, cuerpo in [
+        ("/auth/login", {"email": "lleno@test.local", "password": "secreta"}),
+        ("/auth/register", {"email": "otro@test.local", "password": "x", "nombre": "otro", "dni": "1"}),
+    ]:
+        respuesta = client.post(url, json=cuerpo)
+        assert respuesta.status_code == 503
+        assert respuesta.headers["Retry-After"] == "1"
+
+
+def test_timeout_no_libera_el_hueco_antes_de_tiempo(servicio, monkeypatch):
+    monkeypatch.setattr(servicio, "procesos", 1)
+    monkeypatch.setattr(servicio, "timeout", 0.05)
+    monkeypatch.setattr(servicio, "cola_max", 1)
+    servicio._ejecutar(time.sleep, 0)   # arranca el proceso del pool
+
+    with pytest.raises(HashOcupado):
+        servicio._ejecutar(time.sleep, 1)
+    # El trabajo sigue en marcha en el pool: no hay hueco para otro
+    assert servicio.estadisticas()["pendientes"] == 1
+    with pytest.raises(HashOcupado):
+        servicio._ejecutar(time.sleep, 0)
+
+    limite = time.monotonic() + 5
+    while servicio.estadisticas()["pendientes"] and time.monotonic() < limite:
+        time.sleep(0.02)
+    assert servicio.estadisticas()["pendientes"] == 0
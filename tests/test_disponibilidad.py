@@ -0,0 +1,131 @@
+"""Índice de disponibilidad: altas, bajas, caducidad y cargas concurrentes."""
+import importlib
+from datetime import date
+
+from sqlalchemy import event
+
+from app.catalogo import catalogo
+from app.disponibilidad import disponibilidad
+from app.extensions import db
+from app.models import Horario, HorarioReserva, Reserva
+
+modulo_disponibilidad = importlib.import_module("app.disponibilidad")
+
+FECHA = date(2030, 3, 4)
+
+
+def _mascara(app, pista_id=1, fecha=FECHA) -> int:
+    with app.app_context():
+        return disponibilidad.mascara(pista_id, fecha)
+
+
+def _bits(*horario_ids) -> int:
+    # Los horarios del seed tienen ids 1..N en orden, así que el bit es id - 1
+    return sum(1 << (h - 1) for h in horario_ids)
+
+
+def _insertar_en_bd(app, usuario_id, pista_id, fecha, horario_ids):
+    """Reserva escrita directamente en la BD, sin pasar por el índice."""
+    with app.app_context():
+        reserva = Reserva(usuario_id=usuario_id, pista_id=pista_id, fecha=fecha)
+        db.session.add(reserva)
+        db.session.flush()
+        for hid in horario_ids:
+            db.session.add(HorarioReserva(
+                reserva_id=reserva.id, pista_id=pista_id, fecha=fecha, horario_id=hid, precio=12,
+            ))
+        db.session.commit()
+
+
+def test_reservar_y_cancelar(app, client, usuario):
+    _, cabeceras = usuario
+    assert _mascara(app) == 0
+    reserva = client.post("/api/reservar", headers=cabeceras, json={
+        "pista_id": 1, "fecha": FECHA.isoformat(), "horario_ids": [2, 3],
+    })
+    assert reserva.status_code == 201
+    assert _mascara(app) == _bits(2, 3)
+
+    reserva_id = reserva.get_json()["reserva"]["id"]
+    cancelada = client.post("/api/cancelar_reserva", headers=cabeceras, json={"reserva_id": reserva_id})
+    assert cancelada.status_code == 200
+    assert _mascara(app) == 0
+
+
+def test_se_relee_al_caducar(app, usuario, monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(modulo_disponibilidad.time, "monotonic", lambda: ahora[0])
+    disponibilidad.ttl = 30
+
+    assert _mascara(app) == 0
+    _insertar_en_bd(app, usuario[0], 1, FECHA, [4])
+    assert _mascara(app) == 0          # aún vale la carga anterior
+    ahora[0] += 31
+    assert _mascara(app) == _bits(4)
+
+
+def test_cambios_durante_una_carga(app, usuario):
+    # Otra petición confirma y marca una reserva entre la consulta de la carga
+    # y el momento en que se guarda su resultado
+    def marcar_a_mitad(conn, cursor, sql, params, context, executemany):
+        if "FROM horarios_reserva" in sql and not hecho:
+            hecho.append(True)
+            disponibilidad.marcar(1, FECHA, [5])
+            disponibilidad.liberar(1, FECHA, [6])
+
+    hecho = []
+    _insertar_en_bd(app, usuario[0], 1, FECHA, [6])
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "after_cursor_execute", marcar_a_mitad)
+    try:
+        assert _mascara(app) == _bits(5)
+    finally:
+        event.remove(engine, "after_cursor_execute", marcar_a_mitad)
+    assert hecho
+
+
+def test_verificar_y_reconstruir(app, usuario):
+    with app.app_context():
+        assert disponibilidad.verificar(FECHA) == []
+        _insertar_en_bd(app, usuario[0], 2, FECHA, [1, 7])
+        disponibilidad.marcar(3, FECHA, [2])
+        assert disponibilidad.verificar(FECHA) == [
+            {"pista_id": 2, "solo_indice": [], "solo_bd": [1, 7]},
+            {"pista_id": 3, "solo_indice": [2], "solo_bd": []},
+        ]
+
+        assert disponibilidad.reconstruir(FECHA) == 1
+        assert disponibilidad.verificar(FECHA) == []
+        assert disponibilidad.mascara(2, FECHA) == _bits(1, 7)
+
+
+def test_rango_con_cambio_de_catalogo(app, client, usuario, monkeypatch):
+    _, cabeceras = usuario
+    reservados = {3, 4}
+    assert client.post("/api/reservar", headers=cabeceras, json={
+        "pista_id": 1, "fecha": FECHA.isoformat(), "horario_ids": sorted(reservados),
+    }).status_code == 201
+
+    # Se borra el primer horario justo después de cargar las máscaras: todos
+    # los bits se desplazarían si los horarios salieran de otra instantánea
+    cargar = disponibilidad._cargar
+
+    def cargar_y_cambiar_catalogo(estado, fechas):
+        cargar(estado, fechas)
+        with app.app_context():
+            db.session.delete(db.session.get(Horario, 1))
+            catalogo.registrar_cambio()
+            db.session.commit()
+        catalogo.invalidar()
+
+    disponibilidad.invalidar()
+    monkeypatch.setattr(disponibilidad, "_cargar", cargar_y_cambiar_catalogo)
+    respuesta = client.post("/api/disponibilidad_rango", headers=cabeceras, json={
+        "fecha_desde": FECHA.isoformat(), "fecha_hasta": FECHA.isoformat(), "pista_ids": [1],
+    })
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.get_json()
+    [bits] = cuerpo["pistas"][0]["ocupacion"]
+    assert len(bits) == len(cuerpo["horarios"])
+    assert {h["id"] for h, b in zip(cuerpo["horarios"], bits) if b == "1"} == reservados
@@ -0,0 +1,115 @@
+"""``Idempotency-Key`` en /api/reservar."""
+import importlib
+import threading
+import time
+from collections import Counter
+
+from app.extensions import db
+from app.idempotencia import _huella, idempotencia
+from app.models import ClaveIdempotencia, Reserva
+
+api = importlib.import_module("app.api")
+
+URL = "/api/reservar"
+CUERPO = {"pista_id": 1, "fecha": "2030-03-04", "horario_ids": [1, 2]}
+
+
+def _reservar(client, cabeceras, clave, cuerpo=CUERPO):
+    return client.post(URL, json=cuerpo, headers={**cabeceras, "Idempotency-Key": clave})
+
+
+def _reservas(app) -> int:
+    with app.app_context():
+        return db.session.query(Reserva).count()
+
+
+def test_reintento_devuelve_la_misma_respuesta(app, client, usuario):
+    _, cabeceras = usuario
+    primera = _reservar(client, cabeceras, "clave-1")
+    assert primera.status_code == 201
+    assert "Idempotent-Replayed" not in primera.headers
+
+    # Del LRU del proceso y, tras vaciarlo, de la BD
+    for vaciar in (False, True):
+        if vaciar:
+            idempotencia.vaciar_cache()
+        repetida = _reservar(client, cabeceras, "clave-1")
+        assert repetida.status_code == 201
+        assert repetida.headers["Idempotent-Replayed"] == "true"
+        assert repetida.get_json() == primera.get_json()
+    assert _reservas(app) == 1
+
+
+def test_misma_clave_con_otro_cuerpo(app, client, usuario):
+    _, cabeceras = usuario
+    assert _reservar(client, cabeceras, "clave-2").status_code == 201
+    otra = _reservar(client, cabeceras, "clave-2", {**CUERPO, "horario_ids": [3]})
+    assert otra.status_code == 422
+    # El orden de las claves del JSON no cambia la huella
+    assert _reservar(client, cabeceras, "clave-2", dict(reversed(list(CUERPO.items())))).status_code == 201
+    assert _reservas(app) == 1
+
+
+def test_la_clave_es_de_cada_usuario(app, client, usuario, admin):
+    assert _reservar(client, usuario[1], "compartida").status_code == 201
+    otro_dia = {**CUERPO, "fecha": "2030-03-05"}
+    assert _reservar(client, admin[1], "compartida", otro_dia).status_code == 201
+    assert _reservas(app) == 2
+
+
+def test_uso_concurrente_de_una_clave(app, usuario):
+    _, cabeceras = usuario
+    hilos = 8
+    barrera = threading.Barrier(hilos)
+    resultados = []
+
+    def reservar():
+        cliente = app.test_client()
+        barrera.wait()
+        r = _reservar(cliente, cabeceras, "clave-concurrente")
+        resultados.append((r.status_code, r.headers.get("Idempotent-Replayed")))
+
+    trabajadores = [threading.Thread(target=reservar) for _ in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+
+    # Solo una ejecuta la vista; el resto repite su respuesta o ve la clave en curso
+    estados = Counter(s for s, _ in resultados)
+    assert set(estados) <= {201, 409}
+    assert sum(1 for s, repetida in resultados if s == 201 and repetida is None) == 1
+    assert _reservas(app) == 1
+
+
+def test_clave_en_curso(app, client, usuario):
+    usuario_id, cabeceras = usuario
+    with app.test_request_context(URL, method="POST", json=CUERPO):
+        huella = _huella()
+    ahora = int(time.time())
+    with app.app_context():
+        db.session.add(ClaveIdempotencia(
+            usuario_id=usuario_id, clave="en-curso", huella=huella, creada=ahora, expira=ahora + 60,
+        ))
+        db.session.commit()
+    assert _reservar(client, cabeceras, "en-curso").status_code == 409
+    assert _reservar(client, cabeceras, "en-curso", {**CUERPO, "horario_ids": [3]}).status_code == 422
+    assert _reservas(app) == 0
+
+
+def test_los_5xx_no_se_guardan(app, client, usuario, monkeypatch):
+    _, cabeceras = usuario
+
+    def falla(**_):
+        raise RuntimeError("fallo simulado")
+
+    monkeypatch.setattr(api, "HorarioReserva", falla)
+    assert _reservar(client, cabeceras, "clave-5xx").status_code == 500
+    monkeypatch.undo()
+
+    # La clave se ha soltado: el reintento ejecuta la vista de verdad
+    reintento = _reservar(client, cabeceras, "clave-5xx")
+    assert reintento.status_code == 201
+    assert "Idempotent-Replayed" not in reintento.headers
+    assert _reservar(client, cabeceras, "clave-5xx").headers["Idempotent-Replayed"] == "true"
+    assert _reservas(app) == 1
@@ -0,0 +1,214 @@
+"""Fotos de perfil: variantes WebP sin metadatos, nunca el original."""
+import importlib
+import io
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+# ``app.imagenes`` como atributo del paquete es el singleton, no el módulo
+modulo_imagenes = importlib.import_module("app.imagenes")
+
+URL = "/auth/update_image_profile"
+
+
+def _jpeg_con_gps(ancho=1600, alto=1200, color=(200, 30, 30)) -> bytes:
+    exif = Image.Exif()
+    exif[0x0110] = "Camara de prueba"   # Model
+    exif[0x0112] = 6                    # Orientation: girada 90º
+    exif[0x8825] = {1: "N", 2: (40.0, 25.0, 0.0)}  # GPSInfo
+    salida = io.BytesIO()
+    Image.new("RGB", (ancho, alto), color).save(salida, "JPEG", exif=exif)
+    return salida.getvalue()
+
+
+def _subir(client, cabeceras, datos, nombre="foto.jpg"):
+    return client.post(URL, headers=cabeceras, data={"foto": (io.BytesIO(datos), nombre)})
+
+
+def test_genera_variantes_webp_sin_exif(app, client, usuario):
+    _, cabeceras = usuario
+    original = _jpeg_con_gps()
+    respuesta = _subir(client, cabeceras, original)
+    assert respuesta.status_code == 200, respuesta.get_json()
+    cuerpo = respuesta.get_json()
+    variantes = cuerpo["foto_variantes"]
+    assert set(variantes) == {"grande", "64", "256"}
+    assert cuerpo["foto"] == variantes["grande"]
+
+    carpeta = app.config["UPLOAD_FOLDER"]
+    for nombre, ruta in variantes.items():
+        with Image.open(os.path.join(carpeta, ruta)) as imagen:
+            assert imagen.format == "WEBP"
+            assert not imagen.getexif()
+            if nombre == "grande":
+                # La orientación EXIF ya está aplicada a los píxeles
+                assert imagen.size == (768, 1024)
+            else:
+                assert imagen.size == (int(nombre), int(nombre))
+    assert os.path.getsize(os.path.join(carpeta, variantes["256"])) < len(original) / 10
+
+    servida = client.get("/media/" + variantes["64"])
+    assert servida.status_code == 200
+    assert servida.mimetype == "image/webp"
+    assert "immutable" in servida.headers["Cache-Control"]
+
+
+def test_sin_pillow_no_publica_el_original(app, client, usuario, monkeypatch):
+    _, cabeceras = usuario
+    monkeypatch.setattr(modulo_imagenes, "Image", None)
+    respuesta = _subir(client, cabeceras, _jpeg_con_gps())
+    assert respuesta.status_code == 503
+    carpeta = app.config["UPLOAD_FOLDER"]
+    assert not os.path.exists(carpeta) or not any(f for _, _, f in os.walk(carpeta))
+
+
+@pytest.mark.parametrize("datos, nombre", [
+    (b"no es una imagen" * 10, "foto.jpg"),
+    (b"\xff\xd8\xff" + b"\0" * 100, "foto.jpg"),  # cabecera JPEG, contenido corrupto
+], ids=["texto", "jpeg_corrupto"])
+def test_rechaza_lo_que_no_es_imagen(client, usuario, datos, nombre):
+    assert _subir(client, usuario[1], datos, nombre).status_code == 400
+
+
+def test_borra_la_foto_anterior_si_nadie_la_usa(app, client, usuario, admin):
+    carpeta = app.config["UPLOAD_FOLDER"]
+    compartida = _jpeg_con_gps(color=(10, 120, 10))
+    primera = _subir(client, usuario[1], compartida).get_json()["foto_variantes"]
+    assert _subir(client, admin[1], compartida).get_json()["foto_variantes"] == primera
+
+    # El admin cambia de foto: la anterior sigue porque el usuario la usa
+    _subir(client, admin[1], _jpeg_con_gps(color=(10, 10, 200)))
+    assert all(os.path.exists(os.path.join(carpeta, r)) for r in primera.values())
+
+    # Ahora ya no la usa nadie
+    _subir(client, usuario[1], _jpeg_con_gps(color=(250, 250, 0)))
+    assert not any(os.path.exists(os.path.join(carpeta, r)) for r in primera.values())
+
+
+def test_borra_la_foto_de_antes_de_las_variantes(app, client, usuario):
+    from app.extensions import db
+    from app.models import Usuario
+
+    # Un original guardado tal cual con el nombre de make_safe_filename
+    carpeta = app.config["UPLOAD_FOLDER"]
+    os.makedirs(carpeta, exist_ok=True)
+    antigua = "0123456789abcdef0123456789abcdef.jpg"
+    with open(os.path.join(carpeta, antigua), "wb") as f:
+        f.write(_jpeg_con_gps())
+    with app.app_context():
+        db.session.get(Usuario, usuario[0]).foto = antigua
+        db.session.commit()
+
+    assert _subir(client, usuario[1], _jpeg_con_gps(color=(0, 200, 0))).status_code == 200
+    assert not os.path.exists(os.path.join(carpeta, antigua))
+
+
+# ---------- procesado en segundo plano ----------
+
+@pytest.fixture
+def en_segundo_plano(monkeypatch):
+    monkeypatch.setattr(modulo_imagenes.imagenes, "hilos", 2)
+    yield modulo_imagenes.imagenes
+    modulo_imagenes.imagenes.cerrar()
+
+
+def _png(ancho=300, alto=200, color=(0, 90, 200)) -> bytes:
+    salida = io.BytesIO()
+    Image.new("RGB", (ancho, alto), color).save(salida, "PNG")
+    return salida.getvalue()
+
+
+def _usuario(app, usuario_id):
+    from app.extensions import db
+    from app.models import Usuario
+
+    with app.app_context():
+        u = db.session.get(Usuario, usuario_id)
+        return u.foto, u.foto_variantes, u.foto_pendiente
+
+
+def test_en_segundo_plano_responde_202(app, client, usuario, en_segundo_plano):
+    respuesta = _subir(client, usuario[1], _jpeg_con_gps())
+    assert respuesta.status_code == 202
+    en_segundo_plano.cerrar()
+    foto, variantes, pendiente = _usuario(app, usuario[0])
+    assert set(variantes) == {"grande", "64", "256"} and foto == variantes["grande"]
+    assert pendiente is None
+
+
+def _corromper(datos: bytes) -> bytes:
+    # Cabecera intacta, datos de la imagen alterados a mitad del fichero
+    medio = len(datos) // 2
+    return datos[:medio] + bytes(b ^ 0xFF for b in datos[medio:medio + 16]) + datos[medio + 16:]
+
+
+@pytest.mark.parametrize("datos", [
+    pytest.param(lambda: _corromper(_png()), id="png_corrupto"),
+    pytest.param(lambda: _jpeg_con_gps()[:3000], id="jpeg_truncado"),
+    pytest.param(lambda: _png(4000, 3000), id="demasiados_pixeles"),
+])
+def test_en_segundo_plano_valida_antes_de_responder(app, client, usuario, en_segundo_plano, monkeypatch, datos):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 10_000_000)
+    assert _subir(client, usuario[1], datos(), "foto.png").status_code == 400
+    assert _usuario(app, usuario[0]) == (None, None, None)
+
+
+def test_gana_la_ultima_subida(app, client, usuario, en_segundo_plano, monkeypatch):
+    # La primera subida se queda bloqueada generando variantes hasta que la
+    # segunda ha terminado, así que acaba después
+    generar = en_segundo_plano.generar_variantes
+    primera_en_marcha, soltar_primera = threading.Event(), threading.Event()
+    llamadas = []
+
+    def generar_en_orden(origen, carpeta, sha):
+        llamadas.append(origen)
+        if len(llamadas) == 1:
+            primera_en_marcha.set()
+            assert soltar_primera.wait(10)
+        return generar(origen, carpeta, sha)
+
+    monkeypatch.setattr(en_segundo_plano, "generar_variantes", generar_en_orden)
+    assert _subir(client, usuario[1], _jpeg_con_gps(color=(250, 0, 0))).status_code == 202
+    assert primera_en_marcha.wait(10)
+    assert _subir(client, usuario[1], _jpeg_con_gps(color=(0, 0, 250))).status_code == 202
+
+    limite = time.monotonic() + 10
+    while _usuario(app, usuario[0])[0] is None and time.monotonic() < limite:
+        time.sleep(0.02)
+    segunda = _usuario(app, usuario[0])[1]
+    assert segunda is not None
+
+    soltar_primera.set()
+    en_segundo_plano.cerrar()
+    assert _usuario(app, usuario[0]) == (segunda["grande"], segunda, None)
+    # Solo quedan en disco las variantes de la segunda
+    carpeta = app.config["UPLOAD_FOLDER"]
+    en_disco = {os.path.relpath(os.path.join(d, f), carpeta) for d, _, fs in os.walk(carpeta) for f in fs}
+    assert en_disco == set(segunda.values())
+
+
+def test_la_misma_subida_no_se_procesa_dos_veces(app, client, usuario, admin, en_segundo_plano, monkeypatch):
+    generar = en_segundo_plano.generar_variantes
+    llamadas = []
+
+    def contar(origen, carpeta, sha):
+        llamadas.append(sha)
+        return generar(origen, carpeta, sha)
+
+    monkeypatch.setattr(en_segundo_plano, "generar_variantes", contar)
+    foto = _jpeg_con_gps(color=(90, 40, 160))
+    assert _subir(client, usuario[1], foto).status_code == 202
+    en_segundo_plano.cerrar()
+    _, variantes, _ = _usuario(app, usuario[0])
+
+    # Otro usuario, y el mismo otra vez: se reutilizan las variantes al momento
+    for cabeceras in (admin[1], usuario[1]):
+        respuesta = _subir(client, cabeceras, foto)
+        assert respuesta.status_code == 200
+        assert respuesta.get_json()["foto_variantes"] == variantes
+    assert len(llamadas) == 1
+    carpeta = app.config["UPLOAD_FOLDER"]
+    assert all(os.path.exists(os.path.join(carpeta, r)) for r in variantes.values())
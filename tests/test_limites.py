@@ -0,0 +1,51 @@
+"""Límites de intentos en /auth: 429 con Retry-After y backend SQLite."""
+import pytest
+
+from app.limites import SQLiteLimites, limitador
+
+LOGIN = "/auth/login"
+
+
+@pytest.fixture
+def limites(app):
+    app.config["LIMITES_ACTIVOS"] = True
+    limitador.limites = {"auth": {"ip": (5, 60), "email": (2, 60)}}
+    return limitador
+
+
+def test_429_con_retry_after(client, limites):
+    cuerpo = {"email": "Alguien@test.local", "password": "x"}
+    for _ in range(2):
+        assert client.post(LOGIN, json=cuerpo).status_code == 401
+    # Mismo email con otras mayúsculas: misma clave
+    rechazada = client.post(LOGIN, json={**cuerpo, "email": " alguien@TEST.local"})
+    assert rechazada.status_code == 429
+    assert 1 <= int(rechazada.headers["Retry-After"]) <= 60
+
+    # Otro email pasa hasta agotar el límite por IP (5 intentos contados)
+    assert client.post(LOGIN, json={"email": "otro@test.local", "password": "x"}).status_code == 401
+    assert client.post(LOGIN, json={"email": "otro2@test.local", "password": "x"}).status_code == 401
+    assert client.post(LOGIN, json={"email": "otro3@test.local", "password": "x"}).status_code == 429
+
+
+@pytest.mark.parametrize("cuerpo", [[], ["a"], "texto", 7, None])
+def test_cuerpo_json_que_no_es_objeto(app, limites, cuerpo):
+    with app.test_request_context(LOGIN, method="POST", json=cuerpo):
+        assert limites.comprobar() is None
+
+
+def test_backend_sqlite_compartido(tmp_path):
+    ruta = str(tmp_path / "limites.db")
+    # Dos instancias sobre el mismo fichero hacen de dos workers
+    uno, otro = SQLiteLimites(ruta), SQLiteLimites(ruta)
+    ahora = 1_000_040.0   # ventana fija [1_000_020, 1_000_080)
+    assert uno.intentar("clave", 2, 60, ahora) is None
+    assert otro.intentar("clave", 2, 60, ahora) is None
+    assert uno.intentar("clave", 2, 60, ahora) == 40
+    assert otro.intentar("otra", 2, 60, ahora) is None
+
+    # En la ventana siguiente la anterior aún pesa: 2 * (1 - 20/60) + 1 >= 2
+    assert otro.intentar("clave", 2, 60, ahora + 60) is None
+    assert uno.intentar("clave", 2, 60, ahora + 60) is not None
+    # Una ventana más tarde vuelve a caber
+    assert uno.intentar("clave", 2, 60, ahora + 120) is None
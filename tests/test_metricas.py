@@ -0,0 +1,15 @@
+"""``/metrics`` solo se sirve con ``METRICAS_TOKEN``."""
+
+
+def test_sin_token_no_se_sirve(app, client):
+    app.config["METRICAS_TOKEN"] = ""
+    assert client.get("/metrics").status_code == 404
+
+
+def test_con_token(app, client):
+    app.config["METRICAS_TOKEN"] = "secreto"
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer otro"}).status_code == 401
+    respuesta = client.get("/metrics", headers={"Authorization": "Bearer secreto"})
+    assert respuesta.status_code == 200
+    assert "# TYPE padel_hash_pendientes gauge" in respuesta.get_data(as_text=True)
@@ -0,0 +1,57 @@
+"""``admin_required``: rol del token y revocación por ``token_version``."""
+import importlib
+
+from sqlalchemy import update
+
+from app.extensions import db
+from app.models import Rol, Usuario
+from app.permisos import versiones_token
+
+from .conftest import _crear_usuario
+
+modulo_permisos = importlib.import_module("app.permisos")
+
+URL = "/admin/usuarios"
+
+
+def test_usuario_sin_rol_admin(client, usuario):
+    assert client.get(URL, headers=usuario[1]).status_code == 403
+
+
+def test_cambio_de_rol_revoca_en_el_acto(app, client, admin):
+    otro_id, otro = _crear_usuario(app, "admin", "otro-admin@test.local")
+    assert client.get(URL, headers=otro).status_code == 200
+
+    with app.app_context():
+        rol_usuario = Rol.query.filter_by(nombre="usuario").first().id
+    cambio = client.put(f"{URL}/{otro_id}", headers=admin[1], json={"rol_id": rol_usuario})
+    assert cambio.status_code == 200
+    # El token sigue diciendo rol=admin, pero su versión ya no es la vigente
+    assert client.get(URL, headers=otro).status_code == 401
+    assert client.get(URL, headers=admin[1]).status_code == 200
+
+
+def test_version_cambiada_en_otro_proceso_caduca_con_el_ttl(app, client, admin, monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(modulo_permisos.time, "monotonic", lambda: ahora[0])
+    monkeypatch.setattr(versiones_token, "ttl", 60)
+    admin_id, cabeceras = admin
+    assert client.get(URL, headers=cabeceras).status_code == 200
+
+    # Otro worker sube la versión: este proceso no se entera hasta que caduca su caché
+    with app.app_context():
+        db.session.execute(
+            update(Usuario).where(Usuario.id == admin_id).values(token_version=Usuario.token_version + 1)
+        )
+        db.session.commit()
+    ahora[0] += 59
+    assert client.get(URL, headers=cabeceras).status_code == 200
+    ahora[0] += 2
+    assert client.get(URL, headers=cabeceras).status_code == 401
+
+
+def test_usuario_borrado(app, client, admin):
+    otro_id, otro = _crear_usuario(app, "admin", "borrado@test.local")
+    assert client.get(URL, headers=otro).status_code == 200
+    assert client.delete(f"{URL}/{otro_id}", headers=admin[1]).status_code == 200
+    assert client.get(URL, headers=otro).status_code == 401
@@ -0,0 +1,12 @@
+"""Las consultas calientes usan índices: ninguna recorre entera una tabla grande."""
+from benchmarks.planes_consulta import comprobar, poblar
+
+
+def test_consultas_calientes_usan_indices(app):
+    poblar(app, dias=30, ocupacion=0.3, n_usuarios=50)
+    malas = {
+        nombre: [(sql, recorridos) for sql, _, recorridos in consultas]
+        for nombre, consultas in comprobar(app)
+        if consultas
+    }
+    assert not malas
@@ -0,0 +1,36 @@
+"""``FESTIVOS`` se valida al arrancar y aplica el extra "Festivo"."""
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from app.catalogo import catalogo
+from app.config import Config
+from app.extensions import db
+from app.models import Extra
+from app.precios import parse_festivos
+
+
+@pytest.mark.parametrize("valor", ["2030-13-01", "2030-03-04,mañana"])
+def test_festivos_mal_escritos_impiden_arrancar(monkeypatch, valor):
+    monkeypatch.setattr(Config, "FESTIVOS", valor)
+    with pytest.raises(ValueError, match="FESTIVOS"):
+        create_app()
+
+
+def test_festivo_aplica_su_extra(app, client, usuario):
+    app.config["FESTIVOS"] = frozenset()
+    cesta = {"pista_id": 1, "fecha": "2030-03-04", "horario_ids": [1]}   # lunes
+    laborable = client.post("/api/calcular_precio", headers=usuario[1], json=cesta).get_json()
+    assert laborable["extras_aplicados"] == []
+
+    with app.app_context():
+        db.session.add(Extra(nombre="Festivo", precio_extra=Decimal("5.00")))
+        catalogo.registrar_cambio()
+        db.session.commit()
+    catalogo.invalidar()
+    app.config["FESTIVOS"] = parse_festivos(" 2030-03-04 , ")
+
+    festivo = client.post("/api/calcular_precio", headers=usuario[1], json=cesta).get_json()
+    assert [e["nombre"] for e in festivo["extras_aplicados"]] == ["Festivo"]
+    assert Decimal(festivo["total_precio"]) == Decimal(laborable["total_precio"]) + 5
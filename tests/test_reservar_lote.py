@@ -0,0 +1,76 @@
+"""/api/reservar_lote: modos, conflictos y emparejamiento de ids."""
+from datetime import date, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import HorarioReserva, Reserva
+
+URL = "/api/reservar_lote"
+
+
+def _ocurrencia(dia: int, pista_id: int = 1, horario_ids=(1, 2)) -> dict:
+    fecha = date(2030, 3, 4) + timedelta(days=dia)
+    return {"pista_id": pista_id, "fecha": fecha.isoformat(), "horario_ids": list(horario_ids)}
+
+
+def _reservar(client, cabeceras, ocurrencias, modo="todo_o_nada"):
+    return client.post(URL, headers=cabeceras, json={"modo": modo, "ocurrencias": ocurrencias})
+
+
+def _filas(app):
+    with app.app_context():
+        return {
+            r.id: (r.pista_id, r.fecha.isoformat(), sorted(h.horario_id for h in r.horarios))
+            for r in db.session.query(Reserva)
+        }
+
+
+def test_cada_id_es_el_de_su_ocurrencia(app, client, usuario):
+    # Pistas y fechas desordenadas para que el orden de inserción importe
+    ocurrencias = [_ocurrencia(d, p, (h,)) for d, p, h in [(5, 3, 4), (0, 7, 1), (9, 1, 2), (2, 5, 3), (7, 2, 5)]]
+    respuesta = _reservar(client, usuario[1], ocurrencias)
+    assert respuesta.status_code == 201, respuesta.get_json()
+
+    filas = _filas(app)
+    reservas = respuesta.get_json()["reservas"]
+    assert [r["indice"] for r in reservas] == list(range(len(ocurrencias)))
+    for r, o in zip(reservas, ocurrencias):
+        assert r["pista_id"] == o["pista_id"] and r["fecha"] == o["fecha"]
+        assert filas[r["id"]] == (o["pista_id"], o["fecha"], o["horario_ids"])
+
+
+@pytest.mark.parametrize("modo, status, reservadas", [("todo_o_nada", 409, 0), ("parcial", 201, 2)])
+def test_conflicto_dentro_del_lote(app, client, usuario, modo, status, reservadas):
+    ocurrencias = [_ocurrencia(0), _ocurrencia(0, horario_ids=(2, 3)), _ocurrencia(1)]
+    respuesta = _reservar(client, usuario[1], ocurrencias, modo)
+    assert respuesta.status_code == status
+    assert respuesta.get_json()["conflictos"] == [{"indice": 1, "horarios_ocupados": [2]}]
+    assert len(_filas(app)) == reservadas
+
+
+@pytest.mark.parametrize("modo, status, reservadas", [("todo_o_nada", 409, 1), ("parcial", 201, 2)])
+def test_conflicto_con_la_bd(app, client, usuario, admin, modo, status, reservadas):
+    assert _reservar(client, admin[1], [_ocurrencia(3, horario_ids=(4,))]).status_code == 201
+    ocurrencias = [_ocurrencia(3, horario_ids=(3, 4, 5)), _ocurrencia(4)]
+    respuesta = _reservar(client, usuario[1], ocurrencias, modo)
+    assert respuesta.status_code == status
+    assert respuesta.get_json()["conflictos"] == [{"indice": 0, "horarios_ocupados": [4]}]
+    assert len(_filas(app)) == reservadas
+    with app.app_context():
+        assert db.session.query(HorarioReserva).filter_by(horario_id=4).count() == 1
+
+
+def test_ocurrencias_no_validas(app, client, usuario):
+    ocurrencias = [_ocurrencia(0), {"pista_id": 999, "fecha": "2030-03-04", "horario_ids": [1]}, "no"]
+    todo = _reservar(client, usuario[1], ocurrencias)
+    assert todo.status_code == 400
+    assert [e["indice"] for e in todo.get_json()["errores"]] == [1, 2]
+    assert not _filas(app)
+
+    parcial = _reservar(client, usuario[1], ocurrencias, "parcial")
+    assert parcial.status_code == 201
+    assert [r["indice"] for r in parcial.get_json()["reservas"]] == [0]
+
+    # Si ninguna es válida no hay nada que reservar
+    assert _reservar(client, usuario[1], ocurrencias[1:], "parcial").status_code == 400